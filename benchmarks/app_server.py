@@ -0,0 +1,49 @@
+"""
+Run the API for the load tests with a chosen Redis backend.
+
+Usage: python -m benchmarks.app_server [--port 8001] [--redis url|fake|none]
+
+    url   use REDIS_URL (a real local Redis)
+    fake  an in-memory fakeredis server inside this process (pip install "fakeredis[lua]")
+    none  no Redis at all: the app runs on its L1 cache and in-memory rate limiter
+
+Everything else is configured through the usual environment variables.
+"""
+import os
+import argparse
+
+import uvicorn
+
+
+def use_fake_redis():
+    import fakeredis
+
+    from src import redis_client
+
+    server = fakeredis.FakeServer()
+
+    def create_client(url, decode_responses):
+        return fakeredis.FakeAsyncRedis(server=server, decode_responses=decode_responses)
+
+    redis_client.create_client = create_client
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Weather API for load tests")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--redis", choices=("url", "fake", "none"), default="url")
+    args = parser.parse_args()
+
+    if args.redis == "none":
+        # Nothing listens on port 1, connections are refused right away
+        os.environ["REDIS_URL"] = "redis://127.0.0.1:1"
+    if args.redis == "fake":
+        use_fake_redis()
+
+    from src.main import app
+
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
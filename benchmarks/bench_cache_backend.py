@@ -0,0 +1,98 @@
+"""
+Hit latency of the shared cache tiers: the local SQLite file and Redis.
+
+Usage: python -m benchmarks.bench_cache_backend [iterations] [keys]
+
+Fills each backend with keys entries of a typical WeatherResponse, then
+times GET, a 25 key MGET and read_entry (which adds decoding) with the L1
+cache bypassed. Redis is measured only if a server is reachable at REDIS_URL;
+over the loopback it shows the round trip the disk tier saves, over a
+network the gap is wider.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import tempfile
+
+from redis.asyncio import Redis
+
+from benchmarks.stub_provider import load_fixture
+from src.services import disk_cache as disk_cache_module, weather_cache
+from src.services.providers import _to_human_readable
+from src.services.weather_cache import CacheEntry
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+BATCH = 25
+
+
+async def timed(fn, iterations: int) -> list[float]:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn()
+        timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+
+def report(name: str, timings: list[float]):
+    ordered = sorted(timings)
+    p50, p99 = (ordered[int(len(ordered) * q) - 1] for q in (0.5, 0.99))
+    print(f"{name:<28} p50={p50:8.1f}us p99={p99:8.1f}us")
+
+
+async def read_entry(keys: list[str]):
+    # Bypass L1 so every read goes to the backend under test
+    weather_cache.l1_cache.clear()
+    await weather_cache.read_entry(random.choice(keys))
+
+
+async def bench_sqlite(values: dict[str, bytes], iterations: int):
+    keys = list(values)
+    cache = disk_cache_module.SQLiteCache()
+    await cache.set_many(values, ttl=3600)
+    weather_cache.USE_REDIS, weather_cache.USE_DISK, weather_cache.disk_cache = False, True, cache
+
+    report("sqlite get", await timed(lambda: cache.get(random.choice(keys)), iterations))
+    report(f"sqlite mget {BATCH}", await timed(lambda: cache.mget(random.sample(keys, BATCH)), iterations))
+    report("sqlite read_entry", await timed(lambda: read_entry(keys), iterations))
+    cache.close()
+
+
+async def bench_redis(values: dict[str, bytes], iterations: int):
+    keys = list(values)
+    redis = Redis.from_url(REDIS_URL, socket_timeout=1, socket_connect_timeout=1)
+    try:
+        await redis.ping()
+    except Exception:
+        print(f"Redis not reachable at {REDIS_URL}, skipped")
+        return
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for key, value in values.items():
+                pipe.set(key, value, ex=3600)
+            await pipe.execute()
+        weather_cache.USE_REDIS, weather_cache.USE_DISK = True, False
+
+        report("redis get", await timed(lambda: redis.get(random.choice(keys)), iterations))
+        report(f"redis mget {BATCH}", await timed(lambda: redis.mget(random.sample(keys, BATCH)), iterations))
+        report("redis read_entry", await timed(lambda: read_entry(keys), iterations))
+        await redis.delete(*keys)
+    finally:
+        await redis.aclose()
+
+
+async def main(iterations: int, n: int):
+    entry = CacheEntry(data=_to_human_readable(load_fixture()), fetched_at=time.time())
+    values = {f"bench:cache:city{i}": weather_cache.encode_entry(entry) for i in range(n)}
+    with tempfile.TemporaryDirectory() as directory:
+        disk_cache_module.DISK_CACHE_PATH = os.path.join(directory, "weather-cache.db")
+        await bench_sqlite(values, iterations)
+    await bench_redis(values, iterations)
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    asyncio.run(main(iterations, n))
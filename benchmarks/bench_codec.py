@@ -0,0 +1,74 @@
+"""
+Encode/decode time and stored size of one cache entry for each installed codec and compression.
+
+Usage: python -m benchmarks.bench_codec [iterations]
+
+Runs on a typical WeatherResponse built from the stub provider fixture. If a
+Redis server is reachable at REDIS_URL, the per-key memory reported by
+MEMORY USAGE is shown as well (it includes Redis' own per-key overhead).
+"""
+import os
+import sys
+import time
+import asyncio
+
+from redis.asyncio import Redis
+
+from benchmarks.stub_provider import load_fixture
+from src.services import cache_codec
+from src.services.providers import _to_human_readable
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+
+def timed(fn, arg, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(arg)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def redis_memory(values: dict[str, bytes]) -> dict[str, int] | None:
+    redis = Redis.from_url(REDIS_URL, socket_timeout=1, socket_connect_timeout=1)
+    try:
+        usage = {}
+        for name, raw in values.items():
+            key = f"bench:codec:{name}"
+            await redis.set(key, raw, ex=60)
+            usage[name] = await redis.memory_usage(key)
+            await redis.delete(key)
+        return usage
+    except Exception:
+        return None
+    finally:
+        await redis.aclose()
+
+
+def main(iterations: int):
+    # Compress everything so the compressors are measured on this payload too
+    cache_codec.CACHE_COMPRESSION_MIN_BYTES = 0
+    value = {"data": _to_human_readable(load_fixture()), "fetched_at": time.time()}
+
+    results = {}
+    for codec, codec_spec in cache_codec.CODECS.items():
+        for compression, compression_spec in cache_codec.COMPRESSIONS.items():
+            if not codec_spec[3] or not compression_spec[3]:
+                continue
+            name = f"{codec}+{compression}"
+            raw = cache_codec.encode(value, codec, compression)
+            encode_us = timed(lambda v: cache_codec.encode(v, codec, compression), value, iterations)
+            decode_us = timed(cache_codec.decode, raw, iterations)
+            results[name] = (raw, encode_us, decode_us)
+
+    memory = asyncio.run(redis_memory({name: raw for name, (raw, _, _) in results.items()}))
+    missing = [name for name, spec in {**cache_codec.CODECS, **cache_codec.COMPRESSIONS}.items() if not spec[3]]
+    if missing:
+        print(f"not installed: {', '.join(missing)}")
+    print(f"{'codec':<16} {'encode us':>10} {'decode us':>10} {'bytes':>7} {'redis bytes':>12}")
+    for name, (raw, encode_us, decode_us) in results.items():
+        redis_bytes = str(memory[name]) if memory else "-"
+        print(f"{name:<16} {encode_us:10.2f} {decode_us:10.2f} {len(raw):7d} {redis_bytes:>12}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
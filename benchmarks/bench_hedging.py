@@ -0,0 +1,73 @@
+"""
+Tail latency of provider calls with and without hedging.
+
+Usage: python -m benchmarks.bench_hedging [calls] [slow_rate]
+
+The primary stub answers in 50ms, but slow_rate of its answers take a second.
+Compares no hedging, hedging to the same provider and hedging to a second
+stub that answers like WeatherAPI.com. The hedge delay starts at
+HEDGE_INITIAL_DELAY and follows the primary's p95 once it has enough samples.
+"""
+import sys
+import time
+import asyncio
+
+from benchmarks.stub_provider import StubProvider
+
+from src import http_client
+from src.services import hedging, providers, circuit_breaker, concurrency_limiter
+
+CONCURRENCY = 10
+
+
+async def measure(configured: list[providers.Provider], hedge: bool, n: int) -> tuple[list[float], dict]:
+    providers.PROVIDERS = configured
+    hedging.HEDGE_ENABLED = hedge
+    hedging._providers.clear()
+    hedging._stats.update(dict.fromkeys(hedging._stats, 0))
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    timings = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await hedging.call(lambda provider: provider.current(f"city{i}"))
+            timings.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*[one(i) for i in range(n)])
+    return timings, dict(hedging._stats)
+
+
+def report(name: str, timings: list[float], stats: dict):
+    ordered = sorted(timings)
+    p50, p95, p99 = (ordered[int(len(ordered) * q) - 1] for q in (0.5, 0.95, 0.99))
+    hedged = stats["hedged"] / stats["calls"]
+    print(f"{name:<28} p50={p50:7.1f}ms p95={p95:7.1f}ms p99={p99:7.1f}ms hedged={hedged:5.1%} hedge_wins={stats['hedge_wins']}")
+
+
+async def main(n: int, slow_rate: float):
+    # The slow answers would otherwise shrink the in-flight limit and trip the breaker mid-run
+    concurrency_limiter.UPSTREAM_LIMIT_ENABLED = False
+    circuit_breaker.BREAKER_ENABLED = False
+    with StubProvider(port=8766, latency=0.05, slow_rate=slow_rate, slow_latency=1.0) as primary_stub, \
+            StubProvider(port=8767, latency=0.05) as secondary_stub:
+        await http_client.initialize_http_client()
+        primary = providers.VisualCrossing("bench", primary_stub.base_url)
+        secondary = providers.WeatherAPI("bench", f"{secondary_stub.base_url}v1/")
+        # Warm up the connections so the first calls do not skew the results
+        await measure([primary, secondary], False, CONCURRENCY)
+
+        for name, configured, hedge in [
+            ("no hedging", [primary], False),
+            ("hedge to the same provider", [primary], True),
+            ("hedge to a second provider", [primary, secondary], True),
+        ]:
+            timings, stats = await measure(configured, hedge, n)
+            report(name, timings, stats)
+        await http_client.close_http_client()
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    slow_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0.02
+    asyncio.run(main(n, slow_rate))
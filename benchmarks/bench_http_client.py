@@ -0,0 +1,69 @@
+"""
+Compare cache-miss latency with a per-request httpx client vs the shared pooled client.
+
+Usage: python -m benchmarks.bench_http_client [requests] [provider_latency_seconds]
+
+The stub provider speaks plain HTTP on localhost, so the numbers only show the
+TCP connect + client setup cost. Against the real provider the per-request
+client also pays a TLS handshake on every miss.
+"""
+import os
+import sys
+import time
+import asyncio
+import statistics
+
+import httpx
+
+from benchmarks.stub_provider import StubProvider
+
+os.environ.setdefault("WEATHER_API_KEY", "bench")
+
+from src import http_client  # noqa: E402
+from src.services.providers import _to_human_readable  # noqa: E402
+
+
+async def per_request_client(url: str, params: dict):
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        response = await client.get(url, params=params)
+    return _to_human_readable(response.json())
+
+
+async def pooled_client(url: str, params: dict):
+    client = await http_client.get_http_client()
+    response = await client.get(url, params=params)
+    return _to_human_readable(response.json())
+
+
+async def measure(fn, base_url: str, n: int) -> list[float]:
+    timings = []
+    for i in range(n):
+        url = f"{base_url}city{i}/today"
+        start = time.perf_counter()
+        await fn(url, {"unitGroup": "metric", "contentType": "json", "key": "bench"})
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name: str, timings: list[float]):
+    ordered = sorted(timings)
+    p99 = ordered[int(len(ordered) * 0.99) - 1]
+    print(f"{name:<20} mean={statistics.mean(timings):7.3f}ms p50={statistics.median(timings):7.3f}ms p99={p99:7.3f}ms")
+
+
+async def main(n: int, latency: float):
+    with StubProvider(latency=latency) as stub:
+        await http_client.initialize_http_client()
+        # Warm up both paths so the first connection does not skew the results
+        await measure(per_request_client, stub.base_url, 5)
+        await measure(pooled_client, stub.base_url, 5)
+
+        report("per-request client", await measure(per_request_client, stub.base_url, n))
+        report("pooled client", await measure(pooled_client, stub.base_url, n))
+        await http_client.close_http_client()
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    asyncio.run(main(n, latency))
@@ -0,0 +1,91 @@
+"""
+Request throughput on cache hits with logging off, synchronous handlers and the queue pipeline.
+
+Usage: python -m benchmarks.bench_logging [requests] [concurrency]
+
+Requests are driven in-process through httpx's ASGI transport against a warm
+L1 cache, so the numbers isolate the cost of the app and its logging.
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import tempfile
+
+import httpx
+
+os.environ.setdefault("WEATHER_API_KEY", "bench")
+# Providers without a base URL are skipped; never called, the cache is pre-seeded
+os.environ.setdefault("WEATHER_BASE_URL", "http://127.0.0.1:8765/")
+# Measure the handlers, not the rate limiter
+os.environ.setdefault("RATE_LIMIT_DEFAULT", "100000000/60")
+os.environ["LOG_DIR"] = tempfile.mkdtemp(prefix="bench-logs-")
+
+from benchmarks.stub_provider import load_fixture  # noqa: E402
+from src import logger as app_logger  # noqa: E402
+from src.main import app  # noqa: E402
+from src.settings import Settings  # noqa: E402
+from src.services import weather_cache  # noqa: E402
+from src.services.weather_cache import CacheEntry  # noqa: E402
+from src.services.providers import _to_human_readable  # noqa: E402
+
+MODES = {
+    "logging off": {"LOG_LEVEL": "CRITICAL", "LOG_QUEUE_ENABLED": "false"},
+    "sync handlers": {"LOG_LEVEL": "DEBUG", "LOG_QUEUE_ENABLED": "false"},
+    "queue (block)": {"LOG_LEVEL": "DEBUG", "LOG_QUEUE_ENABLED": "true", "LOG_QUEUE_OVERFLOW": "block"},
+    "queue (drop)": {"LOG_LEVEL": "DEBUG", "LOG_QUEUE_ENABLED": "true", "LOG_QUEUE_OVERFLOW": "drop"},
+    "queue + json": {"LOG_LEVEL": "DEBUG", "LOG_QUEUE_ENABLED": "true", "LOG_FORMAT": "json"},
+}
+
+
+def configure(env: dict):
+    app_logger.shutdown_logger()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    for key in ("LOG_LEVEL", "LOG_QUEUE_ENABLED", "LOG_QUEUE_OVERFLOW", "LOG_FORMAT"):
+        os.environ.pop(key, None)
+    os.environ.update(env)
+    app_logger.setup_logger(Settings.from_env())
+
+
+async def run(n: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        remaining = iter(range(n))
+
+        async def worker():
+            for _ in remaining:
+                response = await client.get("/weather", params={"city": "London"})
+                assert response.status_code == 200, response.text
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return n / (time.perf_counter() - start)
+
+
+def main(n: int, concurrency: int):
+    weather_cache.l1_cache.set("weather:london", CacheEntry(data=_to_human_readable(load_fixture()), fetched_at=time.time() + 3600))
+    stdout = sys.stdout
+    results = {}
+    for name, env in MODES.items():
+        # Keep console output out of the terminal while measuring
+        sys.stdout = open(os.devnull, "w")
+        try:
+            configure(env)
+            asyncio.run(run(200, concurrency))
+            results[name] = asyncio.run(run(n, concurrency))
+            app_logger.shutdown_logger()
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+    for name, rps in results.items():
+        print(f"{name:<16} {rps:8.0f} req/s")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    main(n, concurrency)
@@ -0,0 +1,77 @@
+"""
+Bytes transferred and CPU time per cache miss, with and without projection.
+
+Usage: python -m benchmarks.bench_payload [iterations]
+
+Fetches the recorded Visual Crossing fixture from the stub provider once
+with the full /today timeline and once with only the elements the adapter
+maps (include=days&elements=...). Reports the body size, as sent and
+gzipped as Visual Crossing serves it, then the CPU time of parsing and
+mapping that body with response.json() (the old path) and with orjson on
+the raw bytes.
+"""
+import sys
+import gzip
+import json
+import time
+import asyncio
+
+import httpx
+
+from benchmarks.stub_provider import StubProvider
+from src.services import providers
+from src.services.providers import _to_human_readable
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def cpu_us(fn, iterations: int) -> float:
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - start) / iterations * 1e6
+
+
+async def fetch(base_url: str, projection: bool) -> httpx.Response:
+    providers.WEATHER_PROJECTION_ENABLED = projection
+    provider = providers.VisualCrossing("bench", base_url)
+    async with httpx.AsyncClient() as client:
+        return await client.get(f"{base_url}london/today", params=provider._params())
+
+
+def main(iterations: int):
+    with StubProvider(port=8768) as stub:
+        responses = {
+            "full": asyncio.run(fetch(stub.base_url, False)),
+            "projected": asyncio.run(fetch(stub.base_url, True)),
+        }
+
+    parsers = {"response.json()": lambda response: response.json()}
+    if orjson is not None:
+        parsers["orjson.loads(bytes)"] = lambda response: orjson.loads(response.content)
+
+    results = {}
+    for payload, response in responses.items():
+        raw = len(response.content)
+        compressed = len(gzip.compress(response.content))
+        print(f"{payload:<10} {raw:7d} bytes  {compressed:6d} bytes gzipped")
+        for parser, parse in parsers.items():
+            # A fresh Response each time, so httpx's cached text does not flatter response.json()
+            make = lambda: httpx.Response(200, content=response.content, headers=response.headers)
+            results[payload, parser] = cpu_us(lambda: _to_human_readable(parse(make())), iterations)
+            print(f"    {parser:<22} {results[payload, parser]:8.1f}us CPU per miss")
+
+    # The mapped result must not depend on the payload or the parser
+    mapped = {json.dumps(_to_human_readable(response.json()), sort_keys=True) for response in responses.values()}
+    assert len(mapped) == 1, "projected payload maps differently from the full one"
+
+    before = results["full", "response.json()"]
+    after = results["projected", "orjson.loads(bytes)" if orjson is not None else "response.json()"]
+    print(f"\nbefore -> after: {before:.1f}us -> {after:.1f}us CPU per miss ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,92 @@
+"""
+Cache-hit throughput of /weather: pre-serialized body vs response model validation.
+
+Usage: python -m benchmarks.bench_response [requests] [concurrency]
+
+Requests are driven in-process through httpx's ASGI transport against a warm
+L1 cache, on a single event loop, so the numbers are requests per second on
+one core. "model validation" is the previous handler, which returned the dict
+and let FastAPI validate and serialize it through WeatherResponse, mounted
+on a benchmark-only route with the same dependencies and parameters as
+/weather. /weather also sends the HTTP caching headers, which the model
+route does not; they are built once per cache entry.
+"""
+import os
+import sys
+import time
+import asyncio
+
+import httpx
+
+os.environ.setdefault("WEATHER_API_KEY", "bench")
+# Providers without a base URL are skipped; never called, the cache is pre-seeded
+os.environ.setdefault("WEATHER_BASE_URL", "http://127.0.0.1:8765/")
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+os.environ.setdefault("LOG_QUEUE_ENABLED", "false")
+# Measure the handlers, not the rate limiter
+os.environ.setdefault("RATE_LIMIT_DEFAULT", "100000000/60")
+
+from fastapi import Depends, Query, Request, Response  # noqa: E402
+
+from benchmarks.stub_provider import load_fixture  # noqa: E402
+from src.main import app, safe_rate_limit  # noqa: E402
+from src.models import WeatherResponse  # noqa: E402
+from src.services import weather_cache  # noqa: E402
+from src.services.weather_cache import CacheEntry  # noqa: E402
+from src.services.providers import _to_human_readable  # noqa: E402
+from src.services.weather_client import fetch_weather_entry  # noqa: E402
+
+
+# Same dependencies and parameters as /weather, so both paths pay for the rate
+# limiter and the query parsing, and only the response handling differs
+@app.get("/bench/weather-model", response_model=WeatherResponse, dependencies=[Depends(safe_rate_limit)])
+async def weather_with_model(
+    request: Request,
+    response: Response,
+    city: str | None = Query(None, min_length=1, max_length=60),
+    lat: float | None = Query(None, ge=-90, le=90),
+    lon: float | None = Query(None, ge=-180, le=180),
+):
+    entry, cache_status = await fetch_weather_entry(city)
+    response.headers["X-Cache"] = cache_status
+    response.headers["X-Cache-Age"] = str(int(entry.age))
+    return entry.data
+
+
+ROUTES = {
+    "model validation": ("/bench/weather-model", {}),
+    "pre-serialized": ("/weather", {}),
+    "304 revalidation": ("/weather", {"If-None-Match": None}),
+}
+
+
+async def run(path: str, headers: dict, n: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        remaining = iter(range(n))
+
+        async def worker():
+            for _ in remaining:
+                response = await client.get(path, params={"city": "London"}, headers=headers)
+                assert response.status_code in (200, 304), response.text
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return n / (time.perf_counter() - start)
+
+
+def main(n: int, concurrency: int):
+    entry = CacheEntry(data=_to_human_readable(load_fixture()), fetched_at=time.time() + 3600)
+    weather_cache.l1_cache.set("weather:london", entry)
+    _, etag = weather_cache.response_body(entry)
+    for name, (path, headers) in ROUTES.items():
+        headers = {key: etag for key in headers}
+        asyncio.run(run(path, headers, 200, concurrency))
+        rps = asyncio.run(run(path, headers, n, concurrency))
+        print(f"{name:<18} {rps:8.0f} req/s")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    main(n, concurrency)
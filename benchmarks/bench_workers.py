@@ -0,0 +1,100 @@
+"""
+Cache-hit throughput of the API by number of worker processes.
+
+Usage: python -m benchmarks.bench_workers [--workers 1,2,4] [--duration 10]
+           [--concurrency 64] [--clients 4] [--redis url|none]
+
+For each worker count, starts the stub provider and `python -m src.serve
+--workers N`, warms a handful of cities until every worker serves them from
+its cache, then drives /weather from several client processes so the load
+generator is not the bottleneck. With --redis none the workers only have
+their L1 caches; with url they share REDIS_URL. The clients share the CPUs
+with the server, so leave some cores free for them: on a box with fewer
+cores than workers + clients the numbers stop scaling early.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.loadtest import STUB_PORT, APP_PORT, ZipfCities, run_level, _start, _wait_until_up
+
+CITIES = 10
+
+
+def _client(base_url: str, concurrency: int, duration: float, seed: int) -> dict:
+    cities = ZipfCities(CITIES, 1.0, seed)
+    return asyncio.run(run_level(base_url, concurrency, duration, cities, {"weather": 1}, 1))
+
+
+def measure(base_url: str, concurrency: int, clients: int, duration: float) -> dict:
+    per_client = max(1, concurrency // clients)
+    with ProcessPoolExecutor(clients) as pool:
+        runs = list(pool.map(_client, [base_url] * clients, [per_client] * clients, [duration] * clients, range(clients)))
+    requests = sum(run["requests"] for run in runs)
+    hits = sum(run["cache"].get("HIT", 0) for run in runs)
+    return {
+        "throughput_rps": round(sum(run["throughput_rps"] for run in runs), 1),
+        "p50_ms": max(run["latency_ms"]["p50"] for run in runs),
+        "p99_ms": max(run["latency_ms"]["p99"] for run in runs),
+        "hit_rate": round(hits / requests, 4) if requests else 0.0,
+        "requests": requests,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput by worker count on cache-hit traffic")
+    parser.add_argument("--workers", default="1,2,4", help="Comma separated worker counts")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=64, help="Connections across all clients")
+    parser.add_argument("--clients", type=int, default=4, help="Load generator processes")
+    parser.add_argument("--redis", choices=("url", "none"), default="none")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.update({
+        "WEATHER_API_KEY": env.get("WEATHER_API_KEY", "bench"),
+        "WEATHER_BASE_URL": f"http://127.0.0.1:{STUB_PORT}/",
+        "LOG_LEVEL": "WARNING",
+        # Outside the repo, so run output never ends up in a commit
+        "LOG_DIR": env.get("LOG_DIR") or tempfile.mkdtemp(prefix="bench-workers-logs-"),
+        "RATE_LIMIT_DEFAULT": "1000000000/60",
+        "RATE_LIMIT_ROUTES": "",
+    })
+    if args.redis == "none":
+        env["REDIS_URL"] = "redis://127.0.0.1:1"
+
+    base_url = f"http://127.0.0.1:{APP_PORT}"
+    stub = _start("benchmarks.stub_provider", ["--port", str(STUB_PORT), "--latency", "0.05"], env)
+    results = []
+    try:
+        _wait_until_up(f"http://127.0.0.1:{STUB_PORT}/ping/today", stub)
+        for workers in (int(count) for count in args.workers.split(",")):
+            app = _start("src.serve", ["--host", "127.0.0.1", "--port", str(APP_PORT), "--workers", str(workers)], env)
+            try:
+                _wait_until_up(f"{base_url}/health", app)
+                # Until every worker has every city, some requests still miss
+                _client(base_url, workers * 8, 2.0, 0)
+                time.sleep(0.5)
+                results.append({"workers": workers, **measure(base_url, args.concurrency, args.clients, args.duration)})
+            finally:
+                app.terminate()
+                app.wait()
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    print(json.dumps({"cpus": os.cpu_count(), "redis": args.redis, "results": results}, indent=2))
+    baseline = results[0]["throughput_rps"] if results else 0
+    for result in results:
+        speedup = result["throughput_rps"] / baseline if baseline else 0
+        print(f"{result['workers']:>3} workers {result['throughput_rps']:9.1f} req/s  x{speedup:.2f}  p99 {result['p99_ms']} ms  hit rate {result['hit_rate']}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Load test the API against the local stub provider and report JSON results.
+
+Usage:
+    python -m benchmarks.loadtest [--concurrency 1,10,50] [--duration 10]
+        [--cities 1000] [--zipf 1.1] [--mix weather=90,batch=5,forecast=5]
+        [--stub-latency 0.05] [--error-rate 0.01] [--not-found-rate 0.02]
+        [--redis url|fake|none] [--rate-limit] [--output results.json]
+        [--baseline previous.json --tolerance 0.2]
+
+Starts the stub provider and the app (benchmarks.app_server) as subprocesses,
+drives each concurrency level for a fixed duration with Zipf-distributed
+cities, and prints throughput, p50/p95/p99 latency, status codes and cache
+statuses per level as JSON. With --baseline, exits with status 1 when
+throughput dropped or p95 latency grew by more than the tolerance.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+from bisect import bisect
+from collections import Counter
+from itertools import accumulate
+
+import httpx
+
+STUB_PORT = 8765
+APP_PORT = 8001
+_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def city_name(index: int) -> str:
+    # The API only accepts letters, so spell the index in base 26
+    letters = ""
+    while True:
+        index, rest = divmod(index, 26)
+        letters = _LETTERS[rest] + letters
+        if index == 0:
+            break
+    return f"Loadtest {letters.title()}"
+
+
+class ZipfCities:
+    """City names where the k-th most popular one is drawn with weight 1/k^s"""
+
+    def __init__(self, count: int, exponent: float, seed: int):
+        self.names = [city_name(i) for i in range(count)]
+        self.cumulative = list(accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+        self.random = random.Random(seed)
+
+    def sample(self) -> str:
+        point = self.random.random() * self.cumulative[-1]
+        return self.names[min(bisect(self.cumulative, point), len(self.names) - 1)]
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - {"weather", "batch", "forecast"}
+    if unknown:
+        raise SystemExit(f"Unknown request types in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+async def _request(client: httpx.AsyncClient, kind: str, cities: ZipfCities, batch_size: int) -> httpx.Response:
+    if kind == "batch":
+        return await client.post("/weather/batch", json={"cities": [cities.sample() for _ in range(batch_size)]})
+    if kind == "forecast":
+        return await client.get("/weather/forecast", params={"city": cities.sample(), "days": 7})
+    return await client.get("/weather", params={"city": cities.sample()})
+
+
+async def run_level(base_url: str, concurrency: int, duration: float, cities: ZipfCities, mix: dict[str, float], batch_size: int) -> dict:
+    kinds = list(mix)
+    weights = list(mix.values())
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    cache: Counter = Counter()
+    picker = random.Random(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                kind = picker.choices(kinds, weights)[0]
+                start = time.perf_counter()
+                try:
+                    response = await _request(client, kind, cities, batch_size)
+                    statuses[str(response.status_code)] += 1
+                    cache[response.headers.get("X-Cache", "none")] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        },
+        "status_codes": dict(statuses),
+        "cache": dict(cache),
+    }
+
+
+def _start(module: str, args: list[str], env: dict) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-m", module, *args], env=env)
+
+
+def _wait_until_up(url: str, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"{url} exited with status {process.returncode}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise SystemExit(f"{url} did not come up within {timeout:.0f}s")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions of throughput or p95 latency beyond the tolerance, per concurrency level"""
+    previous = {run["concurrency"]: run for run in baseline["runs"]}
+    regressions = []
+    for run in results["runs"]:
+        before = previous.get(run["concurrency"])
+        if before is None:
+            continue
+        if run["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"c={run['concurrency']}: throughput {before['throughput_rps']} -> {run['throughput_rps']} req/s")
+        if run["latency_ms"]["p95"] > before["latency_ms"]["p95"] * (1 + tolerance):
+            regressions.append(f"c={run['concurrency']}: p95 {before['latency_ms']['p95']} -> {run['latency_ms']['p95']} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the weather API against a stub provider")
+    parser.add_argument("--concurrency", default="1,10,50", help="Comma separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per concurrency level")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Seconds of untimed traffic before the first level")
+    parser.add_argument("--cities", type=int, default=1000, help="Distinct city names")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent, higher means more skew and more cache hits")
+    parser.add_argument("--mix", default="weather=90,batch=5,forecast=5", help="Request type weights")
+    parser.add_argument("--batch-size", type=int, default=10, help="Cities per batch request")
+    parser.add_argument("--stub-latency", type=float, default=0.05, help="Provider latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of provider requests that fail with a 500")
+    parser.add_argument("--not-found-rate", type=float, default=0.0, help="Share of city names the provider does not know")
+    parser.add_argument("--redis", choices=("url", "fake", "none"), default="fake")
+    parser.add_argument("--rate-limit", action="store_true", help="Keep the configured rate limits instead of lifting them")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON results to this file as well")
+    parser.add_argument("--baseline", help="Previous JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression against the baseline")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.update({
+        "WEATHER_API_KEY": env.get("WEATHER_API_KEY", "loadtest"),
+        "WEATHER_BASE_URL": f"http://127.0.0.1:{STUB_PORT}/",
+        "LOG_LEVEL": env.get("LOG_LEVEL", "WARNING"),
+        # Outside the repo, so run output never ends up in a commit
+        "LOG_DIR": env.get("LOG_DIR") or tempfile.mkdtemp(prefix="loadtest-logs-"),
+    })
+    if not args.rate_limit:
+        env["RATE_LIMIT_DEFAULT"] = "1000000000/60"
+        env["RATE_LIMIT_ROUTES"] = ""
+
+    stub = _start("benchmarks.stub_provider", [
+        "--port", str(STUB_PORT),
+        "--latency", str(args.stub_latency),
+        "--error-rate", str(args.error_rate),
+        "--not-found-rate", str(args.not_found_rate),
+    ], env)
+    app = _start("benchmarks.app_server", ["--port", str(APP_PORT), "--redis", args.redis], env)
+    try:
+        _wait_until_up(f"http://127.0.0.1:{STUB_PORT}/ping/today", stub)
+        base_url = f"http://127.0.0.1:{APP_PORT}"
+        _wait_until_up(f"{base_url}/health", app)
+
+        mix = parse_mix(args.mix)
+        cities = ZipfCities(args.cities, args.zipf, args.seed)
+        if args.warmup:
+            asyncio.run(run_level(base_url, 10, args.warmup, cities, mix, args.batch_size))
+        runs = []
+        for concurrency in (int(level) for level in args.concurrency.split(",")):
+            runs.append(asyncio.run(run_level(base_url, concurrency, args.duration, cities, mix, args.batch_size)))
+    finally:
+        for process in (app, stub):
+            process.terminate()
+            process.wait()
+
+    results = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "runs": runs,
+    }
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
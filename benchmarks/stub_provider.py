@@ -0,0 +1,190 @@
+"""
+Local stand-in for the Visual Crossing timeline API used by the benchmarks.
+
+Also answers like WeatherAPI.com under /v1/, so the same process can stand
+in for a secondary provider.
+
+Run standalone: python -m benchmarks.stub_provider [--port 8765] [--latency 0.05]
+    [--error-rate 0.01] [--not-found-rate 0.02] [--slow-rate 0.05 --slow-latency 1.0]
+"""
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import threading
+
+from datetime import date, timedelta
+
+from pathlib import Path
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+FIXTURE_PATH = Path(__file__).parent / "fixtures" / "visualcrossing_today.json"
+
+
+def load_fixture() -> dict:
+    """Recorded Visual Crossing /today response for London"""
+    return json.loads(FIXTURE_PATH.read_text())
+
+
+def _is_unknown(city: str, not_found_rate: float) -> bool:
+    # Decided per city rather than per request, like a real typo or junk name
+    digest = hashlib.blake2b(city.lower().encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") / 2**64 < not_found_rate
+
+
+def project(body: dict, include: str | None, elements: str | None) -> dict:
+    """Apply Visual Crossing's include and elements options to a timeline answer"""
+    if include:
+        sections = set(include.split(","))
+        body = {key: value for key, value in body.items()
+                if not (key == "currentConditions" and "current" not in sections)
+                and not (key in ("alerts", "stations") and not sections & {"alerts", "obs", "stations"})}
+        if "hours" not in sections:
+            body["days"] = [{key: value for key, value in day.items() if key != "hours"} for day in body["days"]]
+    if elements:
+        fields = set(elements.split(","))
+        body["days"] = [{key: value for key, value in day.items() if key in fields} for day in body["days"]]
+    return body
+
+
+def _clock(value: str) -> str:
+    # "07:59:34" -> "07:59 AM", as WeatherAPI.com writes times
+    hours, minutes = (int(part) for part in value.split(":")[:2])
+    return f"{(hours - 1) % 12 + 1:02d}:{minutes:02d} {'AM' if hours < 12 else 'PM'}"
+
+
+def _weatherapi_body(payload: dict, city: str, days: list[dict]) -> dict:
+    """The fixture in the shape of a WeatherAPI.com forecast/history answer"""
+    current = payload.get("currentConditions") or {}
+    return {
+        "location": {"name": city.title(), "region": "", "country": "United Kingdom", "tz_id": payload["timezone"]},
+        "current": {"temp_c": current.get("temp"), "feelslike_c": current.get("feelslike"), "gust_kph": current.get("windgust")},
+        "forecast": {"forecastday": [{
+            "date": day["datetime"],
+            "day": {
+                "avgtemp_c": day["temp"],
+                "maxtemp_c": day["tempmax"],
+                "mintemp_c": day["tempmin"],
+                "totalprecip_mm": day["precip"],
+                "daily_chance_of_rain": day["precipprob"],
+                "maxwind_kph": day["windspeed"],
+                "condition": {"text": day["conditions"]},
+            },
+            "astro": {"sunrise": _clock(day["sunrise"]), "sunset": _clock(day["sunset"])},
+        } for day in days]},
+    }
+
+
+def build_app(latency: float = 0.0, error_rate: float = 0.0, not_found_rate: float = 0.0,
+              slow_rate: float = 0.0, slow_latency: float = 1.0) -> Starlette:
+    """
+    Serve the recorded fixture for any city, after an optional delay.
+
+    error_rate is the share of requests answered with a 500, not_found_rate
+    the share of city names that always get a 404, and slow_rate the share
+    of requests that take slow_latency instead of latency (a latency tail).
+    """
+    payload = load_fixture()
+    day = payload["days"][0]
+
+    async def delay():
+        if slow_rate and random.random() < slow_rate:
+            await asyncio.sleep(slow_latency)
+        elif latency:
+            await asyncio.sleep(latency)
+
+    async def respond(request: Request, days: list[dict]) -> Response:
+        await delay()
+        city = request.path_params["city"]
+        if error_rate and random.random() < error_rate:
+            return Response("Internal Server Error", status_code=500)
+        if not_found_rate and _is_unknown(city, not_found_rate):
+            return Response("Not found", status_code=404)
+        body = dict(payload, address=city, resolvedAddress=city.title(), days=days)
+        body = project(body, request.query_params.get("include"), request.query_params.get("elements"))
+        return Response(json.dumps(body), media_type="application/json")
+
+    async def weatherapi(request: Request) -> Response:
+        await delay()
+        city = request.query_params.get("q", "")
+        if error_rate and random.random() < error_rate:
+            return Response("Internal Server Error", status_code=500)
+        if not_found_rate and _is_unknown(city, not_found_rate):
+            error = {"error": {"code": 1006, "message": "No matching location found."}}
+            return Response(json.dumps(error), status_code=400, media_type="application/json")
+        if "dt" in request.query_params:
+            start = date.fromisoformat(request.query_params["dt"])
+            end = date.fromisoformat(request.query_params.get("end_dt", request.query_params["dt"]))
+        else:
+            start = date.today()
+            end = start + timedelta(days=int(request.query_params.get("days", 1)) - 1)
+        days = [dict(day, datetime=(start + timedelta(days=i)).isoformat()) for i in range((end - start).days + 1)]
+        return Response(json.dumps(_weatherapi_body(payload, city, days)), media_type="application/json")
+
+    async def today(request: Request):
+        return await respond(request, payload["days"])
+
+    async def period(request: Request):
+        try:
+            start = date.fromisoformat(request.path_params["start"])
+            end = date.fromisoformat(request.path_params["end"])
+        except ValueError:
+            return Response("Bad API Request: Invalid date", status_code=400)
+        days = [dict(day, datetime=(start + timedelta(days=i)).isoformat()) for i in range((end - start).days + 1)]
+        return await respond(request, days)
+
+    return Starlette(routes=[
+        Route("/v1/forecast.json", weatherapi),
+        Route("/v1/history.json", weatherapi),
+        Route("/{city}/today", today),
+        Route("/{city}/{start}/{end}", period),
+    ])
+
+
+class StubProvider:
+    """Run the stub app with uvicorn in a background thread"""
+
+    def __init__(self, port: int = 8765, **options):
+        self.port = port
+        self.config = uvicorn.Config(build_app(**options), host="127.0.0.1", port=port, log_level="warning")
+        self.server = uvicorn.Server(self.config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/"
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Visual Crossing timeline API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before each response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 500")
+    parser.add_argument("--not-found-rate", type=float, default=0.0, help="Share of city names answered with a 404")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Share of requests answered after --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="Seconds before a slow response")
+    args = parser.parse_args()
+    app = build_app(latency=args.latency, error_rate=args.error_rate, not_found_rate=args.not_found_rate,
+                    slow_rate=args.slow_rate, slow_latency=args.slow_latency)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
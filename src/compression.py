@@ -0,0 +1,107 @@
+"""
+gzip/brotli compression of response bodies, negotiated from Accept-Encoding.
+
+Only bodies with a Content-Length of at least COMPRESSION_MIN_BYTES are
+compressed, so streamed responses (NDJSON, SSE) keep flushing every result
+as it is ready. A compressed body is a different representation, so its ETag turns weak;
+If-None-Match compares weakly and still revalidates it.
+"""
+import gzip
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from src.settings import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSION_ENABLED = settings.compression_enabled
+COMPRESSION_MIN_BYTES = settings.compression_min_bytes
+COMPRESSION_GZIP_LEVEL = settings.compression_gzip_level
+COMPRESSION_BROTLI_QUALITY = settings.compression_brotli_quality
+
+# Preferred in this order on equal q-values
+ENCODINGS = {"gzip": lambda body: gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL)}
+if brotli is not None:
+    ENCODINGS = {"br": lambda body: brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY), **ENCODINGS}
+
+_COMPRESSIBLE_TYPES = ("application/json", "text/plain", "text/html")
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    """Best supported encoding the client accepts, None for identity"""
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for name in ENCODINGS:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def _compressible(headers: Headers) -> bool:
+    return "content-encoding" not in headers and headers.get("content-type", "").startswith(_COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware. Bodies are buffered only when Content-Length says they are
+    big enough to compress; NDJSON and SSE have no length and pass straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start = None
+        chunks = []
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=list(message["headers"]))
+                if not _compressible(headers):
+                    await send(message)
+                    return
+                headers.add_vary_header("Accept-Encoding")
+                message = {**message, "headers": headers.raw}
+                if encoding is None or int(headers.get("content-length", 0)) < COMPRESSION_MIN_BYTES:
+                    await send(message)
+                    return
+                # Hold back the headers until the whole body is here
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = ENCODINGS[encoding](b"".join(chunks))
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+            await send({**start, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,6 +1,8 @@
+import math
+
 from fastapi import Request
 from fastapi.responses import JSONResponse
-from src.exceptions import WeatherProviderError, WetaherNotFoundError, InvalidInputError
+from src.exceptions import WeatherProviderError, WetaherNotFoundError, InvalidInputError, UpstreamUnavailableError
 
 def register_exception_handlers(app):
     @app.exception_handler(WeatherProviderError)
@@ -10,6 +12,14 @@ def register_exception_handlers(app):
             content={"detail": str(exc)}
         )
 
+    @app.exception_handler(UpstreamUnavailableError)
+    async def upstream_unavailable_error_handler(request: Request, exc: UpstreamUnavailableError):
+        return JSONResponse(
+            status_code=503,
+            content={"detail": str(exc)},
+            headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+        )
+
     @app.exception_handler(WetaherNotFoundError)
     async def weather_not_found_error_handler(request: Request, exc: WetaherNotFoundError):
         return JSONResponse(
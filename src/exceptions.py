@@ -5,5 +5,11 @@ class WeatherProviderError(Exception):
 class WetaherNotFoundError(WeatherProviderError):
     pass
 
+class UpstreamUnavailableError(WeatherProviderError):
+    """Provider call refused locally (circuit open or too many calls in flight)"""
+    def __init__(self, message: str, retry_after: float = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
 class InvalidInputError(Exception):
     pass
\ No newline at end of file
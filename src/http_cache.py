@@ -0,0 +1,133 @@
+"""
+HTTP caching headers, so a CDN or reverse proxy in front of the API can
+answer repeat requests itself.
+
+Weather responses advertise the same lifetime as the cache entry behind
+them: `max-age` is the soft TTL and `Age` the entry's age, so a shared
+cache keeps a response exactly as long as it would be a HIT here, then
+serves it stale while revalidating until the hard TTL, like we do.
+Responses are tagged with surrogate keys, so one city or cell can be purged
+from the CDN without flushing everything.
+"""
+import re
+import hmac
+import hashlib
+import logging
+
+from typing import Callable
+from email.utils import formatdate, parsedate_to_datetime
+
+from src.settings import settings
+from src.http_client import get_http_client
+from src.services.weather_cache import CacheEntry, CACHE_TTL, CACHE_HARD_TTL
+
+
+logger = logging.getLogger(__name__)
+
+# Required in X-Purge-Token by POST /weather/purge; purging is off without it
+PURGE_TOKEN = settings.purge_token
+# POSTed to when a surrogate key is purged, with {key} replaced, e.g. https://api.fastly.com/service/<id>/purge/{key}
+CDN_PURGE_URL = settings.cdn_purge_url
+CDN_PURGE_TOKEN = settings.cdn_purge_token
+CDN_PURGE_TOKEN_HEADER = settings.cdn_purge_token_header
+
+# Tags every weather response, purging it flushes all of them
+SURROGATE_KEY_ALL = "weather"
+
+NO_STORE = "no-store"
+# Per-worker state that must never be served from a shared cache
+NO_STORE_PATHS = frozenset({"/health", "/ready", "/metrics", "/stats"})
+
+_STALE_WINDOW = CACHE_HARD_TTL - CACHE_TTL
+WEATHER_CACHE_CONTROL = f"public, max-age={CACHE_TTL}" + (
+    f", stale-while-revalidate={_STALE_WINDOW}, stale-if-error={_STALE_WINDOW}" if _STALE_WINDOW else ""
+)
+
+_stats = {
+    "not_modified": 0,
+    "cdn_purges": 0,
+    "cdn_purge_errors": 0,
+}
+
+
+def city_surrogate_key(canonical: str) -> str:
+    """'london, england, united kingdom' -> 'city-london-england-united-kingdom'"""
+    slug = re.sub(r"[^a-z0-9]+", "-", canonical).strip("-")
+    # Names with no ASCII letters at all still need a key of their own
+    return f"city-{slug or hashlib.blake2b(canonical.encode(), digest_size=8).hexdigest()}"
+
+
+def cell_surrogate_key(cell: str) -> str:
+    return f"geo-{cell}"
+
+
+def weather_headers(entry: CacheEntry, surrogate_key: Callable[[], str]) -> dict[str, str]:
+    """
+    Freshness, Last-Modified and surrogate keys of a cached weather response,
+    all but Age. Built once per entry and kept on it, like its body, so hits
+    only add the headers that change.
+    """
+    if entry.headers is None:
+        entry.headers = {
+            "Cache-Control": WEATHER_CACHE_CONTROL,
+            "Expires": formatdate(entry.fetched_at + CACHE_TTL, usegmt=True),
+            "Last-Modified": formatdate(entry.fetched_at, usegmt=True),
+            "Surrogate-Key": f"{SURROGATE_KEY_ALL} {surrogate_key()}",
+        }
+    return entry.headers
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag.removeprefix("W/") in candidates
+
+
+def _not_modified_since(if_modified_since: str, last_modified: float) -> bool:
+    try:
+        return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def is_not_modified(if_none_match: str | None, if_modified_since: str | None, etag: str, last_modified: float) -> bool:
+    """Whether a conditional GET can be answered with a 304; If-None-Match wins over If-Modified-Since"""
+    if if_none_match:
+        matched = _etag_matches(if_none_match, etag)
+    elif if_modified_since:
+        matched = _not_modified_since(if_modified_since, last_modified)
+    else:
+        return False
+    if matched:
+        _stats["not_modified"] += 1
+    return matched
+
+
+def purge_allowed(token: str | None) -> bool:
+    if not PURGE_TOKEN or token is None:
+        return False
+    return hmac.compare_digest(token.encode(), PURGE_TOKEN.encode())
+
+
+async def purge_cdn(surrogate_key: str) -> str:
+    """Ask the CDN to drop every response tagged with surrogate_key"""
+    if not CDN_PURGE_URL:
+        return "not configured"
+    headers = {CDN_PURGE_TOKEN_HEADER: CDN_PURGE_TOKEN} if CDN_PURGE_TOKEN else {}
+    try:
+        client = await get_http_client()
+        response = await client.post(CDN_PURGE_URL.format(key=surrogate_key), headers=headers)
+        response.raise_for_status()
+    except Exception as e:
+        _stats["cdn_purge_errors"] += 1
+        logger.warning(f"CDN purge failed for surrogate key: {surrogate_key} ({e})")
+        return "failed"
+    _stats["cdn_purges"] += 1
+    logger.info(f"Purged surrogate key from the CDN: {surrogate_key}")
+    return "purged"
+
+
+def get_stats() -> dict:
+    return dict(_stats)
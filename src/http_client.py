@@ -0,0 +1,90 @@
+import logging
+import importlib.util
+
+import httpx
+
+from src.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_MAX_CONNECTIONS = settings.upstream_max_connections
+UPSTREAM_MAX_KEEPALIVE = settings.upstream_max_keepalive
+UPSTREAM_KEEPALIVE_EXPIRY = settings.upstream_keepalive_expiry
+UPSTREAM_HTTP2 = settings.upstream_http2
+
+# Per-phase timeouts (seconds)
+UPSTREAM_CONNECT_TIMEOUT = settings.upstream_connect_timeout
+UPSTREAM_READ_TIMEOUT = settings.upstream_read_timeout
+UPSTREAM_WRITE_TIMEOUT = settings.upstream_write_timeout
+UPSTREAM_POOL_TIMEOUT = settings.upstream_pool_timeout
+
+http_client: httpx.AsyncClient | None = None
+http2_active = False
+
+
+def _http2_enabled() -> bool:
+    if not UPSTREAM_HTTP2:
+        return False
+    # HTTP/2 needs the optional h2 package (pip install "httpx[http2]")
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("UPSTREAM_HTTP2 is set but the 'h2' package is not installed, using HTTP/1.1")
+        return False
+    return True
+
+
+async def initialize_http_client() -> httpx.AsyncClient:
+    global http_client, http2_active
+    http2_active = _http2_enabled()
+    http_client = httpx.AsyncClient(
+        http2=http2_active,
+        limits=httpx.Limits(
+            max_connections=UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+            keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            connect=UPSTREAM_CONNECT_TIMEOUT,
+            read=UPSTREAM_READ_TIMEOUT,
+            write=UPSTREAM_WRITE_TIMEOUT,
+            pool=UPSTREAM_POOL_TIMEOUT,
+        ),
+    )
+    return http_client
+
+
+async def close_http_client():
+    global http_client
+    if http_client:
+        await http_client.aclose()
+        http_client = None
+
+
+async def get_http_client() -> httpx.AsyncClient:
+    global http_client
+    if http_client is None:
+        # Used outside the app lifespan (e.g. TestClient without a context manager)
+        logger.warning("HTTP client used before lifespan startup, creating it lazily")
+        await initialize_http_client()
+    return http_client
+
+
+def get_pool_status() -> dict:
+    """Summarize the upstream connection pool for the health check"""
+    if http_client is None or http_client.is_closed:
+        return {"status": "closed", "detail": "upstream client not initialized"}
+
+    connections = []
+    pool = getattr(http_client._transport, "_pool", None)
+    if pool is not None:
+        connections = pool.connections
+    idle = sum(1 for c in connections if c.is_idle())
+
+    return {
+        "status": "healthy",
+        "detail": (
+            f"connections={len(connections)} idle={idle} "
+            f"max_connections={UPSTREAM_MAX_CONNECTIONS} max_keepalive={UPSTREAM_MAX_KEEPALIVE} "
+            f"http2={http2_active}"
+        ),
+    }
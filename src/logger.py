@@ -1,51 +1,133 @@
+import json
+import queue
+import atexit
 import logging
 import sys
 import os
 
-from logging.handlers import RotatingFileHandler
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 
-def setup_logger():
+from src.settings import Settings, settings
+
+# Set per request by the middleware, picked up by every log record of that request
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+# Structured fields that are copied into JSON logs when passed via `extra`
+_EXTRA_FIELDS = ("request_id", "method", "path", "status", "city", "cache_status", "duration")
+
+_listener: QueueListener | None = None
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request id to every record"""
+
+    def filter(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with request fields as top-level keys"""
+
+    def format(self, record):
+        entry = {
+            "timestamp": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in _EXTRA_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class OverflowQueueHandler(QueueHandler):
+    """Queue handler that either blocks or drops records when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue, block: bool):
+        super().__init__(log_queue)
+        self.block = block
+        self.dropped = 0
+
+    def enqueue(self, record):
+        if self.block:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logger(config: Settings = settings):
     """Configure logging for the application"""
 
     #Create logger instance
     logger = logging.getLogger()
 
     #Retreive environment
-    env = os.getenv("ENV", "development")
+    env = config.env
 
     #Setting log level based on environment
     if env == "production":
         logger.setLevel(logging.WARNING)
     else:
         logger.setLevel(logging.DEBUG)
+    # Explicit override, e.g. INFO in development to skip per-request debug logs
+    if config.log_level:
+        logger.setLevel(config.log_level.upper())
 
     #Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    if config.log_format == "json":
+        formatter = JsonFormatter(datefmt='%Y-%m-%dT%H:%M:%S')
+    else:
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
 
     #Console handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(logging.DEBUG)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
 
         # File handler - saves all logs to file
     # Create logs directory if it doesn't exist
-    log_dir = "logs"
+    log_dir = config.log_dir
     os.makedirs(log_dir, exist_ok=True)
-    
+
     # Rotating file handler - creates new file when size limit reached
     file_handler = RotatingFileHandler(
         filename=os.path.join(log_dir, "app.log"),
         maxBytes=10 * 1024 * 1024,  # 10 MB
         backupCount=5,  # Keep 5 old log files
-        encoding='utf-8'
+        encoding='utf-8',
+        delay=True  # Open the file on the first record, not at startup
     )
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+
+    handlers = [console_handler, file_handler]
+    if config.log_queue_enabled:
+        # Request handlers only enqueue records; a background thread formats and writes them
+        global _listener
+        log_queue = queue.Queue(maxsize=config.log_queue_maxsize)
+        queue_handler = OverflowQueueHandler(log_queue, block=config.log_queue_overflow == "block")
+        queue_handler.addFilter(RequestContextFilter())
+        logger.addHandler(queue_handler)
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logger)
+    else:
+        for handler in handlers:
+            handler.addFilter(RequestContextFilter())
+            logger.addHandler(handler)
 
 
     logging.getLogger("httpx").setLevel(logging.WARNING)
@@ -53,4 +135,28 @@ def setup_logger():
     logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
     logging.getLogger("asyncio").setLevel(logging.WARNING)
 
-    return logger
\ No newline at end of file
+    return logger
+
+
+def _restart_listener():
+    """The listener thread does not survive a fork, give the child its own queue and thread"""
+    global _listener
+    if _listener is None:
+        return
+    log_queue = queue.Queue(maxsize=_listener.queue.maxsize)
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, QueueHandler):
+            handler.queue = log_queue
+    _listener = QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+os.register_at_fork(after_in_child=_restart_listener)
+
+
+def shutdown_logger():
+    """Flush queued records and stop the background listener"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
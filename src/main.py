@@ -1,80 +1,151 @@
-import os
+# First, so the imports step below covers every dependency of the app
+from src import startup
+
 import re
+import json
+import time
+import uuid
+import asyncio
 import logging
 
-from dotenv import load_dotenv
-from fastapi import FastAPI, Depends, Query, Request, Response, HTTPException
+from fastapi import FastAPI, Depends, Query, Request, Response, HTTPException, Header
+from fastapi.responses import StreamingResponse
 
 from redis.asyncio import Redis
-from fastapi_limiter import FastAPILimiter
-from fastapi_limiter.depends import RateLimiter
-from datetime import datetime
+from math import ceil
+from datetime import date, datetime, timedelta
 from contextlib import asynccontextmanager
 
-from src.services.weather_client import fetch_weather
+from src import metrics, rate_limiter, redis_client, readiness, worker, http_cache
+from src.settings import settings
+from src.services.weather_client import fetch_weather_entry, fetch_weather_batch, stream_weather, warm_key, canonical_city, purge_city, BATCH_MAX_CITIES, STREAM_MAX_CITIES
+from src.services import singleflight, weather_cache, weather_range, city_aliases, negative_cache, prewarmer, hedging, weather_geo
+from src.services.circuit_breaker import breaker, OPEN
+from src.services.disk_cache import disk_cache
+from src.services.concurrency_limiter import upstream_limiter
 from src.exception_handlers import register_exception_handlers
 from src.exceptions import InvalidInputError
 from src.redis_client import initialize_redis, close_redis, get_redis
-from src.logger import setup_logger
-from src.models import WeatherResponse, HealthResponse, ErrorResponse, WEATHER_RESPONSES
+from src.http_client import initialize_http_client, close_http_client, get_pool_status
+from src.logger import setup_logger, request_id_var
+from src.compression import CompressionMiddleware
+from src.models import WeatherResponse, WeatherRangeResponse, HealthResponse, ReadinessResponse, StatsResponse, PurgeResponse, ErrorResponse, BatchWeatherRequest, BatchWeatherResponse, WEATHER_RESPONSES, RANGE_RESPONSES, BATCH_RESPONSES, STREAM_RESPONSES, PURGE_RESPONSES
+
+startup.record("imports", time.perf_counter() - startup.started_at)
 
 
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    with startup.step("http_client"):
+        await initialize_http_client()
+    logger.info("Upstream HTTP client initialized")
     try:
-        redis = await initialize_redis()
-        await FastAPILimiter.init(redis)
-        logger.info("Limiter initialized successfully")
+        with startup.step("redis_client"):
+            await initialize_redis()
+        logger.info("Redis initialized successfully")
     except Exception as e:
-        logger.error(f"Limiter initialization failed: {e}")
+        logger.error(f"Redis initialization failed: {e}")
+    # Connections are opened in the background, /ready turns green once they are
+    warm_up_task = asyncio.create_task(readiness.warm_up())
+
+    invalidation_task = None
+    # Purges always publish their invalidation, so listen whenever purging is on
+    if weather_cache.USE_REDIS and (weather_cache.L1_INVALIDATION_ENABLED or http_cache.PURGE_TOKEN):
+        invalidation_task = asyncio.create_task(weather_cache.run_invalidation_listener())
+    compaction_task = None
+    if weather_cache.USE_DISK:
+        compaction_task = asyncio.create_task(disk_cache.run_compaction())
+    prewarm_task = None
+    if prewarmer.PREWARM_ENABLED:
+        prewarm_task = asyncio.create_task(prewarmer.run_prewarmer(warm_key))
     yield
     
+    readiness.stopping()
+    warm_up_task.cancel()
+    if invalidation_task:
+        invalidation_task.cancel()
+    if prewarm_task:
+        prewarm_task.cancel()
+    if compaction_task:
+        compaction_task.cancel()
+        disk_cache.close()
     await close_redis()
+    await close_http_client()
     logger.info("Application shutdown complete")
 
 
 
-load_dotenv()
+# Batches and streams cost one rate limit token per BATCH_CITIES_PER_TOKEN cities
+BATCH_CITIES_PER_TOKEN = settings.batch_cities_per_token
 
 
 
 app = FastAPI(lifespan=lifespan)
-setup_logger()
+with startup.step("logger"):
+    setup_logger()
 logger = logging.getLogger(__name__)
 
 register_exception_handlers(app)
 
 @app.middleware("http")
 async def log_request_time(request: Request, call_next):
-    """Middleware to log the time taken for each request"""
-    start_time = datetime.now()
-    response = await call_next(request)
-    duration = (datetime.now() - start_time).total_seconds()
-    logger.info(f"Request: {request.method} {request.url} completed in {duration:.4f} seconds")
-    return response
+    """Middleware to log and record the time taken for each request"""
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    start_time = time.perf_counter()
+    worker.request_started()
+    try:
+        response = await call_next(request)
+        duration = time.perf_counter() - start_time
+        # Label by route template, not the raw path, to keep metric cardinality bounded
+        route = request.scope.get("route")
+        metrics.observe_request(request.method, route.path if route else "unmatched", response.status_code, duration)
+        response.headers["X-Request-ID"] = request_id
+        if response.status_code >= 400 or request.url.path in http_cache.NO_STORE_PATHS:
+            # Errors and per-worker state must never be served from a shared cache
+            response.headers["Cache-Control"] = http_cache.NO_STORE
+        logger.info(
+            "Request: %s %s completed in %.4f seconds", request.method, request.url, duration,
+            extra={
+                "method": request.method,
+                "path": request.url.path,
+                "status": response.status_code,
+                "city": request.query_params.get("city"),
+                "cache_status": response.headers.get("X-Cache"),
+                "duration": round(duration, 6),
+            },
+        )
+        return response
+    finally:
+        worker.request_finished()
+        request_id_var.reset(token)
+
+# Outermost, so it compresses the final body and headers
+app.add_middleware(CompressionMiddleware)
 
 async def safe_rate_limit(request: Request, response: Response):
-    """Rate limiter that fails open if Redis is unavailable"""
-    
-    if not FastAPILimiter.redis:
-        # Redis is down, skip rate limiting 
-        return
-    
-    try:
-        # Apply rate limiting when Redis is available
-        limiter = RateLimiter(times=5, seconds=60)
-        await limiter(request, response)
-    except Exception as e:
-        # Only fail open for connection errors, not rate limit errors
-        error_message = str(e)
-        if "429" in error_message or "Too Many Requests" in error_message:
-            # This is a legitimate rate limit - re-raise it
-            raise
-        # For other errors (Redis connection issues), fail open
-        logger.warning(f"Rate limiting failed (Redis issue): {e}")
-        return
+    """Rate limiter backed by Redis, falling back to a per-worker limiter if Redis is unavailable"""
+    await rate_limiter.enforce(request, response)
+
+
+def _batch_cost(cities: list[str]) -> int:
+    return max(1, ceil(len(cities) / BATCH_CITIES_PER_TOKEN))
+
+
+def _validate_city(city: str) -> str:
+    city = city.strip()
+    if not city:
+        raise InvalidInputError("City name cannot be empty or whitespace.")
+    if not re.fullmatch(r"[A-Za-zÀ-ÖØ-öø-ÿ\s,.'-]+", city):
+        raise InvalidInputError("City contains invalid characters.")
+    return city
+
+
+def _passthrough_headers(response: Response) -> dict[str, str]:
+    # Headers set by dependencies (e.g. RateLimit-*) on the injected response
+    return {key: value for key, value in response.headers.items() if key != "content-length"}
 
 
 #Endpoint to check application health
@@ -84,11 +155,11 @@ async def health_check():
     Health check endpoint for monitoring.
     
     Returns the overall service status and health of all dependencies including
-    Redis server and rate limiting service.
+    Redis server, rate limiting service, the upstream connection pool and the
+    provider circuit breaker, as seen by the worker process that answered.
     """
     redis_status = "healthy"
     redis_detail = "connected"
-    rate_limit_status = "disabled"
     application_status = "ok"
 
     try:
@@ -102,13 +173,13 @@ async def health_check():
         redis_detail = f"connection failed: {str(e)}"
         application_status = "degraded"
 
-    if FastAPILimiter.redis:   
-        try:
-            await FastAPILimiter.redis.ping()
-            rate_limit_status = "enabled"
-            # application_status = "ok"
-        except Exception:
-            pass
+    # Without Redis each worker enforces its own in-memory limits
+    rate_limit_status = "enabled" if redis_status == "healthy" else "local fallback"
+
+    breaker_status = breaker.get_status()
+    if breaker_status["status"] == OPEN:
+        # Cached cities are still served, misses fail fast with a 503
+        application_status = "degraded"
 
     return{
         "status": application_status,
@@ -122,22 +193,280 @@ async def health_check():
             },
             "rate_limiting":{
                 "status": rate_limit_status
-            }
-        }
+            },
+            "upstream": get_pool_status(),
+            "circuit_breaker": breaker_status
+        },
+        "worker": worker.get_status()
     }
     
 
+@app.get("/ready", response_model=ReadinessResponse, responses={503: {"model": ReadinessResponse, "description": "Still warming up or shutting down"}}, summary="Readiness Check", description="Whether this worker should receive traffic")
+async def readiness_check(response: Response):
+    """
+    Readiness probe, separate from /health.
+
+    Returns 503 until this worker has opened its Redis connections and a
+    connection to the weather provider, and again once it starts shutting
+    down. Also reports how long each startup step took.
+    """
+    if not readiness.is_ready():
+        response.status_code = 503
+    return readiness.get_status()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    payload, content_type = metrics.render_metrics()
+    return Response(content=payload, media_type=content_type)
+
+
+@app.get("/stats", response_model=StatsResponse, summary="Internal Stats", description="Counters for caching and upstream coalescing")
+async def stats():
+    """
+    Per-process counters for the caching layer.
+
+    Counters are kept in memory and reset when the worker restarts.
+    """
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "subsystems": {
+            "singleflight": singleflight.get_stats(),
+            "l1_cache": weather_cache.l1_cache.stats(),
+            "disk_cache": disk_cache.stats(),
+            "aliases": city_aliases.get_stats(),
+            "negative_cache": negative_cache.get_stats(),
+            "prewarmer": prewarmer.get_stats(),
+            "circuit_breaker": breaker.stats(),
+            "upstream_limiter": upstream_limiter.stats(),
+            "ranges": weather_range.get_stats(),
+            "geo": weather_geo.get_stats(),
+            "redis": redis_client.get_stats(),
+            "http_cache": http_cache.get_stats(),
+            **hedging.get_stats()
+        }
+    }
+
+
 @app.get("/weather", response_model=WeatherResponse, responses=WEATHER_RESPONSES, dependencies=[Depends(safe_rate_limit)])
-async def get_weather(city: str = Query(..., min_length=1, max_length=60, description="City name to get weather for")):
+async def get_weather(
+    request: Request,
+    response: Response,
+    city: str | None = Query(None, min_length=1, max_length=60, description="City name to get weather for"),
+    lat: float | None = Query(None, ge=-90, le=90, description="Latitude, together with lon instead of a city"),
+    lon: float | None = Query(None, ge=-180, le=180, description="Longitude, together with lat instead of a city"),
+):
     """
-    Get current weather data for a specified city.
+    Get current weather data for a specified city, or for a coordinate.
     
     Returns weather information including temperature, precipitation, wind, and more.
-    Data is cached for 10 minutes to improve performance.
+    Data is cached for 10 minutes to improve performance. Once that expires the cached
+    data is still served (marked STALE in the X-Cache header) while it is refreshed
+    in the background.
+
+    Coordinates are snapped to a geohash cell (X-Geo-Cell) and cached per cell. While
+    the provider is failing, a cached cell nearby may be served instead (X-Cache NEARBY,
+    with its distance in X-Geo-Distance-Km).
+
+    Cache-Control, Age and Expires let a CDN keep the response as long as it is
+    fresh here; ETag and Last-Modified revalidate it to a 304. Surrogate-Key tags
+    it for POST /weather/purge.
     """
-    city = city.strip()
-    if not city:
-        raise InvalidInputError("City name cannot be empty or whitespace.")
-    if not re.fullmatch(r"[A-Za-zÀ-ÖØ-öø-ÿ\s,.'-]+", city):
-        raise InvalidInputError("City contains invalid characters.")
-    return await fetch_weather(city)
\ No newline at end of file
+    if city is not None and (lat is not None or lon is not None):
+        raise InvalidInputError("Use either city or lat and lon, not both.")
+    geo_headers = {}
+    if city is not None:
+        city = _validate_city(city)
+        entry, cache_status = await fetch_weather_entry(city)
+        cache_headers = http_cache.weather_headers(entry, lambda: http_cache.city_surrogate_key(canonical_city(city, entry)))
+    elif lat is not None and lon is not None:
+        entry, cache_status, cell, distance = await weather_geo.fetch_weather_at(lat, lon)
+        geo_headers["X-Geo-Cell"] = cell
+        cache_headers = http_cache.weather_headers(entry, lambda: http_cache.cell_surrogate_key(cell))
+        if cache_status == weather_geo.NEARBY:
+            geo_headers["X-Geo-Distance-Km"] = f"{distance:.1f}"
+            # Another cell's weather, only good for this outage
+            cache_headers = {"Cache-Control": http_cache.NO_STORE}
+    else:
+        raise HTTPException(status_code=422, detail="Provide city, or both lat and lon.")
+    # Serve the pre-serialized body as is, skipping response model validation
+    body, etag = weather_cache.response_body(entry)
+    age = str(int(entry.age))
+    headers = {
+        **_passthrough_headers(response),
+        **cache_headers,
+        "Age": age,
+        "ETag": etag,
+        "X-Cache": cache_status,
+        "X-Cache-Age": age,
+        **geo_headers,
+    }
+    if http_cache.is_not_modified(request.headers.get("If-None-Match"), request.headers.get("If-Modified-Since"), etag, entry.fetched_at):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.post("/weather/purge", response_model=PurgeResponse, responses=PURGE_RESPONSES, dependencies=[Depends(safe_rate_limit)])
+async def purge_weather(
+    request: Request,
+    city: str | None = Query(None, min_length=1, max_length=60, description="City to purge"),
+    lat: float | None = Query(None, ge=-90, le=90, description="Latitude of the cell to purge, with lon"),
+    lon: float | None = Query(None, ge=-180, le=180, description="Longitude of the cell to purge, with lat"),
+    x_purge_token: str | None = Header(None, description="Must match PURGE_TOKEN"),
+):
+    """
+    Drop the cached weather of one city or geohash cell.
+
+    Deletes it from every cache tier and every worker's L1 cache, then purges its
+    surrogate key from the CDN when CDN_PURGE_URL is set, so the next request is
+    fetched fresh. Every purge is logged with the caller's address.
+    """
+    caller = rate_limiter.client_ip(request)
+    if not http_cache.purge_allowed(x_purge_token):
+        logger.warning("Purge refused for %s: missing or wrong X-Purge-Token", caller)
+        raise HTTPException(status_code=403, detail="Purging is not allowed.")
+    if not weather_cache.USE_REDIS and worker.WEB_WORKERS > 1:
+        # Without Redis pub/sub the other workers would keep serving the entry from their L1
+        raise HTTPException(status_code=503, detail="Purging needs Redis when several workers serve the API.")
+    if city is not None and (lat is not None or lon is not None):
+        raise InvalidInputError("Use either city or lat and lon, not both.")
+    if city is not None:
+        surrogate_key = http_cache.city_surrogate_key(await purge_city(_validate_city(city)))
+    elif lat is not None and lon is not None:
+        surrogate_key = http_cache.cell_surrogate_key(await weather_geo.purge_cell(lat, lon))
+    else:
+        raise HTTPException(status_code=422, detail="Provide city, or both lat and lon.")
+    cdn = await http_cache.purge_cdn(surrogate_key)
+    logger.info("Purged %s for %s (CDN: %s)", surrogate_key, caller, cdn)
+    return {"surrogate_key": surrogate_key, "cdn": cdn}
+
+
+@app.get("/weather/forecast", response_model=WeatherRangeResponse, responses=RANGE_RESPONSES, dependencies=[Depends(safe_rate_limit)])
+async def get_forecast(
+    response: Response,
+    city: str = Query(..., min_length=1, max_length=60, description="City name to get the forecast for"),
+    days: int = Query(7, ge=1, le=weather_range.FORECAST_MAX_DAYS, description="Number of days, starting today (UTC)"),
+):
+    """
+    Get a daily forecast for a city.
+
+    Each city-day is cached on its own, so overlapping requests only fetch the
+    days that are not cached yet. The X-Cache header is HIT, PARTIAL or MISS.
+    """
+    city = _validate_city(city)
+    start = weather_range.utc_today()
+    result, cache_status = await weather_range.fetch_range(city, start, start + timedelta(days=days - 1))
+    response.headers["X-Cache"] = cache_status
+    return result
+
+
+@app.get("/weather/history", response_model=WeatherRangeResponse, responses=RANGE_RESPONSES, dependencies=[Depends(safe_rate_limit)])
+async def get_history(
+    response: Response,
+    city: str = Query(..., min_length=1, max_length=60, description="City name to get past weather for"),
+    start: date = Query(..., description="First day (YYYY-MM-DD)"),
+    end: date = Query(..., description="Last day (YYYY-MM-DD), at most today"),
+):
+    """
+    Get observed daily weather for a city over a date range.
+
+    Past days never change and are cached for WEATHER_HISTORY_TTL. The X-Cache
+    header is HIT, PARTIAL or MISS.
+    """
+    city = _validate_city(city)
+    if start > end:
+        raise InvalidInputError("start must not be after end.")
+    if end > weather_range.utc_today():
+        raise InvalidInputError("end cannot be in the future, use /weather/forecast.")
+    if (end - start).days + 1 > weather_range.HISTORY_MAX_DAYS:
+        raise InvalidInputError(f"History is limited to {weather_range.HISTORY_MAX_DAYS} days")
+    result, cache_status = await weather_range.fetch_range(city, start, end)
+    response.headers["X-Cache"] = cache_status
+    return result
+
+
+@app.post("/weather/batch", response_model=BatchWeatherResponse, responses=BATCH_RESPONSES)
+async def get_weather_batch(request: Request, response: Response, body: BatchWeatherRequest):
+    """
+    Get current weather data for many cities in one request.
+
+    Every city gets its own status, so an unknown or invalid city does not fail
+    the whole batch. Costs one rate limit token per 25 cities.
+    """
+    if len(body.cities) > BATCH_MAX_CITIES:
+        raise InvalidInputError(f"Batch is limited to {BATCH_MAX_CITIES} cities")
+    await rate_limiter.enforce(request, response, cost=_batch_cost(body.cities))
+
+    invalid = {}
+    valid = []
+    for i, city in enumerate(body.cities):
+        try:
+            valid.append((i, _validate_city(city)))
+        except InvalidInputError as e:
+            invalid[i] = {"city": city, "status": 400, "detail": str(e)}
+
+    fetched = await fetch_weather_batch([city for _, city in valid]) if valid else []
+    results = dict(invalid)
+    for (i, _), item in zip(valid, fetched):
+        results[i] = item
+    return {"results": [results[i] for i in range(len(body.cities))]}
+
+
+
+def _format_ndjson(item: dict) -> str:
+    return json.dumps(item) + "\n"
+
+
+def _format_sse(item: dict) -> str:
+    return f"event: weather\ndata: {json.dumps(item)}\n\n"
+
+
+@app.post("/weather/stream", responses=STREAM_RESPONSES, response_class=StreamingResponse)
+async def stream_weather_batch(
+    request: Request,
+    body: BatchWeatherRequest,
+    format: str | None = Query(None, pattern="^(ndjson|sse)$", description="Stream format, defaults to sse when the client accepts text/event-stream"),
+):
+    """
+    Stream current weather for many cities, one result per city as soon as it is ready.
+
+    Results arrive in completion order and carry the `index` of the city in the request.
+    Uses NDJSON (one JSON object per line) or Server-Sent Events. Disconnecting stops
+    the remaining lookups.
+    """
+    if len(body.cities) > STREAM_MAX_CITIES:
+        raise InvalidInputError(f"Stream is limited to {STREAM_MAX_CITIES} cities")
+    limit = await rate_limiter.enforce(request, cost=_batch_cost(body.cities))
+
+    if format is None:
+        format = "sse" if "text/event-stream" in request.headers.get("accept", "") else "ndjson"
+    formatter = _format_sse if format == "sse" else _format_ndjson
+
+    invalid = []
+    valid_indexes = []
+    valid = []
+    for i, city in enumerate(body.cities):
+        try:
+            valid.append(_validate_city(city))
+            valid_indexes.append(i)
+        except InvalidInputError as e:
+            invalid.append({"index": i, "city": city, "status": 400, "detail": str(e)})
+
+    results = stream_weather(valid) if valid else None
+
+    async def generate():
+        for item in invalid:
+            yield formatter(item)
+        if results is None:
+            return
+        try:
+            async for item in results:
+                # Map the position in the valid list back to the request index
+                yield formatter({**item, "index": valid_indexes[item["index"]]})
+        finally:
+            # Runs on client disconnect too, cancelling the remaining lookups
+            await results.aclose()
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(generate(), media_type=media_type, headers=rate_limiter.rate_limit_headers(limit))
@@ -0,0 +1,103 @@
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+from src.settings import settings
+
+# With several uvicorn workers each process writes its samples to this directory
+# and /metrics aggregates them (see prometheus_client multiprocess mode)
+PROMETHEUS_MULTIPROC_DIR = settings.prometheus_multiproc_dir
+
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram(
+    "weather_api_request_duration_seconds",
+    "HTTP request latency by route and status",
+    ["method", "route", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "weather_api_cache_lookups_total",
+    "Weather cache lookups by result",
+    ["result"],
+)
+UPSTREAM_LATENCY = Histogram(
+    "weather_api_upstream_duration_seconds",
+    "Weather provider latency by response status code",
+    ["status_code"],
+    buckets=_LATENCY_BUCKETS,
+)
+REDIS_LATENCY = Histogram(
+    "weather_api_redis_command_duration_seconds",
+    "Redis command latency",
+    ["command"],
+    buckets=_LATENCY_BUCKETS,
+)
+UPSTREAM_REJECTIONS = Counter(
+    "weather_api_upstream_rejections_total",
+    "Provider calls refused before being made",
+    ["reason"],
+)
+RATE_LIMIT_DECISIONS = Counter(
+    "weather_api_rate_limit_decisions_total",
+    "Rate limit decisions",
+    ["decision"],
+)
+
+# Label children bound once so the hot path skips the labels() lookup
+CACHE_HIT = CACHE_LOOKUPS.labels("hit")
+CACHE_STALE = CACHE_LOOKUPS.labels("stale")
+CACHE_MISS = CACHE_LOOKUPS.labels("miss")
+CACHE_ERROR = CACHE_LOOKUPS.labels("error")
+# Answered 404 from a not-found tombstone
+CACHE_NEGATIVE = CACHE_LOOKUPS.labels("negative")
+
+REDIS_GET = REDIS_LATENCY.labels("get")
+REDIS_MGET = REDIS_LATENCY.labels("mget")
+REDIS_SET = REDIS_LATENCY.labels("set")
+REDIS_PIPELINE = REDIS_LATENCY.labels("pipeline")
+REDIS_LOCK = REDIS_LATENCY.labels("lock")
+REDIS_RATE_LIMIT = REDIS_LATENCY.labels("rate_limit")
+
+RATE_LIMIT_ACCEPTED = RATE_LIMIT_DECISIONS.labels("accepted")
+RATE_LIMIT_REJECTED = RATE_LIMIT_DECISIONS.labels("rejected")
+# Counted in addition to accepted/rejected when the in-memory limiter decided
+RATE_LIMIT_FALLBACK = RATE_LIMIT_DECISIONS.labels("local_fallback")
+
+UPSTREAM_TIMEOUT = UPSTREAM_LATENCY.labels("timeout")
+UPSTREAM_ERROR = UPSTREAM_LATENCY.labels("error")
+UPSTREAM_CIRCUIT_OPEN = UPSTREAM_REJECTIONS.labels("circuit_open")
+UPSTREAM_SHED = UPSTREAM_REJECTIONS.labels("concurrency_limit")
+
+_request_children = {}
+_upstream_children = {}
+
+
+def observe_request(method: str, route: str, status: int, duration: float):
+    key = (method, route, status)
+    child = _request_children.get(key)
+    if child is None:
+        child = _request_children[key] = REQUEST_LATENCY.labels(method, route, str(status))
+    child.observe(duration)
+
+
+def observe_upstream(status_code: int, duration: float):
+    child = _upstream_children.get(status_code)
+    if child is None:
+        child = _upstream_children[status_code] = UPSTREAM_LATENCY.labels(str(status_code))
+    child.observe(duration)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Return the exposition payload and its content type"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
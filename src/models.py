@@ -54,12 +54,92 @@ class WeatherResponse(BaseModel):
 
 
 
+class DailyWeather(BaseModel):
+    """Weather for one day of a forecast or history range"""
+
+    date: str = Field(..., description="Date (YYYY-MM-DD)")
+    summary: Optional[str] = Field(None, description="Weather summary")
+    conditions: Optional[str] = Field(None, description="Conditions")
+    temp_avg_c: Optional[float] = Field(None, description="Average temperature in Celsius")
+    temp_max_c: Optional[float] = Field(None, description="Maximum temperature in Celsius")
+    temp_min_c: Optional[float] = Field(None, description="Minimum temperature in Celsius")
+    feels_like_c: Optional[float] = Field(None, description="Feels like temperature in Celsius")
+    precip_mm: Optional[float] = Field(None, description="Precipitation in millimeters")
+    precip_prob_percent: Optional[float] = Field(None, description="Precipitation probability percentage")
+    wind_speed_kmh: Optional[float] = Field(None, description="Wind speed in km/h")
+    wind_gust_kmh: Optional[float] = Field(None, description="Wind gust speed in km/h")
+    sunrise: Optional[str] = Field(None, description="Sunrise time (HH:MM:SS)")
+    sunset: Optional[str] = Field(None, description="Sunset time (HH:MM:SS)")
+
+
+class WeatherRangeResponse(BaseModel):
+    """Response model for forecast and history ranges"""
+
+    city: str = Field(..., description="City name as resolved by the provider")
+    timezone: Optional[str] = Field(None, description="Timezone of the city")
+    start: str = Field(..., description="First requested date (YYYY-MM-DD)")
+    end: str = Field(..., description="Last requested date (YYYY-MM-DD)")
+    days: list[DailyWeather] = Field(..., description="One entry per day the provider has data for")
+
+    model_config = ConfigDict(json_schema_extra={
+            "example": {
+                "city": "London, England, United Kingdom",
+                "timezone": "Europe/London",
+                "start": "2026-01-17",
+                "end": "2026-01-18",
+                "days": [
+                    {"date": "2026-01-17", "conditions": "Partially cloudy", "temp_max_c": 10.0, "temp_min_c": 3.8},
+                    {"date": "2026-01-18", "conditions": "Rain", "temp_max_c": 9.1, "temp_min_c": 5.2}
+                ]
+            }
+        })
+
+
+class BatchWeatherRequest(BaseModel):
+    """Request model for looking up several cities at once"""
+
+    cities: list[str] = Field(..., min_length=1, description="City names to get weather for")
+
+    model_config = ConfigDict(json_schema_extra={
+            "example": {
+                "cities": ["London", "Paris", "Berlin"]
+            }
+        })
+
+
+class BatchWeatherItem(BaseModel):
+    """Result for a single city in a batch lookup"""
+
+    city: str = Field(..., description="City name as requested")
+    status: int = Field(..., description="HTTP-style status for this city (200/400/404/503)")
+    cache: Optional[str] = Field(None, description="Cache status (HIT/STALE/MISS) when found")
+    data: Optional[WeatherResponse] = Field(None, description="Weather data when status is 200")
+    detail: Optional[str] = Field(None, description="Error message when status is not 200")
+
+
+class BatchWeatherResponse(BaseModel):
+    """Response model for batch weather lookups"""
+
+    results: list[BatchWeatherItem] = Field(..., description="One result per requested city, in request order")
+
+
 class HealthDependency(BaseModel):
     """Model for health check dependency status"""
     status: str = Field(..., description="Status of the dependency")
     detail: Optional[str] = Field(None, description="Additional details")
 
 
+class WorkerStatus(BaseModel):
+    """Identity and load of one server process"""
+
+    pid: int = Field(..., description="Process id")
+    workers: int = Field(..., description="Configured number of worker processes")
+    started_at: str = Field(..., description="When this worker started (ISO format)")
+    uptime_seconds: float = Field(..., description="Seconds since this worker started")
+    requests: int = Field(..., description="Requests served by this worker")
+    inflight: int = Field(..., description="Requests this worker is handling right now")
+
+
 class HealthResponse(BaseModel):
     """Response model for health check endpoint"""
     
@@ -68,6 +148,7 @@ class HealthResponse(BaseModel):
     service: str = Field(..., description="Service name")
     version: str = Field(..., description="Service version")
     dependencies: dict[str, HealthDependency] = Field(..., description="Status of dependencies")
+    worker: WorkerStatus = Field(..., description="The worker process that answered")
     
     model_config = ConfigDict(
         json_schema_extra={
@@ -83,13 +164,202 @@ class HealthResponse(BaseModel):
                     },
                     "rate_limiting": {
                         "status": "enabled"
+                    },
+                    "upstream": {
+                        "status": "healthy",
+                        "detail": "connections=4 idle=3 max_connections=100 max_keepalive=20 http2=False"
+                    },
+                    "circuit_breaker": {
+                        "status": "closed",
+                        "detail": "1/42 calls failed in the last 30s"
                     }
+                },
+                "worker": {
+                    "pid": 4242,
+                    "workers": 4,
+                    "started_at": "2026-01-17T17:00:00",
+                    "uptime_seconds": 3600.0,
+                    "requests": 18250,
+                    "inflight": 3
                 }
             }
         }
     )
             
 
+class ReadinessResponse(BaseModel):
+    """Response model for the readiness endpoint"""
+
+    status: str = Field(..., description="starting, ready or stopping")
+    checks: dict[str, HealthDependency] = Field(..., description="Warm-up state of each dependency")
+    startup_ms: dict[str, float] = Field(..., description="Duration of each startup step in milliseconds")
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "status": "ready",
+                "checks": {
+                    "redis": {
+                        "status": "healthy",
+                        "detail": "4 connections per client"
+                    },
+                    "upstream": {
+                        "status": "healthy",
+                        "detail": "visualcrossing HTTP 404, weatherapi HTTP 400"
+                    }
+                },
+                "startup_ms": {
+                    "imports": 412.3,
+                    "logger": 1.2,
+                    "http_client": 3.4,
+                    "redis_client": 0.6,
+                    "redis_warm": 2.9,
+                    "upstream_warm": 48.1,
+                    "until_ready": 498.6
+                }
+            }
+        }
+    )
+
+
+class StatsResponse(BaseModel):
+    """Response model for internal counters"""
+
+    timestamp: str = Field(..., description="Current timestamp (ISO format)")
+    subsystems: dict[str, dict[str, int | float]] = Field(..., description="Counters grouped by subsystem")
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "timestamp": "2026-01-17T18:00:00",
+                "subsystems": {
+                    "singleflight": {
+                        "leaders": 12,
+                        "coalesced": 48,
+                        "lock_acquired": 10,
+                        "lock_contended": 2,
+                        "remote_coalesced": 2,
+                        "remote_timeouts": 0,
+                        "inflight": 0
+                    },
+                    "l1_cache": {
+                        "entries": 240,
+                        "max_entries": 1000,
+                        "hits": 9120,
+                        "misses": 310,
+                        "evictions": 0,
+                        "expirations": 12,
+                        "hit_rate": 0.9671
+                    },
+                    "aliases": {
+                        "lookups": 9430,
+                        "alias_hits": 9105,
+                        "suffix_matches": 14,
+                        "aliases_recorded": 325,
+                        "upstream_saved": 8790,
+                        "alias_hit_rate": 0.9655
+                    },
+                    "negative_cache": {
+                        "checks": 10250,
+                        "bloom_passes": 9980,
+                        "tombstone_hits": 262,
+                        "false_positives": 3,
+                        "tombstones_recorded": 41,
+                        "local_tombstones": 41,
+                        "bloom_items": 41,
+                        "bloom_rotations": 0
+                    },
+                    "prewarmer": {
+                        "cycles": 360,
+                        "refreshed": 1180,
+                        "refresh_errors": 2,
+                        "budget_exhausted": 0,
+                        "misses_prevented": 1094,
+                        "leader": 1,
+                        "pending_keys": 37,
+                        "budget_remaining": 52
+                    },
+                    "circuit_breaker": {
+                        "open": 0,
+                        "half_open": 0,
+                        "opened": 1,
+                        "rejected": 214,
+                        "window_calls": 42
+                    },
+                    "upstream_limiter": {
+                        "limit": 27,
+                        "inflight": 3,
+                        "shed": 12
+                    },
+                    "geo": {
+                        "lookups": 1820,
+                        "upstream_calls": 64,
+                        "nearby_served": 3,
+                        "nearby_unavailable": 0,
+                        "indexed_cells": 212
+                    },
+                    "redis": {
+                        "circuit_open": 0,
+                        "consecutive_failures": 0,
+                        "circuit_opened": 1,
+                        "skipped": 840,
+                        "text_connections_in_use": 2,
+                        "text_connections_idle": 14,
+                        "binary_connections_in_use": 1,
+                        "binary_connections_idle": 9
+                    },
+                    "hedging": {
+                        "calls": 310,
+                        "hedged": 18,
+                        "hedge_wins": 11,
+                        "budget_exhausted": 2,
+                        "failovers": 1,
+                        "budget": 9.4
+                    },
+                    "provider_visualcrossing": {
+                        "calls": 310,
+                        "hedges": 0,
+                        "wins": 293,
+                        "errors": 4,
+                        "cancelled": 11,
+                        "win_rate": 0.9452,
+                        "latency_p50_ms": 182.4,
+                        "latency_p95_ms": 640.2,
+                        "hedge_delay_ms": 640.2
+                    },
+                    "provider_weatherapi": {
+                        "calls": 19,
+                        "hedges": 18,
+                        "wins": 12,
+                        "errors": 0,
+                        "cancelled": 7,
+                        "win_rate": 0.6316,
+                        "latency_p50_ms": 150.8,
+                        "latency_p95_ms": 301.5,
+                        "hedge_delay_ms": 1000.0
+                    }
+                }
+            }
+        }
+    )
+
+
+class PurgeResponse(BaseModel):
+    """Response model for the purge endpoint"""
+
+    surrogate_key: str = Field(..., description="Surrogate key of the purged responses")
+    cdn: str = Field(..., description="purged, failed or not configured")
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "surrogate_key": "city-london-england-united-kingdom",
+                "cdn": "purged"
+            }
+        }
+    )
+
+
 class ErrorResponse(BaseModel):
     """Response model for error responses"""
     detail: str = Field(..., description="Error message")
@@ -105,7 +375,7 @@ class ErrorResponse(BaseModel):
 WEATHER_RESPONSES = {
     400: {
         "model": ErrorResponse,
-        "description": "Invalid input - city name contains invalid characters or is empty",
+        "description": "Invalid input - city name contains invalid characters or is empty, or both city and lat/lon were given",
         "content": {
             "application/json": {
                 "example": {"detail": "City contains invalid characters"}
@@ -132,11 +402,93 @@ WEATHER_RESPONSES = {
     },
     503: {
         "model": ErrorResponse,
-        "description": "Weather service unavailable or returned an error",
+        "description": "Weather service unavailable or returned an error. When the provider is being shed (circuit open or too many calls in flight) a `Retry-After` header says when to retry",
         "content": {
             "application/json": {
                 "example": {"detail": "Weather api error with status code: 500"}
             }
         }
     }
-}
\ No newline at end of file
+}
+
+RANGE_RESPONSES = {
+    400: {
+        "model": ErrorResponse,
+        "description": "Invalid city name or date range",
+        "content": {
+            "application/json": {
+                "example": {"detail": "History is limited to 31 days"}
+            }
+        }
+    },
+    404: WEATHER_RESPONSES[404],
+    429: WEATHER_RESPONSES[429],
+    503: WEATHER_RESPONSES[503]
+}
+
+BATCH_RESPONSES = {
+    400: {
+        "model": ErrorResponse,
+        "description": "Too many cities in one batch",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Batch is limited to 200 cities"}
+            }
+        }
+    },
+    429: {
+        "model": ErrorResponse,
+        "description": "Rate limit exceeded (batch cost grows with the number of cities)",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Too Many Requests"}
+            }
+        }
+    },
+    503: {
+        "model": ErrorResponse,
+        "description": "Weather service is not configured",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Weather api is not set"}
+            }
+        }
+    }
+}
+
+PURGE_RESPONSES = {
+    403: {
+        "model": ErrorResponse,
+        "description": "Missing or wrong X-Purge-Token, or PURGE_TOKEN is not set",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Purging is not allowed."}
+            }
+        }
+    },
+    429: WEATHER_RESPONSES[429],
+    503: {
+        "model": ErrorResponse,
+        "description": "Several workers serve the API and there is no Redis to drop the entry from their caches",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Purging needs Redis when several workers serve the API."}
+            }
+        }
+    }
+}
+
+STREAM_RESPONSES = {
+    200: {
+        "description": "One result per city (same shape as a batch item plus its request `index`), in completion order",
+        "content": {
+            "application/x-ndjson": {
+                "example": '{"index": 1, "city": "Paris", "status": 200, "cache": "HIT", "data": {"city": "Paris"}}\n'
+            },
+            "text/event-stream": {
+                "example": 'event: weather\ndata: {"index": 1, "city": "Paris", "status": 200, "cache": "HIT", "data": {"city": "Paris"}}\n\n'
+            }
+        }
+    },
+    **BATCH_RESPONSES
+}
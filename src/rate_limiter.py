@@ -0,0 +1,230 @@
+import math
+import time
+import hashlib
+import logging
+
+from dataclasses import dataclass
+
+from fastapi import Request, Response, HTTPException
+
+from src.settings import settings
+from src import metrics
+from src.worker import WEB_WORKERS
+from src.redis_client import get_redis
+from src.services.local_cache import LRUCache
+
+
+logger = logging.getLogger(__name__)
+
+# Rules are "<requests>/<seconds>", e.g. 5/60
+RATE_LIMIT_DEFAULT = settings.rate_limit_default
+# Comma separated "<route>=<rule>", e.g. /weather/batch=20/60
+RATE_LIMIT_ROUTES = settings.rate_limit_routes
+# Comma separated "<api key>=<rule>" or "<api key>@<route>=<rule>"
+RATE_LIMIT_API_KEYS = settings.rate_limit_api_keys
+RATE_LIMIT_API_KEY_HEADER = settings.rate_limit_api_key_header
+# Max clients tracked in memory for the pre-check and the Redis-down fallback
+RATE_LIMIT_LOCAL_MAX_KEYS = settings.rate_limit_local_max_keys
+
+# Token bucket refilled continuously at limit/window. Uses the Redis clock so all
+# replicas agree on time. Returns {allowed, remaining, retry_after_ms, reset_ms, wait_one_ms}
+_TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local window_ms = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local rate = capacity / window_ms
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = math.ceil((cost - tokens) / rate)
+end
+local wait_one = 0
+if tokens < 1 then
+    wait_one = math.ceil((1 - tokens) / rate)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], window_ms)
+return {allowed, math.floor(tokens), retry_after, math.ceil((capacity - tokens) / rate), wait_one}
+"""
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    limit: int
+    window: int  # seconds
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    window: int
+    remaining: int
+    reset: float  # seconds until the bucket is full again
+    retry_after: float  # seconds until this request would be allowed
+
+
+def _parse_rule(value: str) -> RateLimitRule:
+    limit, _, window = value.strip().partition("/")
+    return RateLimitRule(limit=int(limit), window=int(window or 60))
+
+
+def _parse_rules(value: str) -> dict[str, RateLimitRule]:
+    rules = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, rule = item.rpartition("=")
+        rules[name.strip()] = _parse_rule(rule)
+    return rules
+
+
+_default_rule = _parse_rule(RATE_LIMIT_DEFAULT)
+_route_rules = _parse_rules(RATE_LIMIT_ROUTES)
+_api_key_rules = _parse_rules(RATE_LIMIT_API_KEYS)
+
+# Clients Redis recently rejected, rejected locally until they have a token again
+_blocked = LRUCache(max_entries=RATE_LIMIT_LOCAL_MAX_KEYS, ttl=3600)
+# Per-worker buckets used while Redis is unreachable
+_local_buckets = LRUCache(max_entries=RATE_LIMIT_LOCAL_MAX_KEYS, ttl=3600)
+
+_script = None
+_script_client = None
+# Whether the last check fell back to the in-memory limiter, so the switch is logged once
+_in_fallback = False
+
+
+def client_ip(request: Request) -> str:
+    forwarded = request.headers.get("X-Forwarded-For")
+    if forwarded:
+        return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def resolve_rule(request: Request) -> tuple[RateLimitRule, str]:
+    """Pick the limit for this request and the identity it is counted against"""
+    route = request.scope.get("route")
+    path = route.path if route else request.url.path
+    rule = _route_rules.get(path, _default_rule)
+
+    api_key = request.headers.get(RATE_LIMIT_API_KEY_HEADER)
+    if api_key:
+        key_rule = _api_key_rules.get(f"{api_key}@{path}") or _api_key_rules.get(api_key)
+        if key_rule is not None:
+            # Hash so API keys never end up in Redis in plain text
+            digest = hashlib.sha256(api_key.encode()).hexdigest()[:16]
+            return key_rule, f"ratelimit:{path}:key:{digest}"
+    return rule, f"ratelimit:{path}:ip:{client_ip(request)}"
+
+
+def _local_check(key: str, rule: RateLimitRule, cost: int) -> RateLimitResult:
+    rate = rule.limit / rule.window
+    now = time.monotonic()
+    bucket = _local_buckets.get(key)
+    tokens = rule.limit if bucket is None else min(rule.limit, bucket[0] + (now - bucket[1]) * rate)
+    allowed = tokens >= cost
+    if allowed:
+        tokens -= cost
+    _local_buckets.set(key, (tokens, now), ttl=rule.window)
+    return RateLimitResult(
+        allowed=allowed,
+        limit=rule.limit,
+        window=rule.window,
+        remaining=math.floor(tokens),
+        reset=(rule.limit - tokens) / rate,
+        retry_after=0 if allowed else (cost - tokens) / rate,
+    )
+
+
+async def _redis_check(key: str, rule: RateLimitRule, cost: int) -> RateLimitResult:
+    global _script, _script_client
+    redis = await get_redis()
+    if _script is None or _script_client is not redis:
+        # register_script handles EVALSHA and reloads the script after a Redis restart
+        _script = redis.register_script(_TOKEN_BUCKET_SCRIPT)
+        _script_client = redis
+    start = time.perf_counter()
+    allowed, remaining, retry_after_ms, reset_ms, wait_one_ms = await _script(
+        keys=[key], args=[rule.limit, rule.window * 1000, cost]
+    )
+    metrics.REDIS_RATE_LIMIT.observe(time.perf_counter() - start)
+    if wait_one_ms:
+        _blocked.set(key, time.monotonic() + wait_one_ms / 1000, ttl=wait_one_ms / 1000)
+    return RateLimitResult(
+        allowed=bool(allowed),
+        limit=rule.limit,
+        window=rule.window,
+        remaining=int(remaining),
+        reset=reset_ms / 1000,
+        retry_after=retry_after_ms / 1000,
+    )
+
+
+async def check(request: Request, cost: int = 1) -> RateLimitResult:
+    """Consume `cost` tokens for this request, in Redis or in memory if Redis is down"""
+    global _in_fallback
+    rule, key = resolve_rule(request)
+    # A request bigger than the bucket takes the whole bucket
+    cost = max(1, min(cost, rule.limit))
+
+    blocked_until = _blocked.get(key)
+    if blocked_until is not None:
+        # Redis said this client has no tokens left, no need to ask again yet
+        wait = max(0.0, blocked_until - time.monotonic())
+        return RateLimitResult(False, rule.limit, rule.window, 0, rule.window, wait)
+
+    try:
+        result = await _redis_check(key, rule, cost)
+    except Exception as e:
+        metrics.RATE_LIMIT_FALLBACK.inc()
+        if not _in_fallback:
+            _in_fallback = True
+            logger.warning("Rate limiting fell back to in-memory limiter: %s", e)
+        # Each worker only sees its share of the traffic, so it gets its share of the limit
+        local_rule = RateLimitRule(limit=max(1, math.ceil(rule.limit / WEB_WORKERS)), window=rule.window)
+        return _local_check(key, local_rule, min(cost, local_rule.limit))
+    if _in_fallback:
+        _in_fallback = False
+        logger.info("Rate limiting is back on Redis")
+    return result
+
+
+def rate_limit_headers(result: RateLimitResult) -> dict[str, str]:
+    return {
+        "RateLimit-Limit": str(result.limit),
+        "RateLimit-Remaining": str(result.remaining),
+        "RateLimit-Reset": str(math.ceil(result.reset)),
+        "RateLimit-Policy": f"{result.limit};w={result.window}",
+    }
+
+
+async def enforce(request: Request, response: Response | None = None, cost: int = 1) -> RateLimitResult:
+    """Check the limit, set RateLimit-* headers on the response and raise 429 when exceeded"""
+    result = await check(request, cost)
+    if not result.allowed:
+        metrics.RATE_LIMIT_REJECTED.inc()
+        raise HTTPException(
+            429,
+            "Too Many Requests",
+            headers={**rate_limit_headers(result), "Retry-After": str(max(1, math.ceil(result.retry_after)))},
+        )
+    metrics.RATE_LIMIT_ACCEPTED.inc()
+    if response is not None:
+        response.headers.update(rate_limit_headers(result))
+    return result
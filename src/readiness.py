@@ -0,0 +1,96 @@
+import time
+import asyncio
+import logging
+
+from src import startup
+from src.settings import settings
+from src.redis_client import get_redis, get_binary_redis
+from src.http_client import get_http_client
+from src.services import providers, weather_cache
+
+
+logger = logging.getLogger(__name__)
+
+# Redis connections opened per client before the worker reports ready
+READY_WARM_CONNECTIONS = settings.ready_warm_connections
+READY_RETRY_INTERVAL = settings.ready_retry_interval
+
+STARTING = "starting"
+READY = "ready"
+STOPPING = "stopping"
+
+_state = {"status": STARTING}
+_checks = {
+    "redis": {"status": "pending", "detail": "not warmed up yet"},
+    "upstream": {"status": "pending", "detail": "not warmed up yet"},
+}
+
+
+async def _warm_redis():
+    if not weather_cache.USE_REDIS:
+        # Cache on local disk only; whatever else uses Redis fails open without it
+        return "not used, CACHE_BACKEND=sqlite"
+    # Concurrent PINGs make each pool open that many connections
+    for client in (await get_redis(), await get_binary_redis()):
+        await asyncio.gather(*[client.ping() for _ in range(READY_WARM_CONNECTIONS)])
+    return f"{READY_WARM_CONNECTIONS} connections per client"
+
+
+async def _warm_upstream():
+    providers.ensure_configured()
+    client = await get_http_client()
+    # Any answer means the connection (and TLS session) is now pooled; no API key, so no quota is used
+    responses = await asyncio.gather(*[client.head(provider.base_url) for provider in providers.PROVIDERS])
+    return ", ".join(f"{provider.name} HTTP {response.status_code}" for provider, response in zip(providers.PROVIDERS, responses))
+
+
+async def _warm(name: str, warm) -> bool:
+    if _checks[name]["status"] == "healthy":
+        return True
+    start = time.perf_counter()
+    try:
+        detail = await warm()
+    except Exception as e:
+        _checks[name] = {"status": "pending", "detail": f"warm-up failed, retrying: {e}"}
+        return False
+    startup.record(f"{name}_warm", time.perf_counter() - start)
+    _checks[name] = {"status": "healthy", "detail": detail}
+    return True
+
+
+async def warm_up():
+    """Open Redis and upstream connections in the background, retrying until both succeed"""
+    while True:
+        redis_ok, upstream_ok = await asyncio.gather(_warm("redis", _warm_redis), _warm("upstream", _warm_upstream))
+        if redis_ok and upstream_ok:
+            break
+        await asyncio.sleep(READY_RETRY_INTERVAL)
+    _state["status"] = READY
+    startup.record("until_ready", time.perf_counter() - startup.started_at)
+    if settings.startup_profile:
+        startup.report()
+    logger.info("Worker is ready")
+
+
+def stopping():
+    # Stop receiving traffic before the connections go away
+    _state["status"] = STOPPING
+
+
+def is_ready() -> bool:
+    return _state["status"] == READY
+
+
+async def wait_ready(timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while not is_ready() and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    return is_ready()
+
+
+def get_status() -> dict:
+    return {
+        "status": _state["status"],
+        "checks": {name: dict(check) for name, check in _checks.items()},
+        "startup_ms": startup.timings(),
+    }
@@ -1,23 +1,232 @@
-import os
-from redis.asyncio import Redis
+import time
+import asyncio
+import logging
 
-REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit, unquote
+
+from redis.asyncio import Redis, BlockingConnectionPool
+from redis.asyncio.cluster import RedisCluster
+from redis.asyncio.retry import Retry
+from redis.asyncio.sentinel import Sentinel
+from redis.backoff import EqualJitterBackoff
+from redis.exceptions import ConnectionError, TimeoutError
+
+from src.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+# redis://, rediss://, unix://, redis+sentinel://[:password@]host:port[,host:port]/service[/db] or redis+cluster://host:port
+REDIS_URL = settings.redis_url
+REDIS_SOCKET_TIMEOUT = settings.redis_socket_timeout
+REDIS_CONNECT_TIMEOUT = settings.redis_connect_timeout
+# Per client; requests wait up to REDIS_POOL_TIMEOUT for a free connection
+REDIS_MAX_CONNECTIONS = settings.redis_max_connections
+REDIS_POOL_TIMEOUT = settings.redis_pool_timeout
+# Idle connections are PINGed before reuse after this many seconds, so dead ones are replaced
+REDIS_HEALTH_CHECK_INTERVAL = settings.redis_health_check_interval
+# Reconnect and retry a command on connection errors; timeouts are not retried
+REDIS_RETRY_ATTEMPTS = settings.redis_retry_attempts
+REDIS_RETRY_BACKOFF_BASE = settings.redis_retry_backoff_base
+REDIS_RETRY_BACKOFF_CAP = settings.redis_retry_backoff_cap
+# After this many failed commands in a row Redis is skipped for the cooldown
+REDIS_CIRCUIT_FAILURES = settings.redis_circuit_failures
+REDIS_CIRCUIT_COOLDOWN = settings.redis_circuit_cooldown
 
 redis_client: Redis | None = None
+# Same server, but returns raw bytes for the binary-encoded cache values
+redis_binary_client: Redis | None = None
+
+
+class RedisUnavailableError(ConnectionError):
+    """Raised instead of calling Redis while the local circuit is open"""
+
+
+class RedisCircuit:
+    """
+    Fail fast while Redis is down instead of paying the socket timeout on every request.
+
+    Opens after REDIS_CIRCUIT_FAILURES consecutive failed commands. Once the
+    cooldown is over a single command is let through: success closes the
+    circuit, failure keeps it open for another cooldown.
+    """
+
+    def __init__(self):
+        self.failures = 0
+        self.open_until = 0.0
+        self.opened = 0
+        self.skipped = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.failures >= REDIS_CIRCUIT_FAILURES
+
+    def check(self):
+        if not self.is_open:
+            return
+        now = time.monotonic()
+        if now < self.open_until:
+            self.skipped += 1
+            raise RedisUnavailableError(f"Redis skipped after {self.failures} failures, retrying in {self.open_until - now:.1f}s")
+        # Cooldown over: this caller is the probe, everyone else keeps skipping until it reports back
+        self.open_until = now + REDIS_CIRCUIT_COOLDOWN
+
+    def record_success(self):
+        if self.is_open:
+            logger.info("Redis is reachable again, circuit closed")
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures == REDIS_CIRCUIT_FAILURES:
+            self.opened += 1
+            logger.warning(f"Redis failed {self.failures} times in a row, skipping it for {REDIS_CIRCUIT_COOLDOWN}s")
+        if self.is_open:
+            self.open_until = time.monotonic() + REDIS_CIRCUIT_COOLDOWN
+
+    def reset(self):
+        self.failures = 0
+        self.open_until = 0.0
+
+
+circuit = RedisCircuit()
+
+# Connecting raises the raw socket errors, commands the redis-py ones
+_FAILURES = (ConnectionError, TimeoutError, OSError, asyncio.TimeoutError)
+
+
+class _CircuitRetry(Retry):
+    """Retry with backoff that reports the final outcome of every command to the circuit"""
+
+    async def call_with_retry(self, do, fail):
+        try:
+            result = await super().call_with_retry(do, fail)
+        except _FAILURES:
+            circuit.record_failure()
+            raise
+        circuit.record_success()
+        return result
+
+
+def _retry() -> Retry:
+    backoff = EqualJitterBackoff(cap=REDIS_RETRY_BACKOFF_CAP, base=REDIS_RETRY_BACKOFF_BASE)
+    return _CircuitRetry(backoff, REDIS_RETRY_ATTEMPTS, supported_errors=(ConnectionError,))
+
+
+def _connection_kwargs(decode_responses: bool) -> dict:
+    return {
+        "decode_responses": decode_responses,
+        "socket_timeout": REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": REDIS_CONNECT_TIMEOUT,
+        "socket_keepalive": True,
+        "health_check_interval": REDIS_HEALTH_CHECK_INTERVAL,
+        "retry": _retry(),
+    }
+
+
+def _sentinel_client(url: str, decode_responses: bool) -> Redis:
+    # urlsplit cannot parse several host:port pairs, so split the netloc by hand
+    parts = urlsplit(url)
+    auth, _, hosts = parts.netloc.rpartition("@")
+    username, _, password = auth.partition(":")
+    sentinels = []
+    for host in hosts.split(","):
+        name, _, port = host.rpartition(":")
+        sentinels.append((name, int(port)) if name else (host, 26379))
+    service, _, db = parts.path.strip("/").partition("/")
+    kwargs = _connection_kwargs(decode_responses)
+    if parts.scheme.startswith("rediss"):
+        kwargs["ssl"] = True
+    sentinel = Sentinel(sentinels, sentinel_kwargs={"socket_timeout": REDIS_SOCKET_TIMEOUT, "socket_connect_timeout": REDIS_CONNECT_TIMEOUT})
+    return sentinel.master_for(
+        service,
+        username=unquote(username) or None,
+        password=unquote(password) or None,
+        db=int(db or 0),
+        max_connections=REDIS_MAX_CONNECTIONS,
+        **kwargs,
+    )
+
+
+def create_client(url: str, decode_responses: bool) -> Redis:
+    """A client for a standalone server, a Sentinel-managed master or a cluster, picked by URL scheme"""
+    scheme, _, rest = url.partition("://")
+    if scheme.endswith("+sentinel"):
+        return _sentinel_client(url, decode_responses)
+    if scheme.endswith("+cluster"):
+        base = scheme.removesuffix("+cluster")
+        return RedisCluster.from_url(f"{base}://{rest}", max_connections=REDIS_MAX_CONNECTIONS, **_connection_kwargs(decode_responses))
+    pool = BlockingConnectionPool.from_url(
+        url, max_connections=REDIS_MAX_CONNECTIONS, timeout=REDIS_POOL_TIMEOUT, **_connection_kwargs(decode_responses)
+    )
+    return Redis.from_pool(pool)
+
+
+def is_cluster(redis) -> bool:
+    return isinstance(redis, RedisCluster)
+
 
 async def initialize_redis() -> Redis:
-    global redis_client
-    redis_client = Redis.from_url(REDIS_URL, decode_responses=True, socket_timeout=1, socket_connect_timeout=1)
+    global redis_client, redis_binary_client
+    circuit.reset()
+    redis_client = create_client(REDIS_URL, decode_responses=True)
+    redis_binary_client = create_client(REDIS_URL, decode_responses=False)
     return redis_client
 
 async def close_redis():
-    global redis_client
+    global redis_client, redis_binary_client
     if redis_client:
-        await redis_client.close()
+        await redis_client.aclose()
         redis_client = None
+    if redis_binary_client:
+        await redis_binary_client.aclose()
+        redis_binary_client = None
 
 async def get_redis() -> Redis:
     global redis_client
     if redis_client is None:
         raise RuntimeError("Redis client is not initialized. Call 'initialize_redis' first.")
-    return redis_client
\ No newline at end of file
+    circuit.check()
+    return redis_client
+async def get_binary_redis() -> Redis:
+    if redis_binary_client is None:
+        raise RuntimeError("Redis client is not initialized. Call 'initialize_redis' first.")
+    circuit.check()
+    return redis_binary_client
+
+
+@asynccontextmanager
+async def pipeline(binary: bool = False):
+    """
+    Queue commands on a non-transactional pipeline and send them in one round trip on exit.
+
+    On a cluster the commands are grouped per node instead, one round trip each.
+    """
+    redis = await (get_binary_redis() if binary else get_redis())
+    async with redis.pipeline(transaction=False) as pipe:
+        yield pipe
+        if len(pipe):
+            await pipe.execute()
+
+
+async def mget(redis, keys: list[str]) -> list:
+    """MGET that also works when the keys live on different cluster nodes"""
+    if is_cluster(redis):
+        return await redis.mget_nonatomic(keys)
+    return await redis.mget(keys)
+
+
+def get_stats() -> dict:
+    stats = {
+        "circuit_open": int(circuit.is_open),
+        "consecutive_failures": circuit.failures,
+        "circuit_opened": circuit.opened,
+        "skipped": circuit.skipped,
+    }
+    for name, client in (("text", redis_client), ("binary", redis_binary_client)):
+        pool = getattr(client, "connection_pool", None)
+        if pool is not None:
+            stats[f"{name}_connections_in_use"] = len(pool._in_use_connections)
+            stats[f"{name}_connections_idle"] = len(pool._available_connections)
+    return stats
@@ -0,0 +1,84 @@
+"""
+Run the API with one or more worker processes.
+
+Usage: python -m src.serve [--workers 4] [--host 0.0.0.0] [--port 8000]
+           [--loop auto|uvloop|asyncio] [--http auto|httptools|h11]
+
+Every worker is a separate process that imports the app and runs its own
+lifespan, so Redis and HTTP clients, L1 caches, breakers and limiters are
+per worker. Shared state lives in Redis.
+"""
+import os
+import glob
+import logging
+import argparse
+import tempfile
+import importlib.util
+
+import uvicorn
+
+from src.settings import settings
+from src.worker import resolve_workers
+
+
+logger = logging.getLogger(__name__)
+
+WEB_HOST = settings.web_host
+WEB_PORT = settings.web_port
+# 0 starts one worker per CPU
+WEB_WORKERS = settings.web_workers
+# auto uses uvloop and httptools when they are installed (pip install uvloop httptools)
+WEB_LOOP = settings.web_loop
+WEB_HTTP = settings.web_http
+WEB_BACKLOG = settings.web_backlog
+WEB_KEEPALIVE_TIMEOUT = settings.web_keepalive_timeout
+
+
+def _available(option: str, value: str, package: str) -> str:
+    if value == package and importlib.util.find_spec(package) is None:
+        logger.warning(f"{option}={package} but the '{package}' package is not installed, using auto")
+        return "auto"
+    return value
+
+
+def _prepare_metrics_dir(workers: int):
+    # Each worker writes its samples to files that /metrics aggregates, stale files from a previous run must go
+    if workers == 1 and not settings.prometheus_multiproc_dir:
+        return
+    directory = settings.prometheus_multiproc_dir or tempfile.mkdtemp(prefix="weather-api-metrics-")
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "*.db")):
+        os.remove(path)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the weather API")
+    parser.add_argument("--host", default=WEB_HOST)
+    parser.add_argument("--port", type=int, default=WEB_PORT)
+    parser.add_argument("--workers", type=int, default=WEB_WORKERS, help="Worker processes, 0 for one per CPU")
+    parser.add_argument("--loop", choices=("auto", "uvloop", "asyncio"), default=WEB_LOOP)
+    parser.add_argument("--http", choices=("auto", "httptools", "h11"), default=WEB_HTTP)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    workers = resolve_workers(args.workers)
+    # Workers are spawned, not forked, and read their settings from the environment
+    os.environ["WEB_WORKERS"] = str(workers)
+    _prepare_metrics_dir(workers)
+
+    uvicorn.run(
+        "src.main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop=_available("--loop", args.loop, "uvloop"),
+        http=_available("--http", args.http, "httptools"),
+        backlog=WEB_BACKLOG,
+        timeout_keep_alive=WEB_KEEPALIVE_TIMEOUT,
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import math
+import hashlib
+
+
+class BloomFilter:
+    """
+    Fixed-size set membership test with no false negatives.
+
+    Holds two generations: once the current one has seen `capacity` items it
+    becomes the previous one and a fresh filter takes its place, so memory
+    stays bounded and old items age out instead of raising the error rate.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self._current = bytearray((self.size + 7) // 8)
+        self._previous = bytearray(len(self._current))
+        self.count = 0
+        self.rotations = 0
+
+    def _positions(self, item: str) -> list[int]:
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    @staticmethod
+    def _contains(bits: bytearray, positions: list[int]) -> bool:
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+
+    def add(self, item: str):
+        positions = self._positions(item)
+        if self._contains(self._current, positions):
+            return
+        if self.count >= self.capacity:
+            self._previous = self._current
+            self._current = bytearray(len(self._previous))
+            self.count = 0
+            self.rotations += 1
+        for p in positions:
+            self._current[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        positions = self._positions(item)
+        return self._contains(self._current, positions) or self._contains(self._previous, positions)
+
+    def clear(self):
+        self._current = bytearray(len(self._current))
+        self._previous = bytearray(len(self._current))
+        self.count = 0
+
+    def stats(self) -> dict:
+        return {
+            "items": self.count,
+            "capacity": self.capacity,
+            "bits": self.size,
+            "hash_count": self.hash_count,
+            "rotations": self.rotations,
+        }
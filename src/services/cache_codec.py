@@ -0,0 +1,98 @@
+import json
+import zlib
+import logging
+import importlib
+
+from src.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Serializer for cache values: json, orjson or msgpack
+CACHE_CODEC = settings.cache_codec
+# Compression for large values: none, zlib, zstd or lz4
+CACHE_COMPRESSION = settings.cache_compression
+# Values smaller than this are stored uncompressed
+CACHE_COMPRESSION_MIN_BYTES = settings.cache_compression_min_bytes
+
+# Binary values start with a 3 byte header: format version, codec id, compression id.
+# Anything else is a legacy JSON text value, so old and new entries can coexist.
+FORMAT_VERSION = 1
+
+
+def _optional(module: str):
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        return None
+
+
+_orjson = _optional("orjson")
+_msgpack = _optional("msgpack")
+_zstd = _optional("zstandard")
+_lz4 = _optional("lz4.frame")
+
+
+def _json_dumps(value) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+CODECS = {
+    # name: (id, dumps, loads, available)
+    "json": (b"j", _json_dumps, json.loads, True),
+    "orjson": (b"o", _orjson and _orjson.dumps, _orjson and _orjson.loads, _orjson is not None),
+    "msgpack": (b"m", _msgpack and _msgpack.packb, _msgpack and (lambda raw: _msgpack.unpackb(raw, raw=False)), _msgpack is not None),
+}
+
+COMPRESSIONS = {
+    # name: (id, compress, decompress, available)
+    "none": (b"n", None, None, True),
+    "zlib": (b"z", zlib.compress, zlib.decompress, True),
+    "zstd": (b"s", _zstd and (lambda raw: _zstd.ZstdCompressor().compress(raw)), _zstd and (lambda raw: _zstd.ZstdDecompressor().decompress(raw)), _zstd is not None),
+    "lz4": (b"l", _lz4 and _lz4.compress, _lz4 and _lz4.decompress, _lz4 is not None),
+}
+
+_codecs_by_id = {spec[0]: spec for spec in CODECS.values()}
+_compressions_by_id = {spec[0]: spec for spec in COMPRESSIONS.values()}
+
+
+def _pick(table: dict, name: str, fallback: str, kind: str) -> str:
+    if name not in table:
+        logger.warning(f"Unknown cache {kind} '{name}', using {fallback}")
+        return fallback
+    if not table[name][3]:
+        logger.warning(f"Cache {kind} '{name}' is not installed, using {fallback}")
+        return fallback
+    return name
+
+
+codec_name = _pick(CODECS, CACHE_CODEC, "json", "codec")
+compression_name = _pick(COMPRESSIONS, CACHE_COMPRESSION, "none", "compression")
+
+
+def encode(value, codec: str | None = None, compression: str | None = None) -> bytes:
+    """Serialize a value with a version header, compressing it when it is large"""
+    codec_id, dumps, _, _ = CODECS[codec or codec_name]
+    compression_id, compress, _, _ = COMPRESSIONS[compression or compression_name]
+    payload = dumps(value)
+    if compress is None or len(payload) < CACHE_COMPRESSION_MIN_BYTES:
+        compression_id = b"n"
+    else:
+        payload = compress(payload)
+    return bytes((FORMAT_VERSION,)) + codec_id + compression_id + payload
+
+
+def decode(raw: bytes | str):
+    """Deserialize a value written by encode() or a legacy JSON text value"""
+    if isinstance(raw, str):
+        return json.loads(raw)
+    if not raw or raw[0] != FORMAT_VERSION:
+        return json.loads(raw)
+    codec = _codecs_by_id.get(raw[1:2])
+    compression = _compressions_by_id.get(raw[2:3])
+    if codec is None or compression is None or not codec[3] or not compression[3]:
+        raise ValueError(f"Unsupported cache value header: {raw[:3]!r}")
+    payload = raw[3:]
+    if compression[2] is not None:
+        payload = compression[2](payload)
+    return codec[2](payload)
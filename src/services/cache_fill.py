@@ -0,0 +1,96 @@
+"""
+Cache fills shared by the city and coordinate lookups.
+
+A fill fetches from the provider and stores the result while holding the
+cross-replica fill lock for its key, so one replica asks the provider and
+the others wait for its entry or keep serving the stale one. Stale entries
+are refreshed in the background.
+"""
+import asyncio
+import logging
+
+from typing import Awaitable, Callable
+
+from src.exceptions import WeatherProviderError, WetaherNotFoundError
+from src.redis_client import get_redis
+from src.services import singleflight
+from src.services.weather_cache import CacheEntry
+
+
+logger = logging.getLogger(__name__)
+
+_background_tasks: set[asyncio.Task] = set()
+
+
+async def fill(
+    cache_key: str,
+    load: Callable[[], Awaitable[CacheEntry]],
+    read_fresh: Callable[[], Awaitable[CacheEntry | None]],
+    stale: CacheEntry | None = None,
+    held: list | None = None,
+) -> CacheEntry:
+    """
+    Run `load` (fetch from the provider, store and return the entry) under the
+    fill lock of cache_key, letting one replica do the work. `read_fresh` reads
+    back what a peer holding the lock cached; `stale` is served instead of
+    waiting for a peer or when the provider fails.
+
+    With `held`, the lock is kept after a successful load and appended to
+    `held`, so a caller whose `load` does not store can write many entries in
+    one round trip before peers stop waiting; it must then call release(held).
+    """
+    try:
+        redis = await get_redis()
+        token = await singleflight.acquire_lock(redis, cache_key)
+    except Exception:
+        logger.warning(f"Fill lock unavailable for key: {cache_key}")
+        redis, token = None, None
+
+    if redis is not None and token is None:
+        if stale is not None:
+            # Another replica is already refreshing this key, keep serving the old value
+            return stale
+        # Another replica is fetching this key, give it a moment to fill the cache
+        cached = await singleflight.wait_for_peer(read_fresh)
+        if cached is not None:
+            return cached
+
+    release_lock = token is not None
+    try:
+        entry = await load()
+        if held is not None and token is not None:
+            held.append((redis, cache_key, token))
+            release_lock = False
+        return entry
+    except WetaherNotFoundError:
+        raise
+    except WeatherProviderError as e:
+        if stale is None:
+            raise
+        logger.warning(f"Serving stale weather for key: {cache_key} ({e})")
+        return stale
+    finally:
+        if release_lock:
+            await singleflight.release_lock(redis, cache_key, token)
+
+
+async def release(held: list):
+    """Release the fill locks kept by fill(..., held=held)"""
+    for redis, cache_key, token in held:
+        await singleflight.release_lock(redis, cache_key, token)
+    held.clear()
+
+
+async def _refresh(cache_key: str, fill_fn: Callable[[], Awaitable[CacheEntry]]):
+    try:
+        await singleflight.do(cache_key, fill_fn)
+    except Exception as e:
+        logger.warning(f"Background refresh failed for key: {cache_key} ({e})")
+
+
+def schedule_refresh(cache_key: str, fill_fn: Callable[[], Awaitable[CacheEntry]]):
+    """Refresh a stale entry in the background, sharing the in-process singleflight with user requests"""
+    task = asyncio.create_task(_refresh(cache_key, fill_fn))
+    # Keep a reference so the task is not garbage collected mid-flight
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
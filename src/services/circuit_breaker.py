@@ -0,0 +1,168 @@
+import math
+import time
+import logging
+
+from collections import deque
+
+from src.settings import settings
+from src import metrics
+from src.exceptions import UpstreamUnavailableError
+from src.redis_client import get_redis
+
+
+logger = logging.getLogger(__name__)
+
+BREAKER_ENABLED = settings.breaker_enabled
+# Outcomes of the last BREAKER_WINDOW seconds decide whether the breaker opens
+BREAKER_WINDOW = settings.breaker_window
+BREAKER_MIN_CALLS = settings.breaker_min_calls
+BREAKER_ERROR_RATE = settings.breaker_error_rate
+# Calls slower than this count as slow; too many slow calls also open the breaker
+BREAKER_SLOW_CALL_DURATION = settings.breaker_slow_call_duration
+BREAKER_SLOW_CALL_RATE = settings.breaker_slow_call_rate
+BREAKER_OPEN_DURATION = settings.breaker_open_duration
+# Trial calls let through while half-open; all must succeed to close again
+BREAKER_HALF_OPEN_CALLS = settings.breaker_half_open_calls
+BREAKER_REDIS_KEY = settings.breaker_redis_key
+# How often a worker checks whether another worker opened the breaker
+BREAKER_SYNC_INTERVAL = settings.breaker_sync_interval
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open breaker around the weather provider.
+
+    Opening is shared through a Redis key that expires after the open
+    duration, so one worker tripping stops the upstream calls of all of them.
+    After that each worker probes the provider on its own while half-open.
+    """
+
+    def __init__(self, name: str, redis_key: str = BREAKER_REDIS_KEY):
+        self.name = name
+        self.redis_key = redis_key
+        self.state = CLOSED
+        self._calls: deque[tuple[float, bool, bool]] = deque()
+        self._open_until = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self._last_sync = 0.0
+        self.opened = 0
+        self.rejected = 0
+
+    def _prune(self, now: float):
+        while self._calls and self._calls[0][0] < now - BREAKER_WINDOW:
+            self._calls.popleft()
+
+    def _trip(self, now: float, duration: float = BREAKER_OPEN_DURATION):
+        if self.state != OPEN:
+            logger.warning(f"Circuit breaker {self.name} opened for {duration:.0f}s")
+            self.opened += 1
+        self.state = OPEN
+        self._open_until = now + duration
+        self._calls.clear()
+
+    async def _sync(self, now: float):
+        if now - self._last_sync < BREAKER_SYNC_INTERVAL:
+            return
+        self._last_sync = now
+        try:
+            redis = await get_redis()
+            remaining_ms = await redis.pttl(self.redis_key)
+        except Exception as e:
+            return
+        if remaining_ms > 0 and self.state == CLOSED:
+            self._trip(now, remaining_ms / 1000)
+
+    async def _publish_open(self):
+        try:
+            redis = await get_redis()
+            await redis.set(self.redis_key, OPEN, px=int(BREAKER_OPEN_DURATION * 1000))
+        except Exception as e:
+            logger.warning(f"Could not share circuit breaker state for {self.name}")
+
+    async def allow(self):
+        """Raise UpstreamUnavailableError when calls to the provider should not be made"""
+        if not BREAKER_ENABLED:
+            return
+        now = time.monotonic()
+        await self._sync(now)
+        if self.state == OPEN:
+            if now < self._open_until:
+                self.rejected += 1
+                metrics.UPSTREAM_CIRCUIT_OPEN.inc()
+                raise UpstreamUnavailableError("Weather api is unavailable (circuit open)", retry_after=self._open_until - now)
+            logger.info(f"Circuit breaker {self.name} half-open, probing the provider")
+            self.state = HALF_OPEN
+            self._probes = 0
+            self._probe_successes = 0
+        if self.state == HALF_OPEN:
+            if self._probes >= BREAKER_HALF_OPEN_CALLS:
+                self.rejected += 1
+                metrics.UPSTREAM_CIRCUIT_OPEN.inc()
+                raise UpstreamUnavailableError("Weather api is unavailable (circuit half-open)", retry_after=1)
+            self._probes += 1
+
+    async def record(self, duration: float, failed: bool | None):
+        """Feed the outcome of one provider call; `failed` is None when it is unknown (e.g. cancelled)"""
+        if not BREAKER_ENABLED:
+            return
+        now = time.monotonic()
+        if failed is None:
+            if self.state == HALF_OPEN:
+                # Give the probe slot back, the call told us nothing
+                self._probes = max(0, self._probes - 1)
+            return
+        if self.state == HALF_OPEN:
+            if failed:
+                self._trip(now)
+                await self._publish_open()
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= BREAKER_HALF_OPEN_CALLS:
+                logger.info(f"Circuit breaker {self.name} closed")
+                self.state = CLOSED
+            return
+        if self.state == OPEN:
+            return
+
+        self._calls.append((now, failed, duration >= BREAKER_SLOW_CALL_DURATION))
+        self._prune(now)
+        total = len(self._calls)
+        if total < BREAKER_MIN_CALLS:
+            return
+        failures = sum(1 for _, f, _ in self._calls if f)
+        slow = sum(1 for _, _, s in self._calls if s)
+        if failures / total >= BREAKER_ERROR_RATE or slow / total >= BREAKER_SLOW_CALL_RATE:
+            self._trip(now)
+            await self._publish_open()
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self._open_until - time.monotonic()))
+
+    def get_status(self) -> dict:
+        """Breaker state in the shape of a /health dependency"""
+        if not BREAKER_ENABLED:
+            return {"status": "disabled", "detail": None}
+        if self.state == OPEN:
+            return {"status": OPEN, "detail": f"retrying in {self.retry_after()}s"}
+        if self.state == HALF_OPEN:
+            return {"status": HALF_OPEN, "detail": f"{self._probe_successes}/{BREAKER_HALF_OPEN_CALLS} probes succeeded"}
+        self._prune(time.monotonic())
+        failures = sum(1 for _, f, _ in self._calls if f)
+        return {"status": CLOSED, "detail": f"{failures}/{len(self._calls)} calls failed in the last {BREAKER_WINDOW:.0f}s"}
+
+    def stats(self) -> dict:
+        return {
+            "open": int(self.state == OPEN),
+            "half_open": int(self.state == HALF_OPEN),
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "window_calls": len(self._calls),
+        }
+
+
+breaker = CircuitBreaker("weather-provider")
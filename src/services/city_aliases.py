@@ -0,0 +1,158 @@
+import logging
+import unicodedata
+
+from src.settings import settings
+from src.redis_client import get_redis, pipeline, mget
+from src.services.local_cache import LRUCache
+
+
+logger = logging.getLogger(__name__)
+
+# Redis key of a normalized query, holding the normalized provider resolvedAddress
+ALIAS_KEY_PREFIX = settings.alias_key_prefix
+ALIAS_TTL = settings.alias_ttl
+ALIAS_LOCAL_MAX_ENTRIES = settings.alias_local_max_entries
+ALIAS_LOCAL_TTL = settings.alias_local_ttl
+
+# Aliases practically never change, so keep hot ones in memory
+_local_aliases = LRUCache(max_entries=ALIAS_LOCAL_MAX_ENTRIES, ttl=ALIAS_LOCAL_TTL)
+
+_stats = {
+    "lookups": 0,
+    "alias_hits": 0,
+    "suffix_matches": 0,
+    "aliases_recorded": 0,
+    "upstream_saved": 0,
+}
+
+
+def normalize_city(city: str) -> str:
+    """Fold case, accents, dots and whitespace: ' São  Paulo ' -> 'sao paulo', 'St. Louis' -> 'st louis'"""
+    text = unicodedata.normalize("NFKD", city)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = text.casefold().replace(".", " ")
+    parts = [" ".join(part.split()) for part in text.split(",")]
+    return ", ".join(part for part in parts if part)
+
+
+def _suffix_matches(query: str, canonical: str) -> bool:
+    # "new york, ny" may reuse "new york" -> "new york, ny, united states", but
+    # "paris, tx" must not reuse "paris" -> "paris, ile-de-france, france"
+    suffixes = query.split(", ")[1:]
+    components = set(canonical.split(", ")[1:])
+    return all(suffix in components for suffix in suffixes)
+
+
+def _alias_key(query: str) -> str:
+    return f"{ALIAS_KEY_PREFIX}{query}"
+
+
+async def lookup(query: str) -> str | None:
+    """Canonical name recorded for a normalized query, if any"""
+    canonical = _local_aliases.get(query)
+    if canonical is not None:
+        return canonical
+    try:
+        redis = await get_redis()
+        canonical = await redis.get(_alias_key(query))
+    except Exception as e:
+        logger.warning(f"Alias lookup failed for query: {query}")
+        return None
+    if canonical is not None:
+        _local_aliases.set(query, canonical)
+    return canonical
+
+
+async def resolve(city: str) -> tuple[str, bool]:
+    """Return the canonical name to cache a city under and whether an alias was used"""
+    resolved = await resolve_many([city])
+    return resolved[city]
+
+
+def canonical_name(data: dict) -> str | None:
+    """Normalized provider address for a weather result, None if it did not resolve"""
+    city = data.get("city")
+    if not city or city == "Unknown":
+        return None
+    return normalize_city(city)
+
+
+def stage(aliases: dict[str, str]) -> dict[str, str]:
+    """Remember new query -> canonical mappings locally; returns the ones Redis does not have yet"""
+    aliases = {query: canonical for query, canonical in aliases.items() if _local_aliases.get(query) != canonical}
+    for query, canonical in aliases.items():
+        _local_aliases.set(query, canonical)
+    _stats["aliases_recorded"] += len(aliases)
+    return aliases
+
+
+def queue_writes(pipe, aliases: dict[str, str]):
+    """Add the writes of staged aliases to a Redis pipeline"""
+    for query, canonical in aliases.items():
+        # Spellings nobody asks for again expire instead of piling up
+        pipe.set(_alias_key(query), canonical, ex=ALIAS_TTL)
+
+
+async def record(aliases: dict[str, str]):
+    """Persist query -> canonical mappings learned from provider responses"""
+    aliases = stage(aliases)
+    if not aliases:
+        return
+    try:
+        async with pipeline() as pipe:
+            queue_writes(pipe, aliases)
+    except Exception as e:
+        logger.warning(f"Alias write failed for {len(aliases)} aliases")
+
+
+async def resolve_many(cities: list[str]) -> dict[str, tuple[str, bool]]:
+    """resolve for many cities: local aliases first, then one MGET for the rest"""
+    queries = {city: normalize_city(city) for city in cities}
+    found = {}
+    for query in queries.values():
+        canonical = _local_aliases.get(query)
+        if canonical is not None:
+            found[query] = canonical
+    missing = [query for query in dict.fromkeys(queries.values()) if query not in found]
+    if missing:
+        bases = {query: query.split(", ")[0] for query in missing}
+        keys = list(dict.fromkeys([*missing, *bases.values()]))
+        try:
+            redis = await get_redis()
+            values = dict(zip(keys, await mget(redis, [_alias_key(key) for key in keys])))
+        except Exception as e:
+            logger.warning(f"Alias lookup failed for {len(missing)} cities")
+            values = {}
+        for query in missing:
+            canonical, base_canonical = values.get(query), values.get(bases[query])
+            if canonical is None and bases[query] != query and base_canonical and _suffix_matches(query, base_canonical):
+                # Known city with a state/country suffix that agrees with what the provider resolved
+                _stats["suffix_matches"] += 1
+                canonical = base_canonical
+            if canonical is not None:
+                _local_aliases.set(query, canonical)
+                found[query] = canonical
+
+    resolved = {}
+    for city in cities:
+        query = queries[city]
+        canonical = found.get(query, query)
+        aliased = canonical != query
+        _stats["lookups"] += 1
+        if aliased:
+            _stats["alias_hits"] += 1
+        resolved[city] = (canonical, aliased)
+    return resolved
+
+
+def mark_saved():
+    """Count a cache hit that was only possible through an alias"""
+    _stats["upstream_saved"] += 1
+
+
+def get_stats() -> dict:
+    lookups = _stats["lookups"]
+    return {
+        **_stats,
+        "alias_hit_rate": round(_stats["alias_hits"] / lookups, 4) if lookups else 0.0,
+    }
@@ -0,0 +1,66 @@
+import logging
+
+from src.settings import settings
+from src import metrics
+from src.exceptions import UpstreamUnavailableError
+from src.http_client import UPSTREAM_MAX_CONNECTIONS
+
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_LIMIT_ENABLED = settings.upstream_limit_enabled
+UPSTREAM_LIMIT_INITIAL = settings.upstream_limit_initial
+UPSTREAM_LIMIT_MIN = settings.upstream_limit_min
+UPSTREAM_LIMIT_MAX = settings.upstream_limit_max or UPSTREAM_MAX_CONNECTIONS
+# Calls slower than this count as congestion, like errors and timeouts
+UPSTREAM_LIMIT_LATENCY_TARGET = settings.upstream_limit_latency_target
+UPSTREAM_LIMIT_BACKOFF = settings.upstream_limit_backoff
+
+
+class AIMDLimiter:
+    """
+    Adaptive cap on in-flight provider calls for this worker.
+
+    Grows by about one per limit's worth of good calls (additive increase)
+    and shrinks by UPSTREAM_LIMIT_BACKOFF on every error, timeout or slow
+    call (multiplicative decrease). Calls over the limit fail immediately
+    instead of queueing behind a struggling provider.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.inflight = 0
+        self.shed = 0
+
+    def acquire(self):
+        if not UPSTREAM_LIMIT_ENABLED:
+            return
+        if self.inflight >= int(self.limit):
+            self.shed += 1
+            metrics.UPSTREAM_SHED.inc()
+            raise UpstreamUnavailableError("Weather api is overloaded, try again shortly", retry_after=1)
+        self.inflight += 1
+
+    def release(self, duration: float, failed: bool | None):
+        """Free a slot and adapt the limit; `failed` is None when the outcome is unknown (e.g. cancelled)"""
+        if not UPSTREAM_LIMIT_ENABLED:
+            return
+        self.inflight -= 1
+        if failed is None:
+            return
+        if failed or duration >= UPSTREAM_LIMIT_LATENCY_TARGET:
+            self.limit = max(self.minimum, self.limit * UPSTREAM_LIMIT_BACKOFF)
+        else:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def stats(self) -> dict:
+        return {
+            "limit": int(self.limit),
+            "inflight": self.inflight,
+            "shed": self.shed,
+        }
+
+
+upstream_limiter = AIMDLimiter(UPSTREAM_LIMIT_INITIAL, UPSTREAM_LIMIT_MIN, UPSTREAM_LIMIT_MAX)
@@ -0,0 +1,241 @@
+"""
+Persistent cache tier in a local SQLite file.
+
+Used instead of Redis (CACHE_BACKEND=sqlite, e.g. on edge boxes) or behind
+it (CACHE_BACKEND=redis+sqlite) so lookups survive a Redis outage. The
+database runs in WAL mode, so every worker process on the host can read
+while one of them writes, and it lives on disk, so a restart or redeploy
+starts with a warm cache.
+
+Reads run on the event loop, on a read-only connection: a WAL read is a
+B-tree lookup in the page cache and never waits for a writer. Writes,
+including creating the schema, can wait for another worker's write lock,
+so they run on a single background thread.
+"""
+import os
+import time
+import sqlite3
+import pathlib
+import asyncio
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+
+from src.settings import settings
+from src import metrics
+
+
+logger = logging.getLogger(__name__)
+
+DISK_CACHE_PATH = settings.disk_cache_path
+# Entries kept on disk; compaction drops the ones expiring soonest beyond this
+DISK_CACHE_MAX_ENTRIES = settings.disk_cache_max_entries
+DISK_CACHE_COMPACT_INTERVAL = settings.disk_cache_compact_interval
+# How long a write waits for another worker holding the write lock
+DISK_CACHE_BUSY_TIMEOUT = settings.disk_cache_busy_timeout
+# Reads run on the event loop, so they must never wait long
+_READ_BUSY_TIMEOUT = 0.05
+# Expired rows deleted per statement, so compaction never holds the write lock for long
+_COMPACT_BATCH = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+INSERT OR IGNORE INTO meta VALUES ('compacted_at', 0);
+"""
+
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "writes": 0,
+    "errors": 0,
+    "compactions": 0,
+    "expired_deleted": 0,
+    "evicted": 0,
+}
+
+
+def _connect_read_only() -> sqlite3.Connection:
+    # Never writes, so it never needs the write lock another worker may hold
+    uri = f"{pathlib.Path(DISK_CACHE_PATH).absolute().as_uri()}?mode=ro"
+    return sqlite3.connect(uri, timeout=_READ_BUSY_TIMEOUT, isolation_level=None, uri=True)
+
+
+def _connect(busy_timeout: float) -> sqlite3.Connection:
+    directory = os.path.dirname(DISK_CACHE_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(DISK_CACHE_PATH, timeout=busy_timeout, isolation_level=None)
+    # A crash may lose the last writes, but never corrupts the file; fine for a cache
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class SQLiteCache:
+    """Key/value store with a TTL per entry, one file shared by all workers on the host"""
+
+    def __init__(self):
+        self._reader: sqlite3.Connection | None = None
+        self._writer: sqlite3.Connection | None = None
+        self._executor: ThreadPoolExecutor | None = None
+
+    async def _read_conn(self) -> sqlite3.Connection:
+        if self._reader is None:
+            # The file, its schema and the PRAGMA writes are set up on the writer thread
+            await self._write(self._write_conn)
+            self._reader = _connect_read_only()
+        return self._reader
+
+    def _write_conn(self) -> sqlite3.Connection:
+        # Only ever used from the writer thread
+        if self._writer is None:
+            self._writer = _connect(DISK_CACHE_BUSY_TIMEOUT)
+            # Usually another worker created the schema already; running it again would wait for its write lock
+            if not self._writer.execute("SELECT 1 FROM sqlite_master WHERE name = 'meta'").fetchone():
+                # Must be set before the file is first written to take effect
+                self._writer.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                # Persistent, every later connection to the file uses WAL
+                self._writer.execute("PRAGMA journal_mode=WAL")
+                self._writer.executescript(_SCHEMA)
+        return self._writer
+
+    async def _write(self, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="disk-cache")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def get(self, key: str) -> bytes | None:
+        values = await self.mget([key])
+        return values[0]
+
+    async def mget(self, keys: list[str]) -> list[bytes | None]:
+        """Unexpired values for keys, None for the missing ones (and on errors)"""
+        try:
+            placeholders = ",".join("?" * len(keys))
+            reader = await self._read_conn()
+            rows = reader.execute(
+                f"SELECT key, value FROM cache WHERE key IN ({placeholders}) AND expires_at > ?", (*keys, time.time())
+            ).fetchall()
+        except sqlite3.Error as e:
+            _stats["errors"] += 1
+            metrics.CACHE_ERROR.inc()
+            logger.warning(f"Disk cache read failed for {len(keys)} keys ({e})")
+            return [None] * len(keys)
+        found = dict(rows)
+        _stats["hits"] += len(found)
+        _stats["misses"] += len(keys) - len(found)
+        return [found.get(key) for key in keys]
+
+    def _set_many(self, items: dict[str, bytes], ttl: float):
+        expires_at = time.time() + ttl
+        conn = self._write_conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)", [(key, value, expires_at) for key, value in items.items()])
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.set_many({key: value}, ttl)
+
+    async def set_many(self, items: dict[str, bytes], ttl: float):
+        if not items:
+            return
+        try:
+            await self._write(self._set_many, items, ttl)
+            _stats["writes"] += len(items)
+        except sqlite3.Error as e:
+            _stats["errors"] += 1
+            metrics.CACHE_ERROR.inc()
+            logger.warning(f"Disk cache write failed for {len(items)} keys ({e})")
+
+    def _delete(self, key: str):
+        self._write_conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    async def delete(self, key: str):
+        try:
+            await self._write(self._delete, key)
+        except sqlite3.Error as e:
+            _stats["errors"] += 1
+            metrics.CACHE_ERROR.inc()
+            logger.warning(f"Disk cache delete failed for key: {key} ({e})")
+
+    def compact_once(self) -> int:
+        """
+        Delete expired entries and evict beyond DISK_CACHE_MAX_ENTRIES, then
+        give freed pages back to the file system. Skipped when another worker
+        compacted within the interval. Returns the number of deleted entries.
+        """
+        conn = self._write_conn()
+        now = time.time()
+        claimed = conn.execute(
+            "UPDATE meta SET value = ? WHERE key = 'compacted_at' AND value <= ?", (now, now - DISK_CACHE_COMPACT_INTERVAL / 2)
+        ).rowcount
+        if not claimed:
+            return 0
+        expired = 0
+        while True:
+            deleted = conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache WHERE expires_at <= ? LIMIT ?)", (now, _COMPACT_BATCH)
+            ).rowcount
+            expired += deleted
+            if deleted < _COMPACT_BATCH:
+                break
+        evicted = 0
+        excess = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - DISK_CACHE_MAX_ENTRIES
+        while excess > 0:
+            deleted = conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires_at LIMIT ?)", (min(excess, _COMPACT_BATCH),)
+            ).rowcount
+            evicted += deleted
+            excess -= deleted
+            if not deleted:
+                break
+        conn.execute("PRAGMA incremental_vacuum")
+        # PASSIVE never blocks readers or writers, it copies what it can back into the database
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        _stats["compactions"] += 1
+        _stats["expired_deleted"] += expired
+        _stats["evicted"] += evicted
+        return expired + evicted
+
+    async def run_compaction(self):
+        """Compact every DISK_CACHE_COMPACT_INTERVAL seconds until cancelled"""
+        while True:
+            await asyncio.sleep(DISK_CACHE_COMPACT_INTERVAL)
+            try:
+                deleted = await self._write(self.compact_once)
+                if deleted:
+                    logger.info(f"Disk cache compaction removed {deleted} entries")
+            except sqlite3.Error as e:
+                _stats["errors"] += 1
+                logger.warning(f"Disk cache compaction failed: {e}")
+
+    def close(self):
+        if self._executor is not None:
+            if self._writer is not None:
+                # Close the writer on its own thread
+                self._executor.submit(self._writer.close).result()
+            self._executor.shutdown()
+        if self._reader is not None:
+            self._reader.close()
+        self._reader = self._writer = self._executor = None
+
+    def reset(self):
+        # A forked child must not share the parent's connections or writer thread
+        self._reader = self._writer = self._executor = None
+
+    def stats(self) -> dict:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {**_stats, "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else 0.0}
+
+
+disk_cache = SQLiteCache()
+
+os.register_at_fork(after_in_child=disk_cache.reset)
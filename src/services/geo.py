@@ -0,0 +1,127 @@
+import math
+
+from collections import OrderedDict
+
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {char: index for index, char in enumerate(_BASE32)}
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode(lat: float, lon: float, precision: int) -> str:
+    """Geohash of a coordinate; 5 characters is a cell of about 4.9 x 4.9 km"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    value = 0
+    bits = 0
+    even = True
+    while len(chars) < precision:
+        # Bits alternate between longitude and latitude, halving the range each time
+        value_range, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        mid = (value_range[0] + value_range[1]) / 2
+        if coordinate >= mid:
+            value = value * 2 + 1
+            value_range[0] = mid
+        else:
+            value = value * 2
+            value_range[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            value = 0
+            bits = 0
+    return "".join(chars)
+
+
+def decode(cell: str) -> tuple[float, float]:
+    """Center (lat, lon) of a geohash cell"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in cell:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            value_range = lon_range if even else lat_range
+            mid = (value_range[0] + value_range[1]) / 2
+            if (value >> shift) & 1:
+                value_range[0] = mid
+            else:
+                value_range[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle (haversine) distance"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _bucket(lat: float, lon: float) -> tuple[int, int]:
+    return math.floor(lat), math.floor(lon)
+
+
+class CellIndex:
+    """
+    Cells with cached weather, for "nearest cell within N km" lookups.
+
+    Cell centers are bucketed by whole degree of latitude and longitude, so a
+    lookup only measures the cells in the buckets the radius can reach. The
+    least recently added cells are dropped beyond max_cells.
+    """
+
+    def __init__(self, max_cells: int):
+        self.max_cells = max_cells
+        self._cells: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._buckets: dict[tuple[int, int], set[str]] = {}
+
+    def add(self, cell: str):
+        if cell in self._cells:
+            self._cells.move_to_end(cell)
+            return
+        center = decode(cell)
+        self._cells[cell] = center
+        self._buckets.setdefault(_bucket(*center), set()).add(cell)
+        while len(self._cells) > self.max_cells:
+            self.discard(next(iter(self._cells)))
+
+    def discard(self, cell: str):
+        center = self._cells.pop(cell, None)
+        if center is None:
+            return
+        bucket = self._buckets[_bucket(*center)]
+        bucket.discard(cell)
+        if not bucket:
+            del self._buckets[_bucket(*center)]
+
+    def nearest(self, lat: float, lon: float, radius_km: float, exclude: str | None = None) -> tuple[str, float] | None:
+        """Closest indexed cell whose center is within radius_km, and its distance"""
+        lat_span = math.ceil(radius_km / KM_PER_DEGREE)
+        cos_lat = math.cos(math.radians(min(abs(lat) + lat_span, 90)))
+        # Degrees of longitude shrink towards the poles
+        lon_span = 180 if cos_lat < 0.01 else min(180, math.ceil(radius_km / (KM_PER_DEGREE * cos_lat)))
+        row, column = _bucket(lat, lon)
+        buckets = {
+            (r, (c + 180) % 360 - 180)
+            for r in range(row - lat_span, row + lat_span + 1)
+            for c in range(column - lon_span, column + lon_span + 1)
+        }
+        best = None
+        for bucket in buckets:
+            for cell in self._buckets.get(bucket, ()):
+                if cell == exclude:
+                    continue
+                distance = distance_km(lat, lon, *self._cells[cell])
+                if distance <= radius_km and (best is None or distance < best[1]):
+                    best = (cell, distance)
+        return best
+
+    def __len__(self) -> int:
+        return len(self._cells)
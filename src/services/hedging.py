@@ -0,0 +1,195 @@
+"""
+Hedged provider calls.
+
+A call goes to the primary provider. If it has not answered within the
+primary's recent p95 latency, a second attempt is sent to the next provider
+(or to the same one when only one is configured) and the first success wins;
+the other attempt is cancelled. Hedges are paid for from a budget that grows
+with every call, so they stay a small share of upstream traffic even when the
+provider slows down for everyone. A provider that fails outright is replaced
+by the next one straight away.
+"""
+import math
+import time
+import asyncio
+import logging
+
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+
+from src.settings import settings
+from src.exceptions import WeatherProviderError, WetaherNotFoundError
+from src.services import providers
+from src.services.providers import Provider
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+HEDGE_ENABLED = settings.hedge_enabled
+# The hedge goes out once the primary is slower than this quantile of its recent calls
+HEDGE_QUANTILE = settings.hedge_quantile
+HEDGE_MIN_DELAY = settings.hedge_min_delay
+HEDGE_MAX_DELAY = settings.hedge_max_delay
+# Delay used until a provider has HEDGE_MIN_SAMPLES latencies
+HEDGE_INITIAL_DELAY = settings.hedge_initial_delay
+HEDGE_MIN_SAMPLES = settings.hedge_min_samples
+HEDGE_WINDOW = settings.hedge_window
+# Hedges allowed per call, on average
+HEDGE_BUDGET = settings.hedge_budget
+# Unspent budget kept for bursts of slow calls
+HEDGE_BUDGET_CAP = 10.0
+
+
+class ProviderStats:
+    """Latency window and outcomes of one provider, as seen by this worker"""
+
+    def __init__(self):
+        self.latencies: deque[float] = deque(maxlen=HEDGE_WINDOW)
+        self.calls = 0
+        self.hedges = 0
+        self.wins = 0
+        self.errors = 0
+        self.cancelled = 0
+
+    def quantile(self, q: float) -> float | None:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+    def hedge_delay(self) -> float:
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return HEDGE_INITIAL_DELAY
+        return min(max(self.quantile(HEDGE_QUANTILE), HEDGE_MIN_DELAY), HEDGE_MAX_DELAY)
+
+    def stats(self) -> dict:
+        p50 = self.quantile(0.5)
+        p95 = self.quantile(0.95)
+        return {
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "wins": self.wins,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "win_rate": round(self.wins / self.calls, 4) if self.calls else 0.0,
+            "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else 0.0,
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else 0.0,
+            "hedge_delay_ms": round(self.hedge_delay() * 1000, 1),
+        }
+
+
+_providers: dict[str, ProviderStats] = {}
+_budget = {"tokens": HEDGE_BUDGET_CAP}
+_stats = {
+    "calls": 0,
+    "hedged": 0,
+    "hedge_wins": 0,
+    "budget_exhausted": 0,
+    "failovers": 0,
+}
+
+
+def provider_stats(provider: Provider) -> ProviderStats:
+    if provider.name not in _providers:
+        _providers[provider.name] = ProviderStats()
+    return _providers[provider.name]
+
+
+def _take_hedge_token() -> bool:
+    if _budget["tokens"] < 1:
+        _stats["budget_exhausted"] += 1
+        return False
+    _budget["tokens"] -= 1
+    return True
+
+
+async def _attempt(provider: Provider, operation: Callable[[Provider], Awaitable[T]]) -> T:
+    stats = provider_stats(provider)
+    stats.calls += 1
+    start = time.perf_counter()
+    try:
+        result = await operation(provider)
+    except asyncio.CancelledError:
+        stats.cancelled += 1
+        raise
+    except WetaherNotFoundError:
+        # An answer all the same, and its latency counts
+        stats.latencies.append(time.perf_counter() - start)
+        raise
+    except Exception:
+        stats.errors += 1
+        raise
+    stats.latencies.append(time.perf_counter() - start)
+    return result
+
+
+async def call(operation: Callable[[Provider], Awaitable[T]]) -> T:
+    """
+    Run `operation` against the configured providers and return the first success.
+
+    WetaherNotFoundError is an answer and is raised as soon as it arrives.
+    When every provider fails, the first error is raised.
+    """
+    providers.ensure_configured()
+    candidates = list(providers.PROVIDERS)
+    primary = candidates[0]
+    _stats["calls"] += 1
+    _budget["tokens"] = min(HEDGE_BUDGET_CAP, _budget["tokens"] + HEDGE_BUDGET)
+
+    untried = candidates[1:]
+    attempts: dict[asyncio.Task, tuple[Provider, bool]] = {
+        asyncio.create_task(_attempt(primary, operation)): (primary, False)
+    }
+    hedge_at = time.monotonic() + provider_stats(primary).hedge_delay() if HEDGE_ENABLED else None
+    errors: list[Exception] = []
+    try:
+        while attempts:
+            timeout = max(0.0, hedge_at - time.monotonic()) if hedge_at is not None else None
+            done, _ = await asyncio.wait(attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # The primary is slow, send one hedge if the budget allows it
+                hedge_at = None
+                if _take_hedge_token():
+                    target = untried.pop(0) if untried else primary
+                    _stats["hedged"] += 1
+                    provider_stats(target).hedges += 1
+                    logger.debug(f"Hedging slow call to {primary.name} with {target.name}")
+                    attempts[asyncio.create_task(_attempt(target, operation))] = (target, True)
+                continue
+            for task in done:
+                provider, hedge = attempts.pop(task)
+                try:
+                    result = task.result()
+                except WetaherNotFoundError:
+                    raise
+                except WeatherProviderError as e:
+                    errors.append(e)
+                    continue
+                provider_stats(provider).wins += 1
+                if hedge:
+                    _stats["hedge_wins"] += 1
+                return result
+            if not attempts and untried:
+                # Every attempt failed, fall back to the next provider without waiting
+                target = untried.pop(0)
+                hedge_at = None
+                _stats["failovers"] += 1
+                logger.warning(f"Falling back to weather provider {target.name} ({errors[-1]})")
+                attempts[asyncio.create_task(_attempt(target, operation))] = (target, False)
+        raise errors[0]
+    finally:
+        # The loser (or everything, when the caller is cancelled) is not needed anymore
+        for task in attempts:
+            task.cancel()
+        if attempts:
+            await asyncio.gather(*attempts, return_exceptions=True)
+
+
+def get_stats() -> dict:
+    """Hedging counters and, per provider, its latency and share of wins"""
+    return {
+        "hedging": {**_stats, "budget": round(_budget["tokens"], 2)},
+        **{f"provider_{name}": stats.stats() for name, stats in _providers.items()},
+    }
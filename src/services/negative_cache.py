@@ -0,0 +1,91 @@
+import logging
+
+from src.settings import settings
+from src.redis_client import get_redis, pipeline
+from src.services.bloom_filter import BloomFilter
+from src.services.local_cache import LRUCache
+
+
+logger = logging.getLogger(__name__)
+
+# How long a city the provider did not find keeps answering 404 from cache
+NEGATIVE_CACHE_TTL = settings.negative_cache_ttl
+NEGATIVE_CACHE_MAX_ENTRIES = settings.negative_cache_max_entries
+# Known-bad names tracked by the filter before it rotates
+NEGATIVE_BLOOM_CAPACITY = settings.negative_bloom_capacity
+NEGATIVE_BLOOM_ERROR_RATE = settings.negative_bloom_error_rate
+
+# Only names in the filter are checked against the tombstones, so valid
+# cities never pay for a negative lookup; a false positive costs one GET
+bloom = BloomFilter(capacity=NEGATIVE_BLOOM_CAPACITY, error_rate=NEGATIVE_BLOOM_ERROR_RATE)
+_local_tombstones = LRUCache(max_entries=NEGATIVE_CACHE_MAX_ENTRIES, ttl=NEGATIVE_CACHE_TTL)
+
+_stats = {
+    "checks": 0,
+    "bloom_passes": 0,
+    "tombstone_hits": 0,
+    "false_positives": 0,
+    "tombstones_recorded": 0,
+}
+
+
+def _tombstone_key(query: str) -> str:
+    return f"weather:notfound:{query}"
+
+
+def _remember(query: str):
+    bloom.add(query)
+    _local_tombstones.set(query, True)
+
+
+async def lookup_remote(query: str) -> bool:
+    """Check Redis for a tombstone left by any replica"""
+    try:
+        redis = await get_redis()
+        found = await redis.exists(_tombstone_key(query))
+    except Exception as e:
+        logger.warning(f"Tombstone lookup failed for query: {query}")
+        return False
+    if found:
+        _remember(query)
+        _stats["tombstone_hits"] += 1
+    return bool(found)
+
+
+async def is_not_found(query: str) -> bool:
+    """True when a normalized city name recently came back 404 from the provider"""
+    _stats["checks"] += 1
+    if query not in bloom:
+        _stats["bloom_passes"] += 1
+        return False
+    if _local_tombstones.get(query):
+        _stats["tombstone_hits"] += 1
+        return True
+    if await lookup_remote(query):
+        return True
+    _stats["false_positives"] += 1
+    return False
+
+
+async def record(queries: list[str]):
+    """Tombstone names the provider could not find"""
+    if not queries or NEGATIVE_CACHE_TTL <= 0:
+        return
+    for query in queries:
+        _remember(query)
+    _stats["tombstones_recorded"] += len(queries)
+    try:
+        async with pipeline() as pipe:
+            for query in queries:
+                pipe.set(_tombstone_key(query), "1", ex=NEGATIVE_CACHE_TTL)
+    except Exception as e:
+        logger.warning(f"Tombstone write failed for {len(queries)} cities")
+
+
+def get_stats() -> dict:
+    return {
+        **_stats,
+        "local_tombstones": len(_local_tombstones),
+        "bloom_items": bloom.count,
+        "bloom_rotations": bloom.rotations,
+    }
@@ -0,0 +1,199 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+
+from collections import Counter
+from typing import Awaitable, Callable
+
+from src.settings import settings
+from src.redis_client import get_redis
+from src.services.local_cache import LRUCache
+from src.services.weather_cache import CacheEntry, CACHE_TTL, read_entries
+
+
+logger = logging.getLogger(__name__)
+
+PREWARM_ENABLED = settings.prewarm_enabled
+# How many of the most requested cache keys are kept warm
+PREWARM_TOP_K = settings.prewarm_top_k
+PREWARM_INTERVAL = settings.prewarm_interval
+# Refresh entries this many seconds before they turn stale
+PREWARM_LEAD_TIME = settings.prewarm_lead_time
+PREWARM_CONCURRENCY = settings.prewarm_concurrency
+# Max upstream calls the warmer may spend per minute, across all replicas
+PREWARM_BUDGET_PER_MINUTE = settings.prewarm_budget_per_minute
+# Request counts are multiplied by this every PREWARM_DECAY_INTERVAL seconds
+PREWARM_DECAY_FACTOR = settings.prewarm_decay_factor
+PREWARM_DECAY_INTERVAL = settings.prewarm_decay_interval
+# Keys tracked in the sorted set, the tail is trimmed on every decay
+PREWARM_MAX_TRACKED = settings.prewarm_max_tracked
+PREWARM_SCORES_KEY = settings.prewarm_scores_key
+PREWARM_LEASE_KEY = settings.prewarm_lease_key
+PREWARM_LEASE_TTL_MS = settings.prewarm_lease_ttl_ms or int(PREWARM_INTERVAL * 3000)
+
+# Take the lease if it is free, extend it if we already hold it
+_LEASE_SCRIPT = """
+local holder = redis.call('get', KEYS[1])
+if holder == false or holder == ARGV[1] then
+    redis.call('set', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+_instance_id = uuid.uuid4().hex
+
+
+def _new_instance_id():
+    # Workers forked from a parent that imported the app must not share its id
+    global _instance_id
+    _instance_id = uuid.uuid4().hex
+
+
+os.register_at_fork(after_in_child=_new_instance_id)
+
+# Requests counted since the last flush to Redis
+_pending: Counter = Counter()
+# Warmed entries already credited with a prevented miss, by key and fetch time
+_credited = LRUCache(max_entries=PREWARM_MAX_TRACKED, ttl=CACHE_TTL)
+
+_budget = {"tokens": float(PREWARM_BUDGET_PER_MINUTE), "updated": time.monotonic()}
+_last_decay = time.monotonic()
+_is_leader = False
+
+_stats = {
+    "cycles": 0,
+    "refreshed": 0,
+    "refresh_errors": 0,
+    "budget_exhausted": 0,
+    "misses_prevented": 0,
+}
+
+
+def record_request(cache_key: str):
+    """Count a served request for a cache key, flushed to Redis by the warmer loop"""
+    if PREWARM_ENABLED:
+        _pending[cache_key] += 1
+
+
+def note_hit(cache_key: str, entry: CacheEntry):
+    """
+    Credit the warmer when a fresh hit is served from an entry it wrote.
+
+    The warmer refreshes at most PREWARM_LEAD_TIME before the old entry would
+    have gone stale, so the first hit after that would have been a stale hit
+    or a miss. Counted once per entry and process.
+    """
+    if not entry.warmed or entry.age < PREWARM_LEAD_TIME:
+        return
+    credit_key = f"{cache_key}|{entry.fetched_at}"
+    if _credited.get(credit_key) is None:
+        _credited.set(credit_key, True)
+        _stats["misses_prevented"] += 1
+
+
+def _take_budget() -> bool:
+    now = time.monotonic()
+    rate = PREWARM_BUDGET_PER_MINUTE / 60
+    _budget["tokens"] = min(PREWARM_BUDGET_PER_MINUTE, _budget["tokens"] + (now - _budget["updated"]) * rate)
+    _budget["updated"] = now
+    if _budget["tokens"] < 1:
+        return False
+    _budget["tokens"] -= 1
+    return True
+
+
+def due_for_refresh(entry: CacheEntry | None) -> bool:
+    # Missing entries of hot cities are filled too, the next request would miss
+    return entry is None or entry.age >= CACHE_TTL - PREWARM_LEAD_TIME
+
+
+async def _flush(redis):
+    if not _pending:
+        return
+    counts = dict(_pending)
+    _pending.clear()
+    async with redis.pipeline(transaction=False) as pipe:
+        for cache_key, count in counts.items():
+            pipe.zincrby(PREWARM_SCORES_KEY, count, cache_key)
+        await pipe.execute()
+
+
+async def _acquire_lease(redis) -> bool:
+    return bool(await redis.eval(_LEASE_SCRIPT, 1, PREWARM_LEASE_KEY, _instance_id, PREWARM_LEASE_TTL_MS))
+
+
+async def _decay(redis):
+    global _last_decay
+    if time.monotonic() - _last_decay < PREWARM_DECAY_INTERVAL:
+        return
+    _last_decay = time.monotonic()
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.zunionstore(PREWARM_SCORES_KEY, {PREWARM_SCORES_KEY: PREWARM_DECAY_FACTOR})
+        pipe.zremrangebyrank(PREWARM_SCORES_KEY, 0, -PREWARM_MAX_TRACKED - 1)
+        await pipe.execute()
+
+
+async def warm_once(redis, warm: Callable[[str], Awaitable[None]]):
+    """Refresh the hottest keys that are about to go stale, within the upstream budget"""
+    _stats["cycles"] += 1
+    hot = await redis.zrevrange(PREWARM_SCORES_KEY, 0, PREWARM_TOP_K - 1)
+    if not hot:
+        return
+    entries = await read_entries(hot)
+    # Hottest first, so an exhausted budget skips the coldest keys
+    due = [cache_key for cache_key in hot if due_for_refresh(entries[cache_key])]
+
+    semaphore = asyncio.Semaphore(PREWARM_CONCURRENCY)
+
+    async def refresh(cache_key: str):
+        async with semaphore:
+            try:
+                await warm(cache_key)
+                _stats["refreshed"] += 1
+            except Exception as e:
+                _stats["refresh_errors"] += 1
+                logger.warning(f"Pre-warm failed for key: {cache_key} ({e})")
+
+    tasks = []
+    for cache_key in due:
+        if not _take_budget():
+            _stats["budget_exhausted"] += len(due) - len(tasks)
+            break
+        tasks.append(refresh(cache_key))
+    await asyncio.gather(*tasks)
+
+
+async def run_prewarmer(warm: Callable[[str], Awaitable[None]]):
+    """
+    Flush request counts every PREWARM_INTERVAL; the replica holding the
+    Redis lease also decays the counts and refreshes the hottest keys.
+    """
+    global _is_leader
+    while True:
+        try:
+            await asyncio.sleep(PREWARM_INTERVAL)
+            redis = await get_redis()
+            await _flush(redis)
+            leader = await _acquire_lease(redis)
+            if leader != _is_leader:
+                logger.info(f"Pre-warmer lease {'acquired' if leader else 'lost'}")
+                _is_leader = leader
+            if leader:
+                await _decay(redis)
+                await warm_once(redis, warm)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Pre-warm cycle failed: {e}")
+
+
+def get_stats() -> dict:
+    return {
+        **_stats,
+        "leader": int(_is_leader),
+        "pending_keys": len(_pending),
+        "budget_remaining": int(_budget["tokens"]),
+    }
@@ -0,0 +1,347 @@
+"""
+Weather provider adapters.
+
+Every provider answers in its own format; its adapter maps the answer to the
+shape of WeatherResponse (`current`) and of the per-day cache entries used by
+/weather/forecast and /weather/history (`days`). Which providers are used, and
+in which order, is set by WEATHER_PROVIDERS; the first one is the primary.
+"""
+import time
+import httpx
+import asyncio
+import logging
+
+from abc import ABC, abstractmethod
+from datetime import date, datetime, timedelta
+
+try:
+    from orjson import loads as _loads
+except ImportError:
+    from json import loads as _loads
+
+from src.settings import settings
+from src import metrics
+from src.exceptions import WeatherProviderError, WetaherNotFoundError, UpstreamUnavailableError
+from src.http_client import get_http_client
+from src.services.circuit_breaker import CircuitBreaker, breaker
+from src.services.concurrency_limiter import upstream_limiter
+
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated provider names, in order of preference
+WEATHER_PROVIDERS = settings.weather_providers
+# Ask providers for only the fields the adapters map
+WEATHER_PROJECTION_ENABLED = settings.weather_projection_enabled
+
+
+class Provider(ABC):
+    """
+    One upstream weather API.
+
+    `_get` does the HTTP call behind the provider's own circuit breaker and
+    the worker-wide concurrency limit; subclasses build the requests and map
+    the answers.
+    """
+
+    name = "provider"
+
+    def __init__(self, api_key: str, base_url: str, breaker: CircuitBreaker | None = None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.breaker = breaker or CircuitBreaker(self.name, redis_key=f"breaker:{self.name}")
+
+    @abstractmethod
+    async def current(self, city: str) -> dict:
+        """Today's weather in the WeatherResponse shape"""
+
+    @abstractmethod
+    async def days(self, city: str, start: date, end: date) -> dict:
+        """{"city", "timezone", "days": [DailyWeather dicts]} for the days between start and end"""
+
+    def _is_not_found(self, response: httpx.Response) -> bool:
+        return response.status_code == 404
+
+    async def _get(self, path: str, params: dict, city: str) -> dict:
+        """GET {base_url}{path} behind the circuit breaker and concurrency limit"""
+        # Fail fast instead of piling up requests on a provider that is down or slow
+        upstream_limiter.acquire()
+        try:
+            await self.breaker.allow()
+        except UpstreamUnavailableError:
+            upstream_limiter.release(0, None)
+            raise
+        # None until the outcome is known, e.g. when the caller is cancelled
+        failed = None
+        start = time.perf_counter()
+        try:
+            client = await get_http_client()
+            response = await client.get(f"{self.base_url}{path}", params=params)
+            metrics.observe_upstream(response.status_code, time.perf_counter() - start)
+            # Client errors mean the provider is up, only 5xx and throttling count against it
+            failed = response.status_code >= 500 or response.status_code == 429
+
+            if self._is_not_found(response):
+                raise WetaherNotFoundError(f"{city} not found")
+            if response.status_code >= 400:
+                raise WeatherProviderError(f"Weather api error with status code: {response.status_code}")
+
+            try:
+                # Straight from the body bytes, without decoding it to str first
+                return _loads(response.content)
+            except ValueError:
+                # A truncated body or an HTML error page from a proxy: the provider is misbehaving
+                failed = True
+                raise WeatherProviderError("Weather api returned an invalid JSON body")
+
+        except httpx.TimeoutException:
+            failed = True
+            metrics.UPSTREAM_TIMEOUT.observe(time.perf_counter() - start)
+            raise WeatherProviderError("Weather api timed out")
+        except httpx.RequestError as e:
+            failed = True
+            metrics.UPSTREAM_ERROR.observe(time.perf_counter() - start)
+            raise WeatherProviderError(f"Network error: {e}")
+        finally:
+            duration = time.perf_counter() - start
+            upstream_limiter.release(duration, failed)
+            await self.breaker.record(duration, failed)
+
+
+async def _gather_or_cancel(*calls) -> list:
+    """asyncio.gather, but the first failure cancels the other calls instead of leaving them running"""
+    tasks = [asyncio.ensure_future(call) for call in calls]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        # Let the cancelled calls release their limiter slot and report to the breaker
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def _to_human_readable(data: dict) -> dict:
+    msg = data.get("message", data)
+
+    city = msg.get("resolvedAddress") or msg.get("address") or "Unknown"
+    timezone = msg.get("timezone")
+
+    days = msg.get("days") or []
+    today = days[0] if days else {}
+
+    date = today.get("datetime")
+    conditions = today.get("conditions")
+    desc = today.get("description") or msg.get("description")
+
+    temp = today.get("temp")
+    tempmax = today.get("tempmax")
+    tempmin = today.get("tempmin")
+    feelslike = today.get("feelslike")
+
+    precip = today.get("precip")
+    precipprob = today.get("precipprob")
+
+    windspeed = today.get("windspeed")
+    windgust = today.get("windgust")
+
+    sunrise = today.get("sunrise")
+    sunset = today.get("sunset")
+
+    return {
+        "version": "v1",
+        "city": city,
+        "date": date,
+        "timezone": timezone,
+        "summary": desc,
+        "conditions": conditions,
+        "temp_avg_c": temp,
+        "temp_max_c": tempmax,
+        "temp_min_c": tempmin,
+        "feels_like_c": feelslike,
+        "precip_mm": precip,
+        "precip_prob_percent": precipprob,
+        "wind_speed_kmh": windspeed,
+        "wind_gust_kmh": windgust,
+        "sunrise": sunrise,
+        "sunset": sunset
+    }
+
+
+def _day_summary(day: dict) -> dict:
+    return {
+        "date": day.get("datetime"),
+        "summary": day.get("description"),
+        "conditions": day.get("conditions"),
+        "temp_avg_c": day.get("temp"),
+        "temp_max_c": day.get("tempmax"),
+        "temp_min_c": day.get("tempmin"),
+        "feels_like_c": day.get("feelslike"),
+        "precip_mm": day.get("precip"),
+        "precip_prob_percent": day.get("precipprob"),
+        "wind_speed_kmh": day.get("windspeed"),
+        "wind_gust_kmh": day.get("windgust"),
+        "sunrise": day.get("sunrise"),
+        "sunset": day.get("sunset"),
+    }
+
+
+# Day fields read by _to_human_readable and _day_summary; location fields are always returned
+VISUALCROSSING_ELEMENTS = (
+    "datetime", "description", "conditions", "temp", "tempmax", "tempmin", "feelslike",
+    "precip", "precipprob", "windspeed", "windgust", "sunrise", "sunset",
+)
+
+
+class VisualCrossing(Provider):
+    """Visual Crossing timeline API (WEATHER_API_KEY, WEATHER_BASE_URL)"""
+
+    name = "visualcrossing"
+
+    def _params(self) -> dict:
+        params = {
+            "unitGroup": "metric",
+            "contentType": "json",
+            "key": self.api_key
+        }
+        if WEATHER_PROJECTION_ENABLED:
+            # Daily values only: no hours, current conditions, alerts or stations
+            params["include"] = "days"
+            params["elements"] = ",".join(VISUALCROSSING_ELEMENTS)
+        return params
+
+    def _is_not_found(self, response: httpx.Response) -> bool:
+        # Visual Crossing answers unknown places with a 400 rather than a 404
+        return response.status_code == 404 or (response.status_code == 400 and "invalid location" in response.text.lower())
+
+    async def current(self, city: str) -> dict:
+        return _to_human_readable(await self._get(f"{city}/today", self._params(), city))
+
+    async def days(self, city: str, start: date, end: date) -> dict:
+        raw = await self._get(f"{city}/{start.isoformat()}/{end.isoformat()}", self._params(), city)
+        msg = raw.get("message", raw)
+        return {
+            "city": msg.get("resolvedAddress") or msg.get("address") or "Unknown",
+            "timezone": msg.get("timezone"),
+            "days": [_day_summary(day) for day in msg.get("days") or []],
+        }
+
+
+def _clock(value: str | None) -> str | None:
+    # "07:59 AM" -> "07:59:00", the format Visual Crossing uses
+    try:
+        return datetime.strptime(value, "%I:%M %p").strftime("%H:%M:%S")
+    except (TypeError, ValueError):
+        return None
+
+
+def _forecast_day(forecast_day: dict) -> dict:
+    day = forecast_day.get("day") or {}
+    astro = forecast_day.get("astro") or {}
+    conditions = (day.get("condition") or {}).get("text")
+    return {
+        "date": forecast_day.get("date"),
+        "summary": conditions,
+        "conditions": conditions,
+        "temp_avg_c": day.get("avgtemp_c"),
+        "temp_max_c": day.get("maxtemp_c"),
+        "temp_min_c": day.get("mintemp_c"),
+        "feels_like_c": None,
+        "precip_mm": day.get("totalprecip_mm"),
+        "precip_prob_percent": day.get("daily_chance_of_rain"),
+        "wind_speed_kmh": day.get("maxwind_kph"),
+        "wind_gust_kmh": None,
+        "sunrise": _clock(astro.get("sunrise")),
+        "sunset": _clock(astro.get("sunset")),
+    }
+
+
+def _location(data: dict) -> tuple[str, str | None]:
+    location = data.get("location") or {}
+    parts = [location.get(part) for part in ("name", "region", "country")]
+    return ", ".join(part for part in parts if part) or "Unknown", location.get("tz_id")
+
+
+class WeatherAPI(Provider):
+    """WeatherAPI.com forecast and history API (WEATHERAPI_API_KEY, WEATHERAPI_BASE_URL)"""
+
+    name = "weatherapi"
+
+    def _is_not_found(self, response: httpx.Response) -> bool:
+        # Error code 1006 is "No matching location found"
+        if response.status_code != 400:
+            return False
+        try:
+            return response.json().get("error", {}).get("code") == 1006
+        except ValueError:
+            return False
+
+    def _params(self, city: str, **params) -> dict:
+        # Air quality and alerts are never mapped
+        return {"key": self.api_key, "q": city, **params, "aqi": "no", "alerts": "no"}
+
+    async def current(self, city: str) -> dict:
+        raw = await self._get("forecast.json", self._params(city, days=1), city)
+        name, timezone = _location(raw)
+        forecast_days = (raw.get("forecast") or {}).get("forecastday") or []
+        today = _forecast_day(forecast_days[0]) if forecast_days else {}
+        current = raw.get("current") or {}
+        return {
+            "version": "v1",
+            "city": name,
+            "timezone": timezone,
+            **today,
+            "feels_like_c": current.get("feelslike_c"),
+            "wind_gust_kmh": current.get("gust_kph"),
+        }
+
+    async def days(self, city: str, start: date, end: date) -> dict:
+        # weather_range imports this module
+        from src.services import weather_range
+
+        # Past days come from history.json and the rest from forecast.json,
+        # split at today in UTC like the day keys of the range cache
+        today = weather_range.utc_today()
+        requests = []
+        if start < today:
+            history_end = min(end, today - timedelta(days=1))
+            requests.append(self._get("history.json", self._params(city, dt=start.isoformat(), end_dt=history_end.isoformat()), city))
+        if end >= today:
+            requests.append(self._get("forecast.json", self._params(city, days=(end - today).days + 1), city))
+        answers = await _gather_or_cancel(*requests)
+        name, timezone = _location(answers[0])
+        days = []
+        for raw in answers:
+            for forecast_day in (raw.get("forecast") or {}).get("forecastday") or []:
+                if start.isoformat() <= (forecast_day.get("date") or "") <= end.isoformat():
+                    days.append(_forecast_day(forecast_day))
+        return {"city": name, "timezone": timezone, "days": days}
+
+
+def build_providers(names: str) -> list[Provider]:
+    """Configured providers in the order of `names`, skipping those without an API key and URL"""
+    available = {
+        # The primary keeps the breaker reported by /health
+        VisualCrossing.name: lambda: VisualCrossing(settings.weather_api_key, settings.weather_base_url, breaker),
+        WeatherAPI.name: lambda: WeatherAPI(settings.weatherapi_api_key, settings.weatherapi_base_url),
+    }
+    providers = []
+    for name in (part.strip() for part in names.split(",")):
+        if not name:
+            continue
+        if name not in available:
+            raise ValueError(f"Unknown weather provider '{name}', expected one of {', '.join(available)}")
+        provider = available[name]()
+        if not provider.api_key or not provider.base_url:
+            logger.warning(f"Weather provider {name} has no API key or base URL, skipping it")
+            continue
+        providers.append(provider)
+    return providers
+
+
+PROVIDERS = build_providers(WEATHER_PROVIDERS)
+
+
+def ensure_configured():
+    if not PROVIDERS:
+        raise WeatherProviderError("Weather api is not set")
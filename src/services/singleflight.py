@@ -0,0 +1,128 @@
+import time
+import uuid
+import asyncio
+import logging
+
+from typing import Any, Awaitable, Callable
+
+from redis.asyncio import Redis
+
+from src.settings import settings
+from src import metrics
+
+
+logger = logging.getLogger(__name__)
+
+# How long a cross-replica fill lock is held before it expires on its own
+LOCK_TTL_MS = settings.singleflight_lock_ttl_ms
+# How long a replica waits for a peer to fill the cache before fetching itself
+WAIT_TIMEOUT = settings.singleflight_wait_timeout
+WAIT_INTERVAL = settings.singleflight_wait_interval
+
+# Only delete the lock if we still own it
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+class _Call:
+    """A shared in-flight call and how many callers are waiting on it"""
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+_inflight: dict[str, _Call] = {}
+
+_stats = {
+    "leaders": 0,
+    "coalesced": 0,
+    "lock_acquired": 0,
+    "lock_contended": 0,
+    "remote_coalesced": 0,
+    "remote_timeouts": 0,
+}
+
+
+def _consume_exception(task: asyncio.Task):
+    # Followers may all have gone away; mark the exception as retrieved
+    if not task.cancelled():
+        task.exception()
+
+
+async def _wait(call: _Call) -> Any:
+    call.waiters += 1
+    try:
+        # Shield so one cancelled caller (e.g. client disconnect) does not cancel the shared fetch
+        return await asyncio.shield(call.task)
+    finally:
+        call.waiters -= 1
+        if call.waiters == 0 and not call.task.done():
+            # Everyone waiting has gone away, stop the upstream call too
+            call.task.cancel()
+
+
+async def do(key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+    """Run fn once per key; concurrent callers for the same key share the result"""
+    call = _inflight.get(key)
+    if call is not None:
+        _stats["coalesced"] += 1
+        return await _wait(call)
+
+    _stats["leaders"] += 1
+    call = _Call(asyncio.ensure_future(fn()))
+    _inflight[key] = call
+
+    def _done(t: asyncio.Task):
+        if key in _inflight and _inflight[key].task is t:
+            del _inflight[key]
+        _consume_exception(t)
+
+    call.task.add_done_callback(_done)
+    return await _wait(call)
+
+
+def lock_key(cache_key: str) -> str:
+    return f"lock:{cache_key}"
+
+
+async def acquire_lock(redis: Redis, cache_key: str) -> str | None:
+    """Try to take the cross-replica fill lock, returns the owner token or None"""
+    token = uuid.uuid4().hex
+    start = time.perf_counter()
+    acquired = await redis.set(lock_key(cache_key), token, nx=True, px=LOCK_TTL_MS)
+    metrics.REDIS_LOCK.observe(time.perf_counter() - start)
+    if acquired:
+        _stats["lock_acquired"] += 1
+        return token
+    _stats["lock_contended"] += 1
+    return None
+
+
+async def release_lock(redis: Redis, cache_key: str, token: str):
+    try:
+        await redis.eval(_RELEASE_SCRIPT, 1, lock_key(cache_key), token)
+    except Exception as e:
+        logger.warning(f"Failed to release fill lock for {cache_key}: {e}")
+
+
+async def wait_for_peer(read: Callable[[], Awaitable[Any]]) -> Any:
+    """Poll the cache while another replica fills it, returns None on timeout"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + WAIT_TIMEOUT
+    while loop.time() < deadline:
+        await asyncio.sleep(WAIT_INTERVAL)
+        value = await read()
+        if value is not None:
+            _stats["remote_coalesced"] += 1
+            return value
+    _stats["remote_timeouts"] += 1
+    return None
+
+
+def get_stats() -> dict:
+    return {**_stats, "inflight": len(_inflight)}
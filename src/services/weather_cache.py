@@ -0,0 +1,308 @@
+import os
+import time
+import uuid
+import hashlib
+import asyncio
+import logging
+
+from dataclasses import dataclass, field
+
+from src.settings import settings
+from src import metrics
+from src.models import WeatherResponse
+from src.redis_client import get_redis, get_binary_redis, pipeline, mget
+from src.services import cache_codec, city_aliases
+from src.services.local_cache import LRUCache
+from src.services.disk_cache import disk_cache
+
+
+logger = logging.getLogger(__name__)
+
+# Soft TTL: entries younger than this are fresh
+CACHE_TTL = settings.weather_data_ttl
+# Hard TTL: entries are kept (and served stale while refreshing) until this age
+CACHE_HARD_TTL = max(settings.weather_data_hard_ttl, CACHE_TTL)
+
+# In-process L1 tier in front of Redis
+L1_CACHE_MAX_ENTRIES = settings.l1_cache_max_entries
+L1_CACHE_TTL = min(settings.l1_cache_ttl or CACHE_HARD_TTL, CACHE_HARD_TTL)
+# Publish cache writes so other replicas drop their L1 copy
+L1_INVALIDATION_ENABLED = settings.l1_invalidation_enabled
+L1_INVALIDATION_CHANNEL = settings.l1_invalidation_channel
+
+# Shared tiers behind L1: Redis, a local SQLite file, or Redis with the file behind it
+CACHE_BACKEND = settings.cache_backend
+if CACHE_BACKEND not in ("redis", "sqlite", "redis+sqlite"):
+    raise ValueError(f"Unknown CACHE_BACKEND: {CACHE_BACKEND}")
+USE_REDIS = "redis" in CACHE_BACKEND
+USE_DISK = "sqlite" in CACHE_BACKEND
+
+# Values for the X-Cache response header
+HIT = "HIT"
+STALE = "STALE"
+MISS = "MISS"
+
+
+@dataclass
+class CacheEntry:
+    """Cached weather data along with when it was fetched from the provider"""
+    data: dict
+    fetched_at: float
+    # Written by the pre-warmer rather than by a user request
+    warmed: bool = False
+    # Serialized response and its ETag, filled in on first use (see response_body)
+    body: bytes | None = field(default=None, repr=False, compare=False)
+    etag: str | None = field(default=None, repr=False, compare=False)
+    # Response headers that never change for this entry (see http_cache.weather_headers)
+    headers: dict[str, str] | None = field(default=None, repr=False, compare=False)
+
+    @property
+    def age(self) -> float:
+        return max(0.0, time.time() - self.fetched_at)
+
+    @property
+    def is_fresh(self) -> bool:
+        return self.age < CACHE_TTL
+
+
+def response_body(entry: CacheEntry) -> tuple[bytes, str]:
+    """
+    JSON body of the WeatherResponse for an entry and its ETag.
+
+    The ETag is weak: the compression middleware sends the same data in other
+    encodings, and a 304 (which it never compresses) must carry the same
+    validator as the 200 it revalidates.
+
+    Validated and serialized once per entry; the L1 cache keeps the entry
+    object, so hits reuse the bytes without going through the model again.
+    """
+    if entry.body is None:
+        entry.body = WeatherResponse.model_validate(entry.data).model_dump_json().encode()
+        entry.etag = f'W/"{hashlib.blake2b(entry.body, digest_size=16).hexdigest()}"'
+    return entry.body, entry.etag
+
+
+l1_cache = LRUCache(max_entries=L1_CACHE_MAX_ENTRIES, ttl=L1_CACHE_TTL)
+
+# Identifies this worker in invalidation messages so it can skip its own writes
+_instance_id = uuid.uuid4().hex
+
+
+def _new_instance_id():
+    # Workers forked from a parent that imported the app must not share its id
+    global _instance_id
+    _instance_id = uuid.uuid4().hex
+
+
+os.register_at_fork(after_in_child=_new_instance_id)
+
+
+def _store_local(cache_key: str, entry: CacheEntry, ttl: int = CACHE_HARD_TTL):
+    # Never keep an entry locally past the point Redis would have expired it
+    l1_cache.set(cache_key, entry, ttl=ttl - entry.age)
+
+
+def encode_entry(entry: CacheEntry) -> bytes:
+    value = {"data": entry.data, "fetched_at": entry.fetched_at}
+    if entry.warmed:
+        value["warmed"] = True
+    return cache_codec.encode(value)
+
+
+def decode_entry(raw: bytes | str) -> CacheEntry:
+    value = cache_codec.decode(raw)
+    if "fetched_at" not in value:
+        # Entry written before soft/hard TTLs, its Redis TTL was the old soft TTL
+        return CacheEntry(data=value, fetched_at=time.time())
+    return CacheEntry(data=value["data"], fetched_at=value["fetched_at"], warmed=value.get("warmed", False))
+
+
+async def _read_remote(cache_key: str) -> bytes | None:
+    """Value from Redis, or from the disk tier when Redis misses or is down"""
+    if USE_REDIS:
+        try:
+            redis = await get_binary_redis()
+            start = time.perf_counter()
+            cached = await redis.get(cache_key)
+            metrics.REDIS_GET.observe(time.perf_counter() - start)
+            if cached:
+                return cached
+        except Exception as e:
+            metrics.CACHE_ERROR.inc()
+            logger.warning(f"Cache read failed for key: {cache_key}")
+    if USE_DISK:
+        return await disk_cache.get(cache_key)
+    return None
+
+
+async def read_entry(cache_key: str) -> CacheEntry | None:
+    local = l1_cache.get(cache_key)
+    if local is not None and local.is_fresh:
+        return local
+
+    # Missing or stale locally: another replica may already have refreshed it
+    cached = await _read_remote(cache_key)
+    if cached:
+        try:
+            entry = decode_entry(cached)
+        except Exception as e:
+            metrics.CACHE_ERROR.inc()
+            logger.warning(f"Cache value could not be decoded for key: {cache_key}")
+            return local
+        if local is None or entry.fetched_at > local.fetched_at:
+            _store_local(cache_key, entry)
+            return entry
+    # The shared tiers are down or behind, the local copy is still better than nothing
+    return local
+
+
+async def write_entry(cache_key: str, entry: CacheEntry):
+    _store_local(cache_key, entry)
+    value = encode_entry(entry)
+    if USE_DISK:
+        await disk_cache.set(cache_key, value, CACHE_HARD_TTL)
+    if not USE_REDIS:
+        return
+    try:
+        start = time.perf_counter()
+        if L1_INVALIDATION_ENABLED:
+            # SET and PUBLISH in a single round trip
+            async with pipeline(binary=True) as pipe:
+                pipe.set(cache_key, value, ex=CACHE_HARD_TTL)
+                pipe.publish(L1_INVALIDATION_CHANNEL, f"{_instance_id}|{cache_key}")
+        else:
+            redis = await get_binary_redis()
+            await redis.set(cache_key, value, ex=CACHE_HARD_TTL)
+        metrics.REDIS_SET.observe(time.perf_counter() - start)
+        logger.debug(f"Cached weather for key: {cache_key}")
+    except Exception as e:
+        metrics.CACHE_ERROR.inc()
+        logger.warning(f"Cache write failed for key: {cache_key}")
+
+
+async def _read_remote_many(cache_keys: list[str]) -> list[bytes | None]:
+    """A single MGET, then one disk lookup for whatever Redis did not have"""
+    values = [None] * len(cache_keys)
+    if USE_REDIS:
+        try:
+            redis = await get_binary_redis()
+            start = time.perf_counter()
+            values = await mget(redis, cache_keys)
+            metrics.REDIS_MGET.observe(time.perf_counter() - start)
+        except Exception as e:
+            metrics.CACHE_ERROR.inc()
+            logger.warning(f"Batch cache read failed for {len(cache_keys)} keys")
+    if USE_DISK:
+        missing = [index for index, value in enumerate(values) if not value]
+        if missing:
+            found = await disk_cache.mget([cache_keys[index] for index in missing])
+            for index, value in zip(missing, found):
+                values[index] = value
+    return values
+
+
+async def read_entries(cache_keys: list[str]) -> dict[str, CacheEntry | None]:
+    """Batch read: L1 first, then the shared tiers for everything not fresh locally"""
+    results = {key: l1_cache.get(key) for key in cache_keys}
+    remote_keys = [key for key, entry in results.items() if entry is None or not entry.is_fresh]
+    if not remote_keys:
+        return results
+
+    values = await _read_remote_many(remote_keys)
+    for key, cached in zip(remote_keys, values):
+        if not cached:
+            continue
+        try:
+            entry = decode_entry(cached)
+        except Exception as e:
+            metrics.CACHE_ERROR.inc()
+            logger.warning(f"Cache value could not be decoded for key: {key}")
+            continue
+        local = results[key]
+        if local is None or entry.fetched_at > local.fetched_at:
+            _store_local(key, entry)
+            results[key] = entry
+    return results
+
+
+async def write_entries(entries: dict[str, CacheEntry], ttl: int = CACHE_HARD_TTL, aliases: dict[str, str] | None = None):
+    """
+    Batch write: one pipelined round trip of SET ... EX, and one disk
+    transaction. City aliases learned with the entries go in the same pipeline.
+    """
+    if not entries:
+        return
+    aliases = city_aliases.stage(aliases or {})
+    for key, entry in entries.items():
+        _store_local(key, entry, ttl)
+    values = {key: encode_entry(entry) for key, entry in entries.items()}
+    if USE_DISK:
+        await disk_cache.set_many(values, ttl)
+    if not USE_REDIS:
+        return
+    try:
+        start = time.perf_counter()
+        async with pipeline(binary=True) as pipe:
+            for key, value in values.items():
+                pipe.set(key, value, ex=ttl)
+                if L1_INVALIDATION_ENABLED:
+                    pipe.publish(L1_INVALIDATION_CHANNEL, f"{_instance_id}|{key}")
+            city_aliases.queue_writes(pipe, aliases)
+        metrics.REDIS_PIPELINE.observe(time.perf_counter() - start)
+        logger.debug(f"Cached weather for {len(entries)} keys")
+    except Exception as e:
+        metrics.CACHE_ERROR.inc()
+        logger.warning(f"Batch cache write failed for {len(entries)} keys")
+
+
+async def delete_entry(cache_key: str):
+    """
+    Drop a key from every tier and from every worker's L1. The invalidation is
+    published even with L1_INVALIDATION_ENABLED off, workers listen whenever
+    purging is on (see main.lifespan).
+    """
+    l1_cache.delete(cache_key)
+    if USE_DISK:
+        await disk_cache.delete(cache_key)
+    if not USE_REDIS:
+        return
+    try:
+        async with pipeline(binary=True) as pipe:
+            pipe.delete(cache_key)
+            pipe.publish(L1_INVALIDATION_CHANNEL, f"{_instance_id}|{cache_key}")
+        logger.info(f"Deleted cached weather for key: {cache_key}")
+    except Exception as e:
+        metrics.CACHE_ERROR.inc()
+        logger.warning(f"Cache delete failed for key: {cache_key}")
+
+
+async def run_invalidation_listener():
+    """Drop L1 entries that other replicas have rewritten, reconnecting on failure"""
+    while True:
+        pubsub = None
+        try:
+            redis = await get_redis()
+            pubsub = redis.pubsub()
+            await pubsub.subscribe(L1_INVALIDATION_CHANNEL)
+            logger.info(f"Listening for L1 invalidations on {L1_INVALIDATION_CHANNEL}")
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None:
+                    continue
+                data = message["data"]
+                if isinstance(data, bytes):
+                    data = data.decode()
+                sender, _, cache_key = data.partition("|")
+                if sender != _instance_id:
+                    l1_cache.delete(cache_key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"L1 invalidation listener failed, retrying: {e}")
+            await asyncio.sleep(5)
+        finally:
+            if pubsub is not None:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
@@ -1,135 +1,120 @@
-import os
-import json
-import httpx
+import time
+import asyncio
 import logging
 
-from dotenv import load_dotenv
+from typing import AsyncIterator
 from redis.asyncio import Redis
 
+from src.settings import settings
+from src import metrics
 from src.exceptions import WeatherProviderError, WetaherNotFoundError
-from src.redis_client import get_redis
+from src.services import singleflight, city_aliases, negative_cache, prewarmer, providers, hedging, weather_geo, cache_fill
+from src.services.city_aliases import normalize_city
+from src.services.weather_cache import CacheEntry, read_entry, write_entry, read_entries, write_entries, delete_entry, HIT, STALE, MISS
 
 
-
-
-load_dotenv()
 logger = logging.getLogger(__name__)
 
-API_KEY = os.getenv("WEATHER_API_KEY")
-BASE_URL = os.getenv("WEATHER_BASE_URL")
-# REDIS_URL = os.getenv("REDIS_URL")
-CACHE_TTL = int(os.getenv("WEATHER_DATA_TTL", "60"))
+BATCH_MAX_CITIES = settings.batch_max_cities
+# Max upstream calls in flight for the misses of a single batch
+BATCH_CONCURRENCY = settings.batch_concurrency
+STREAM_MAX_CITIES = settings.stream_max_cities
+# Lookups in flight per stream, also the number of finished results buffered
+STREAM_CONCURRENCY = settings.stream_concurrency
 
 # redis_client = Redis.from_url(REDIS_URL, decode_responses=True)
 
 def _cache_key(city: str) -> str:
-    return f"weather:{city.strip().lower()}"
-
-
-def _to_human_readable(data: dict) -> dict:
-    msg = data.get("message", data)
-
-    city = msg.get("resolvedAddress") or msg.get("address") or "Unknown"
-    timezone = msg.get("timezone")
-
-    days = msg.get("days") or []
-    today = days[0] if days else {}
-
-    date = today.get("datetime")
-    conditions = today.get("conditions")
-    desc = today.get("description") or msg.get("description")
-
-    temp = today.get("temp")
-    tempmax = today.get("tempmax")
-    tempmin = today.get("tempmin")
-    feelslike = today.get("feelslike")
-
-    precip = today.get("precip")
-    precipprob = today.get("precipprob")
-    preciptype = today.get("preciptype") or []
-    snow = today.get("snow")
-
-    windspeed = today.get("windspeed")
-    windgust = today.get("windgust")
-    winddir = today.get("winddir")
-
-    sunrise = today.get("sunrise")
-    sunset = today.get("sunset")
-
-    # current conditions (optional)
-    current = msg.get("currentConditions") or {}
-    current_time = current.get("datetime")
-    current_cond = current.get("conditions")
-    current_temp = current.get("temp")
-    current_feels = current.get("feelslike")
-
-    return {
-  "version": "v1",
-  "city": city,
-  "date": date,
-  "timezone": timezone,
-  "summary": desc,
-  "conditions": conditions,
-  "temp_avg_c": temp,
-  "temp_max_c": tempmax,
-  "temp_min_c": tempmin,
-  "feels_like_c": feelslike,
-  "precip_mm": precip,
-  "precip_prob_percent": precipprob,
-  "wind_speed_kmh": windspeed,
-  "wind_gust_kmh": windgust,
-  "sunrise": sunrise,
-  "sunset": sunset
-}
-
-    # return {
-    #     "city": city,
-    #     "date": date,
-    #     "timezone": timezone,
-    #     "summary": desc,
-    #     "conditions": conditions,
-    #     "temperature_c": {
-    #         "average": temp,
-    #         "high": tempmax,
-    #         "low": tempmin,
-    #         "feels_like": feelslike,
-    #     },
-    #     "precipitation": {
-    #         "amount_mm": precip,
-    #         "chance_percent": precipprob,
-    #         "types": preciptype,
-    #         "snow": snow,
-    #     },
-    #     "wind": {
-    #         "speed_kmh": windspeed,
-    #         "gust_kmh": windgust,
-    #         "direction_degrees": winddir,
-    #     },
-    #     "sun": {
-    #         "sunrise": sunrise,
-    #         "sunset": sunset,
-    #     },
-    #     "current": {
-    #         "time": current_time,
-    #         "conditions": current_cond,
-    #         "temp_c": current_temp,
-    #         "feels_like_c": current_feels,
-    #     } if current else None,
-    # }
+    return f"weather:{normalize_city(city)}"
 
-async def fetch_weather(city : str) -> dict:
-    if not API_KEY:
-        raise WeatherProviderError("Weather api is not set")
-    cache_key = _cache_key(city)
+
+async def _fetch_from_provider(city: str) -> dict:
+    logger.debug(f"Fetching weather from API for city: {city}")
+    return await hedging.call(lambda provider: provider.current(city))
+
+
+async def _read_fresh(city: str) -> CacheEntry | None:
+    # Re-resolve the alias, a peer may have cached the city under its canonical name
+    query = normalize_city(city)
+    canonical = await city_aliases.lookup(query) or query
+    entry = await read_entry(_cache_key(canonical))
+    if entry is not None and entry.is_fresh:
+        return entry
+    return None
+
+
+def canonical_city(city: str, entry: CacheEntry) -> str:
+    """Name the entry for a city query is cached under"""
+    return city_aliases.canonical_name(entry.data) or normalize_city(city)
+
+
+async def _store(city: str, entry: CacheEntry):
+    """Cache under the provider's resolved address and remember the query as its alias"""
+    canonical = canonical_city(city, entry)
+    await write_entry(_cache_key(canonical), entry)
+    await city_aliases.record({normalize_city(city): canonical})
+
+
+async def _fetch_entry(city: str, warmed: bool = False) -> CacheEntry:
+    if await negative_cache.lookup_remote(normalize_city(city)):
+        # Another replica already learned the provider does not know this city
+        raise WetaherNotFoundError(f"{city} not found")
+    return CacheEntry(data=await _fetch_from_provider(city), fetched_at=time.time(), warmed=warmed)
+
+
+async def _fill_cache(city: str, cache_key: str, stale: CacheEntry | None = None, warmed: bool = False) -> CacheEntry:
+    """Fetch from the provider and cache the result, letting one replica do the work"""
+
+    async def load() -> CacheEntry:
+        entry = await _fetch_entry(city, warmed)
+        await _store(city, entry)
+        return entry
 
     try:
-        redis =await get_redis()
-        cached = await redis.get(cache_key)
-        if cached:
+        return await cache_fill.fill(cache_key, load, lambda: _read_fresh(city), stale)
+    except WetaherNotFoundError:
+        await negative_cache.record([normalize_city(city)])
+        raise
+
+
+async def warm_key(cache_key: str):
+    """Pre-warmer refresh of a hot key, sharing the fill lock with user requests"""
+    if weather_geo.is_cell_key(cache_key):
+        return await weather_geo.warm_cell(cache_key)
+    city = cache_key.removeprefix("weather:")
+    stale = await read_entry(cache_key)
+    await singleflight.do(cache_key, lambda: _fill_cache(city, cache_key, stale, warmed=True))
+
+
+def _schedule_refresh(city: str, cache_key: str, stale: CacheEntry):
+    cache_fill.schedule_refresh(cache_key, lambda: _fill_cache(city, cache_key, stale))
+
+
+async def fetch_weather_entry(city: str) -> tuple[CacheEntry, str]:
+    """Return the cache entry for a city and whether it was a fresh hit, stale hit or miss"""
+    providers.ensure_configured()
+    if await negative_cache.is_not_found(normalize_city(city)):
+        metrics.CACHE_NEGATIVE.inc()
+        logger.debug(f"Negative cache hit for city: {city}")
+        raise WetaherNotFoundError(f"{city} not found")
+    canonical, aliased = await city_aliases.resolve(city)
+    cache_key = _cache_key(canonical)
+
+    prewarmer.record_request(cache_key)
+    entry = await read_entry(cache_key)
+    if entry is not None:
+        if aliased:
+            city_aliases.mark_saved()
+        if entry.is_fresh:
+            metrics.CACHE_HIT.inc()
+            prewarmer.note_hit(cache_key, entry)
             logger.debug(f"Cache hit for city: {city}")
-            return json.loads(cached)
-    except Exception as e:
-        logger.warning(f"Cache read failed for city: {city}")    
+            return entry, HIT
+        # Past the soft TTL: answer now and refresh in the background
+        metrics.CACHE_STALE.inc()
+        logger.debug(f"Stale cache hit for city: {city}")
+        _schedule_refresh(city, cache_key, entry)
+        return entry, STALE
     
     # # cached = await redis_client.get(cache_key)
     # try:
@@ -138,37 +123,156 @@ async def fetch_weather(city : str) -> dict:
     #     cached = None    
     # if cached:
     #     return json.loads(cached)
-    logger.debug(f"Fetching weather from API for city: {city}")
-    
-    
-    url = f"{BASE_URL}{city}/today"
-    params = {
-        "unitGroup": "metric",
-        "contentType": "json",
-        "key": API_KEY
-    }
 
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url, params=params)
-        
-        if response.status_code == 404:
+    # Concurrent misses for the same city in this process share one upstream call
+    metrics.CACHE_MISS.inc()
+    entry = await singleflight.do(cache_key, lambda: _fill_cache(city, cache_key))
+    return entry, MISS
+
+
+async def purge_city(city: str) -> str:
+    """Drop the cached weather of a city from every tier; returns its canonical name"""
+    canonical, _ = await city_aliases.resolve(city)
+    await delete_entry(_cache_key(canonical))
+    return canonical
+
+
+async def fetch_weather(city : str) -> dict:
+    entry, _ = await fetch_weather_entry(city)
+    return entry.data
+
+
+def _batch_error(city: str, exc: Exception) -> dict:
+    if isinstance(exc, WetaherNotFoundError):
+        return {"city": city, "status": 404, "detail": str(exc)}
+    if isinstance(exc, WeatherProviderError):
+        return {"city": city, "status": 503, "detail": str(exc)}
+    logger.error(f"Unexpected error fetching city: {city} ({exc!r})")
+    return {"city": city, "status": 500, "detail": "Internal error"}
+
+
+async def fetch_weather_batch(cities: list[str]) -> list[dict]:
+    """
+    Look up many cities at once: one MGET for the cache, then concurrent fetches
+    for the misses, written back with their aliases in one pipeline. Misses take
+    the same cross-replica fill lock and tombstone check as single lookups, so
+    a batch and a /weather call on two replicas do not both ask the provider
+    for one city.
+    Each city gets its own status so one failure does not fail the batch.
+    """
+    providers.ensure_configured()
+
+    # Several spellings may share a key, only look each key up once
+    resolved = await city_aliases.resolve_many(cities)
+    keys = {}
+    for city in cities:
+        keys.setdefault(_cache_key(resolved[city][0]), city)
+
+    entries = await read_entries(list(keys))
+    found: dict[str, tuple[CacheEntry, str]] = {}
+    misses = []
+    for cache_key, entry in entries.items():
+        prewarmer.record_request(cache_key)
+        if entry is not None and resolved[keys[cache_key]][1]:
+            city_aliases.mark_saved()
+        if entry is None:
+            metrics.CACHE_MISS.inc()
+            misses.append(cache_key)
+        elif entry.is_fresh:
+            metrics.CACHE_HIT.inc()
+            prewarmer.note_hit(cache_key, entry)
+            found[cache_key] = (entry, HIT)
+        else:
+            metrics.CACHE_STALE.inc()
+            _schedule_refresh(keys[cache_key], cache_key, entry)
+            found[cache_key] = (entry, STALE)
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    # Entries fetched by this batch and their aliases, written in one pipeline
+    # while the fill locks in `held` keep peers waiting for them
+    loaded: dict[str, CacheEntry] = {}
+    aliases: dict[str, str] = {}
+    held = []
+
+    async def load(city: str) -> CacheEntry:
+        entry = await _fetch_entry(city)
+        canonical = canonical_city(city, entry)
+        loaded[_cache_key(canonical)] = entry
+        aliases[normalize_city(city)] = canonical
+        return entry
+
+    async def fetch_miss(cache_key: str) -> CacheEntry:
+        city = keys[cache_key]
+        if await negative_cache.is_not_found(normalize_city(city)):
+            metrics.CACHE_NEGATIVE.inc()
             raise WetaherNotFoundError(f"{city} not found")
-        if response.status_code >= 400:
-            raise WeatherProviderError(f"Weather api error with status code: {response.status_code}")
-        
-        raw = response.json()
-        result = _to_human_readable(raw)
-        try:
-            await redis.set(cache_key, json.dumps(result), ex=CACHE_TTL)
-            logger.debug(f"Cached weather for city: {city}")
-        except Exception as e:
-            logger.warning(f"Cache write failed for city: {city}")
-        return result
-        
-    except httpx.TimeoutException:
-        raise WeatherProviderError("Weather api timed out")
-    except httpx.RequestError as e:
-        raise WeatherProviderError(f"Network error: {e}")    
-
- 
\ No newline at end of file
+        async with semaphore:
+            try:
+                return await singleflight.do(
+                    cache_key, lambda: cache_fill.fill(cache_key, lambda: load(city), lambda: _read_fresh(city), held=held)
+                )
+            except WetaherNotFoundError:
+                await negative_cache.record([normalize_city(city)])
+                raise
+
+    try:
+        fetched = await asyncio.gather(*[fetch_miss(key) for key in misses], return_exceptions=True)
+        await write_entries(loaded, aliases=aliases)
+    finally:
+        await cache_fill.release(held)
+    errors = {}
+    for cache_key, result in zip(misses, fetched):
+        if isinstance(result, BaseException):
+            errors[cache_key] = result
+        else:
+            found[cache_key] = (result, MISS)
+
+    results = []
+    for city in cities:
+        cache_key = _cache_key(resolved[city][0])
+        if cache_key in errors:
+            results.append(_batch_error(city, errors[cache_key]))
+            continue
+        entry, cache_status = found[cache_key]
+        results.append({"city": city, "status": 200, "cache": cache_status, "data": entry.data})
+    return results
+
+
+async def _lookup(index: int, city: str) -> dict:
+    try:
+        entry, cache_status = await fetch_weather_entry(city)
+        item = {"city": city, "status": 200, "cache": cache_status, "data": entry.data}
+    except Exception as e:
+        item = _batch_error(city, e)
+    return {"index": index, **item}
+
+
+def stream_weather(cities: list[str]) -> AsyncIterator[dict]:
+    """
+    Yield one result per city as soon as its lookup finishes.
+
+    A fixed pool of workers feeds a bounded queue, so a slow reader stalls
+    the lookups instead of buffering results. Closing the generator (e.g. on
+    client disconnect) cancels the lookups that are still running.
+    """
+    # Checked here rather than in the generator so it fails before streaming starts
+    providers.ensure_configured()
+    return _stream(cities)
+
+
+async def _stream(cities: list[str]) -> AsyncIterator[dict]:
+    queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_CONCURRENCY)
+    pending = iter(enumerate(cities))
+
+    async def worker():
+        for index, city in pending:
+            await queue.put(await _lookup(index, city))
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(STREAM_CONCURRENCY, len(cities)))]
+    try:
+        for _ in range(len(cities)):
+            yield await queue.get()
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
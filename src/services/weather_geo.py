@@ -0,0 +1,143 @@
+import time
+import logging
+
+from src.settings import settings
+from src import metrics
+from src.exceptions import WeatherProviderError, WetaherNotFoundError
+from src.services import geo, singleflight, prewarmer, providers, hedging, cache_fill
+from src.services.weather_cache import CacheEntry, read_entry, write_entry, delete_entry, HIT, STALE, MISS
+
+
+logger = logging.getLogger(__name__)
+
+# Geohash length of a cell; every coordinate in a cell shares one cache entry
+GEO_CELL_PRECISION = settings.geo_cell_precision
+# How far away a cached neighbor may be to be served while the provider is failing
+GEO_FALLBACK_RADIUS_KM = settings.geo_fallback_radius_km
+GEO_INDEX_MAX_CELLS = settings.geo_index_max_cells
+
+# X-Cache value when a neighboring cell was served instead
+NEARBY = "NEARBY"
+
+CELL_KEY_PREFIX = "weather:geo:"
+
+cell_index = geo.CellIndex(max_cells=GEO_INDEX_MAX_CELLS)
+
+_stats = {
+    "lookups": 0,
+    "upstream_calls": 0,
+    "nearby_served": 0,
+    "nearby_unavailable": 0,
+}
+
+
+def cell_key(cell: str) -> str:
+    return f"{CELL_KEY_PREFIX}{cell}"
+
+
+def is_cell_key(cache_key: str) -> bool:
+    return cache_key.startswith(CELL_KEY_PREFIX)
+
+
+async def _fetch_cell(cell: str) -> dict:
+    # Every coordinate in the cell is answered with the weather at its center
+    lat, lon = geo.decode(cell)
+    location = f"{lat:.4f},{lon:.4f}"
+    logger.debug(f"Fetching weather from API for cell: {cell} ({location})")
+    _stats["upstream_calls"] += 1
+    return await hedging.call(lambda provider: provider.current(location))
+
+
+async def _read_fresh(cache_key: str) -> CacheEntry | None:
+    entry = await read_entry(cache_key)
+    if entry is not None and entry.is_fresh:
+        return entry
+    return None
+
+
+async def _fill_cell(cell: str, stale: CacheEntry | None = None, warmed: bool = False) -> CacheEntry:
+    """Fetch a cell from the provider and cache it, letting one replica do the work"""
+    cache_key = cell_key(cell)
+
+    async def load() -> CacheEntry:
+        entry = CacheEntry(data=await _fetch_cell(cell), fetched_at=time.time(), warmed=warmed)
+        await write_entry(cache_key, entry)
+        cell_index.add(cell)
+        return entry
+
+    return await cache_fill.fill(cache_key, load, lambda: _read_fresh(cache_key), stale)
+
+
+async def warm_cell(cache_key: str):
+    """Pre-warmer refresh of a hot cell"""
+    cell = cache_key.removeprefix(CELL_KEY_PREFIX)
+    stale = await read_entry(cache_key)
+    await singleflight.do(cache_key, lambda: _fill_cell(cell, stale, warmed=True))
+
+
+async def _nearby(lat: float, lon: float, cell: str) -> tuple[CacheEntry, str, float] | None:
+    found = cell_index.nearest(lat, lon, GEO_FALLBACK_RADIUS_KM, exclude=cell)
+    if found is None:
+        return None
+    neighbor, distance = found
+    entry = await read_entry(cell_key(neighbor))
+    if entry is None:
+        # Expired everywhere since it was indexed
+        cell_index.discard(neighbor)
+        return None
+    return entry, neighbor, distance
+
+
+async def fetch_weather_at(lat: float, lon: float) -> tuple[CacheEntry, str, str, float]:
+    """
+    Weather for a coordinate, by geohash cell.
+
+    Returns the entry, its cache status (HIT/STALE/MISS, or NEARBY when the
+    provider failed and a cached cell within GEO_FALLBACK_RADIUS_KM was served
+    instead), the cell the data belongs to and its distance in km.
+    """
+    providers.ensure_configured()
+    _stats["lookups"] += 1
+    cell = geo.encode(lat, lon, GEO_CELL_PRECISION)
+    cache_key = cell_key(cell)
+
+    prewarmer.record_request(cache_key)
+    entry = await read_entry(cache_key)
+    if entry is not None:
+        cell_index.add(cell)
+        if entry.is_fresh:
+            metrics.CACHE_HIT.inc()
+            prewarmer.note_hit(cache_key, entry)
+            return entry, HIT, cell, 0.0
+        metrics.CACHE_STALE.inc()
+        cache_fill.schedule_refresh(cache_key, lambda: _fill_cell(cell, entry))
+        return entry, STALE, cell, 0.0
+
+    # Nearby coordinates map to the same cell and share one upstream call
+    metrics.CACHE_MISS.inc()
+    try:
+        entry = await singleflight.do(cache_key, lambda: _fill_cell(cell))
+    except WetaherNotFoundError:
+        raise
+    except WeatherProviderError as e:
+        nearby = await _nearby(lat, lon, cell)
+        if nearby is None:
+            _stats["nearby_unavailable"] += 1
+            raise
+        entry, neighbor, distance = nearby
+        _stats["nearby_served"] += 1
+        logger.warning(f"Serving weather of cell {neighbor} ({distance:.1f}km away) for cell: {cell} ({e})")
+        return entry, NEARBY, neighbor, distance
+    return entry, MISS, cell, 0.0
+
+
+async def purge_cell(lat: float, lon: float) -> str:
+    """Drop the cached weather of the cell holding a coordinate; returns the cell"""
+    cell = geo.encode(lat, lon, GEO_CELL_PRECISION)
+    cell_index.discard(cell)
+    await delete_entry(cell_key(cell))
+    return cell
+
+
+def get_stats() -> dict:
+    return {**_stats, "indexed_cells": len(cell_index)}
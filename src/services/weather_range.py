@@ -0,0 +1,156 @@
+import time
+import asyncio
+import logging
+
+from datetime import date, datetime, timedelta, timezone
+
+from src.settings import settings
+from src import metrics
+from src.exceptions import WetaherNotFoundError
+from src.services import singleflight, city_aliases, negative_cache, providers, hedging
+from src.services.city_aliases import normalize_city
+from src.services.weather_cache import CacheEntry, read_entries, write_entries, HIT, MISS
+
+
+logger = logging.getLogger(__name__)
+
+FORECAST_MAX_DAYS = settings.forecast_max_days
+HISTORY_MAX_DAYS = settings.history_max_days
+# Past days never change, forecasts are revised several times a day
+WEATHER_HISTORY_TTL = settings.weather_history_ttl
+WEATHER_FORECAST_TTL = settings.weather_forecast_ttl
+# Max provider calls in flight for the gaps of a single range
+RANGE_CONCURRENCY = settings.range_concurrency
+
+# X-Cache value when some days were cached and others fetched
+PARTIAL = "PARTIAL"
+
+_stats = {
+    "ranges": 0,
+    "days_cached": 0,
+    "days_fetched": 0,
+    "upstream_calls": 0,
+}
+
+
+def _day_key(canonical: str, day: date) -> str:
+    return f"weather:day:{canonical}:{day.isoformat()}"
+
+
+def utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def day_ttl(day: date, today: date) -> int:
+    # Some timezones are a day behind UTC, so only days before yesterday are surely over
+    if day < today - timedelta(days=1):
+        return WEATHER_HISTORY_TTL
+    return WEATHER_FORECAST_TTL
+
+
+def missing_runs(days: list[date], cached: set[date]) -> list[tuple[date, date]]:
+    """Group the uncached days into contiguous (start, end) runs, one provider call each"""
+    runs = []
+    for day in days:
+        if day in cached:
+            continue
+        if runs and runs[-1][1] == day - timedelta(days=1):
+            runs[-1] = (runs[-1][0], day)
+        else:
+            runs.append((day, day))
+    return runs
+
+
+async def _fetch_run(city: str, start: date, end: date) -> dict[date, dict]:
+    """One provider call for a run of days, as cache values keyed by day"""
+    logger.debug(f"Fetching weather from API for city: {city} ({start} to {end})")
+    _stats["upstream_calls"] += 1
+    answer = await hedging.call(lambda provider: provider.days(city, start, end))
+    days = {}
+    for day in answer["days"]:
+        try:
+            day_date = date.fromisoformat(day.get("date") or "")
+        except ValueError:
+            continue
+        days[day_date] = {"city": answer["city"], "timezone": answer["timezone"], "day": day}
+    return days
+
+
+async def fetch_range(city: str, start: date, end: date) -> tuple[dict, str]:
+    """
+    Daily weather for a city between two dates (inclusive) and its X-Cache status.
+
+    Every city-day is its own cache entry. Only the missing days are fetched,
+    with each contiguous gap merged into a single provider call.
+    """
+    providers.ensure_configured()
+    query = normalize_city(city)
+    if await negative_cache.is_not_found(query):
+        metrics.CACHE_NEGATIVE.inc()
+        raise WetaherNotFoundError(f"{city} not found")
+    canonical, _ = await city_aliases.resolve(city)
+    _stats["ranges"] += 1
+
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    entries = await read_entries([_day_key(canonical, day) for day in days])
+    found = {}
+    for day in days:
+        entry = entries[_day_key(canonical, day)]
+        if entry is not None:
+            found[day] = entry.data
+    cached = len(found)
+    runs = missing_runs(days, set(found))
+    metrics.CACHE_HIT.inc(cached)
+    metrics.CACHE_MISS.inc(len(days) - cached)
+    _stats["days_cached"] += cached
+
+    semaphore = asyncio.Semaphore(RANGE_CONCURRENCY)
+
+    async def fetch(run: tuple[date, date]) -> dict[date, dict]:
+        async with semaphore:
+            return await singleflight.do(f"range:{canonical}:{run[0]}:{run[1]}", lambda: _fetch_run(city, *run))
+
+    try:
+        fetched_runs = await asyncio.gather(*[fetch(run) for run in runs])
+    except WetaherNotFoundError:
+        await negative_cache.record([query])
+        raise
+
+    fetched = {}
+    for run_days in fetched_runs:
+        fetched.update(run_days)
+    if fetched:
+        await _store_days(query, fetched)
+        found.update(fetched)
+        _stats["days_fetched"] += len(fetched)
+
+    if not found:
+        raise WetaherNotFoundError(f"No weather data for {city} between {start} and {end}")
+    first = found[min(found)]
+    result = {
+        "city": first["city"],
+        "timezone": first["timezone"],
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "days": [found[day]["day"] for day in days if day in found],
+    }
+    if not runs:
+        return result, HIT
+    return result, PARTIAL if cached else MISS
+
+
+async def _store_days(query: str, days: dict[date, dict]):
+    """Cache fetched days under the provider's resolved address, past days for longer"""
+    canonical = city_aliases.canonical_name(next(iter(days.values()))) or query
+    today = utc_today()
+    now = time.time()
+    by_ttl: dict[int, dict[str, CacheEntry]] = {}
+    for day, data in days.items():
+        by_ttl.setdefault(day_ttl(day, today), {})[_day_key(canonical, day)] = CacheEntry(data=data, fetched_at=now)
+    for ttl, entries in by_ttl.items():
+        await write_entries(entries, ttl=ttl)
+    await city_aliases.record({query: canonical})
+
+
+def get_stats() -> dict:
+    return dict(_stats)
@@ -0,0 +1,194 @@
+import os
+
+from dotenv import load_dotenv
+from pydantic import BaseModel, ConfigDict
+
+
+class Settings(BaseModel):
+    """
+    Every setting of the service, in one place.
+
+    Each field is read from the environment variable of the same name in upper
+    case, after loading .env. Invalid values fail at startup with the names of
+    all offending variables.
+    """
+
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
+    # Service
+    env: str = "development"
+    batch_cities_per_token: int = 25  # Batches and streams cost one rate limit token per this many cities
+
+    # Serving (python -m src.serve)
+    web_host: str = "0.0.0.0"
+    web_port: int = 8000
+    web_workers: int = 1  # 0 starts one worker per CPU
+    web_loop: str = "auto"  # auto uses uvloop and httptools when they are installed
+    web_http: str = "auto"
+    web_backlog: int = 2048
+    web_keepalive_timeout: int = 5
+
+    # Startup
+    startup_profile: bool = False  # Log time spent per import and per init step
+    ready_warm_connections: int = 4  # Redis connections opened per client before /ready turns green
+    ready_retry_interval: float = 2.0
+
+    # Logging
+    log_level: str | None = None
+    log_format: str = "text"
+    log_dir: str = "logs"
+    log_queue_enabled: bool = True
+    log_queue_maxsize: int = 10000
+    log_queue_overflow: str = "block"
+
+    # Weather providers
+    weather_providers: str = "visualcrossing"  # Comma-separated, the first one is the primary
+    weather_api_key: str | None = None
+    weather_base_url: str | None = None
+    weatherapi_api_key: str | None = None
+    weatherapi_base_url: str = "https://api.weatherapi.com/v1/"
+    weather_projection_enabled: bool = True  # Request only the fields we map (Visual Crossing include/elements)
+    batch_max_cities: int = 200
+    batch_concurrency: int = 10  # Max provider calls in flight for one batch request
+    stream_max_cities: int = 1000
+    stream_concurrency: int = 10
+
+    # Upstream HTTP client, timeouts in seconds
+    upstream_max_connections: int = 100
+    upstream_max_keepalive: int = 20
+    upstream_keepalive_expiry: float = 30.0
+    upstream_http2: bool = False
+    upstream_connect_timeout: float = 3.0
+    upstream_read_timeout: float = 10.0
+    upstream_write_timeout: float = 5.0
+    upstream_pool_timeout: float = 2.0
+
+    # Hedged provider calls
+    hedge_enabled: bool = True
+    hedge_quantile: float = 0.95
+    hedge_min_delay: float = 0.05
+    hedge_max_delay: float = 3.0
+    hedge_initial_delay: float = 1.0
+    hedge_min_samples: int = 20
+    hedge_window: int = 500
+    hedge_budget: float = 0.1
+
+    # Provider circuit breaker
+    breaker_enabled: bool = True
+    breaker_window: float = 30
+    breaker_min_calls: int = 20
+    breaker_error_rate: float = 0.5
+    breaker_slow_call_duration: float = 2.0
+    breaker_slow_call_rate: float = 0.8
+    breaker_open_duration: float = 30
+    breaker_half_open_calls: int = 3
+    breaker_redis_key: str = "breaker:weather-provider"
+    breaker_sync_interval: float = 1.0
+
+    # Adaptive limit on in-flight provider calls
+    upstream_limit_enabled: bool = True
+    upstream_limit_initial: int = 20
+    upstream_limit_min: int = 2
+    upstream_limit_max: int | None = None  # Defaults to upstream_max_connections
+    upstream_limit_latency_target: float = 1.0
+    upstream_limit_backoff: float = 0.9
+
+    # Redis
+    redis_url: str = "redis://localhost:6379"
+    redis_socket_timeout: float = 1.0
+    redis_connect_timeout: float = 1.0
+    redis_max_connections: int = 50
+    redis_pool_timeout: float = 0.5
+    redis_health_check_interval: int = 30
+    redis_retry_attempts: int = 2
+    redis_retry_backoff_base: float = 0.01
+    redis_retry_backoff_cap: float = 0.2
+    redis_circuit_failures: int = 5
+    redis_circuit_cooldown: float = 5
+
+    # Weather cache
+    weather_data_ttl: int = 60
+    weather_data_hard_ttl: int = 3600
+    l1_cache_max_entries: int = 1000
+    l1_cache_ttl: int | None = None  # Defaults to the hard TTL
+    l1_invalidation_enabled: bool = False
+    l1_invalidation_channel: str = "weather:invalidate"
+    cache_codec: str = "orjson"
+    cache_compression: str = "none"
+    cache_compression_min_bytes: int = 1024
+    cache_backend: str = "redis"  # redis, sqlite (local file only) or redis+sqlite (file behind Redis)
+
+    # Local SQLite cache tier (cache_backend sqlite or redis+sqlite)
+    disk_cache_path: str = "data/weather-cache.db"
+    disk_cache_max_entries: int = 100000
+    disk_cache_compact_interval: float = 60
+    disk_cache_busy_timeout: float = 1.0  # Seconds a write waits for another worker's write lock
+
+    # Forecast and history ranges
+    forecast_max_days: int = 15
+    history_max_days: int = 31
+    weather_history_ttl: int = 30 * 24 * 3600
+    weather_forecast_ttl: int = 3600
+    range_concurrency: int = 4
+
+    # Coordinate lookups
+    geo_cell_precision: int = 5  # Geohash length, 5 is about 4.9 x 4.9 km
+    geo_fallback_radius_km: float = 25.0
+    geo_index_max_cells: int = 10000
+
+    # HTTP caching and compression
+    compression_enabled: bool = True
+    compression_min_bytes: int = 1024  # Smaller bodies are sent uncompressed
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4  # br needs the brotli package
+    purge_token: str | None = None  # Required in X-Purge-Token by POST /weather/purge, which is off without it
+    cdn_purge_url: str | None = None  # {key} is replaced by the surrogate key
+    cdn_purge_token: str | None = None
+    cdn_purge_token_header: str = "Fastly-Key"
+
+    # Coalescing of concurrent misses
+    singleflight_lock_ttl_ms: int = 10000
+    singleflight_wait_timeout: float = 2.0
+    singleflight_wait_interval: float = 0.05
+
+    # City aliases and unknown cities
+    alias_key_prefix: str = "weather:alias:"
+    alias_ttl: int = 2592000  # Refreshed whenever the query is fetched again
+    alias_local_max_entries: int = 10000
+    alias_local_ttl: int = 3600
+    negative_cache_ttl: int = 300
+    negative_cache_max_entries: int = 10000
+    negative_bloom_capacity: int = 100000
+    negative_bloom_error_rate: float = 0.01
+
+    # Pre-warming of hot cities
+    prewarm_enabled: bool = False
+    prewarm_top_k: int = 200
+    prewarm_interval: float = 10
+    prewarm_lead_time: float = 15
+    prewarm_concurrency: int = 5
+    prewarm_budget_per_minute: int = 60
+    prewarm_decay_factor: float = 0.5
+    prewarm_decay_interval: float = 300
+    prewarm_max_tracked: int = 2000
+    prewarm_scores_key: str = "weather:hot"
+    prewarm_lease_key: str = "weather:prewarm:lease"
+    prewarm_lease_ttl_ms: int | None = None  # Defaults to three intervals
+
+    # Rate limiting
+    rate_limit_default: str = "5/60"
+    rate_limit_routes: str = "/weather/batch=20/60,/weather/stream=20/60"
+    rate_limit_api_keys: str = ""
+    rate_limit_api_key_header: str = "X-API-Key"
+    rate_limit_local_max_keys: int = 10000
+
+    # Metrics
+    prometheus_multiproc_dir: str | None = None
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        load_dotenv()
+        return cls(**{name: os.environ[name.upper()] for name in cls.model_fields if name.upper() in os.environ})
+
+
+settings = Settings.from_env()
@@ -0,0 +1,106 @@
+"""
+Startup timing.
+
+Init steps are timed with `step()` and reported by /ready and, with
+STARTUP_PROFILE=true, in the logs. For a per-import breakdown run:
+
+    python -m src.startup [--top 25]
+
+which imports the app under `python -X importtime`, then runs its startup
+and prints the slowest imports and every init step.
+"""
+import re
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import subprocess
+
+from contextlib import contextmanager
+
+
+logger = logging.getLogger(__name__)
+
+# Set when src.main starts importing its dependencies
+started_at = time.perf_counter()
+
+_steps: dict[str, float] = {}
+
+
+def record(name: str, seconds: float):
+    _steps[name] = seconds
+
+
+@contextmanager
+def step(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def timings() -> dict[str, float]:
+    """Duration of every init step so far, in milliseconds"""
+    return {name: round(seconds * 1000, 2) for name, seconds in _steps.items()}
+
+
+def report():
+    total = time.perf_counter() - started_at
+    steps = ", ".join(f"{name} {ms:.1f}ms" for name, ms in timings().items())
+    logger.info(f"Startup took {total * 1000:.1f}ms: {steps}")
+
+
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def profile_imports(module: str) -> list[tuple[str, int, int]]:
+    """(module, self us, cumulative us) for every module imported by `module`, in a fresh interpreter"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            imports.append((match[4], int(match[1]), int(match[2])))
+    return imports
+
+
+async def _run_lifespan(app, timeout: float):
+    # Start and stop the app like a server would, timing each step of its lifespan
+    from src import readiness
+
+    async with app.router.lifespan_context(app):
+        if not await readiness.wait_ready(timeout):
+            print(f"not ready after {timeout:.0f}s: {readiness.get_status()['checks']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the import and startup time of the API")
+    parser.add_argument("--top", type=int, default=25, help="Slowest imports to show")
+    parser.add_argument("--ready-timeout", type=float, default=10.0, help="How long to wait for Redis and upstream warm-up")
+    args = parser.parse_args()
+
+    imports = profile_imports("src.main")
+    total = next((cumulative for name, _, cumulative in imports if name == "src.main"), 0)
+    print(f"import src.main: {total / 1000:.1f}ms")
+    print(f"\n{'self ms':>9} {'total ms':>9}  module")
+    for name, own, cumulative in sorted(imports, key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{own / 1000:9.1f} {cumulative / 1000:9.1f}  {name}")
+    print(f"\n{'self ms':>9} {'total ms':>9}  application modules")
+    for name, own, cumulative in imports:
+        if name == "src" or name.startswith("src."):
+            print(f"{own / 1000:9.1f} {cumulative / 1000:9.1f}  {name}")
+
+    # Run as __main__, so the app records its steps in the imported src.startup
+    from src import startup
+    from src.main import app
+
+    asyncio.run(_run_lifespan(app, args.ready_timeout))
+    print("\ninit steps (ms)")
+    for name, ms in startup.timings().items():
+        print(f"{ms:9.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import os
+import time
+import logging
+
+from datetime import datetime
+
+from src.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_workers(workers: int) -> int:
+    """WEB_WORKERS as a process count: 0 means one per CPU"""
+    return workers or os.cpu_count() or 1
+
+
+# Number of server processes, set by src.serve for every worker it starts
+WEB_WORKERS = resolve_workers(settings.web_workers)
+
+_started_at = time.time()
+_stats = {
+    "requests": 0,
+    "inflight": 0,
+}
+
+
+def request_started():
+    _stats["requests"] += 1
+    _stats["inflight"] += 1
+
+
+def request_finished():
+    _stats["inflight"] -= 1
+
+
+def get_status() -> dict:
+    """Identity and load of the worker process that serves this request"""
+    return {
+        "pid": os.getpid(),
+        "workers": WEB_WORKERS,
+        "started_at": datetime.fromtimestamp(_started_at).isoformat(),
+        "uptime_seconds": round(time.time() - _started_at, 1),
+        **_stats,
+    }
+
+
+def _after_fork():
+    # A pre-forking server imported the app in the parent, start counting afresh
+    global _started_at
+    _started_at = time.time()
+    _stats["requests"] = 0
+    _stats["inflight"] = 0
+
+
+os.register_at_fork(after_in_child=_after_fork)
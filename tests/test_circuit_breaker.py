@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from src.exceptions import UpstreamUnavailableError
+from src.services import circuit_breaker
+from src.services.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+from src.services.concurrency_limiter import AIMDLimiter
+
+
+def test_breaker_opens_on_errors_and_closes_after_probes(monkeypatch):
+    """Test the closed -> open -> half-open -> closed cycle"""
+    monkeypatch.setattr(circuit_breaker, "BREAKER_MIN_CALLS", 4)
+    monkeypatch.setattr(circuit_breaker, "BREAKER_HALF_OPEN_CALLS", 2)
+    breaker = CircuitBreaker("test", redis_key="breaker:test")
+
+    async def run():
+        for failed in [False, True, True, True]:
+            await breaker.allow()
+            await breaker.record(0.1, failed)
+        assert breaker.state == OPEN
+        with pytest.raises(UpstreamUnavailableError) as exc:
+            await breaker.allow()
+        assert exc.value.retry_after > 0
+
+        # Open period over: only BREAKER_HALF_OPEN_CALLS probes get through
+        breaker._open_until = 0
+        await breaker.allow()
+        await breaker.allow()
+        assert breaker.state == HALF_OPEN
+        with pytest.raises(UpstreamUnavailableError):
+            await breaker.allow()
+        await breaker.record(0.1, False)
+        await breaker.record(0.1, False)
+        assert breaker.state == CLOSED
+
+    asyncio.run(run())
+
+
+def test_breaker_opens_on_slow_calls(monkeypatch):
+    """Test that a provider answering too slowly trips the breaker without errors"""
+    monkeypatch.setattr(circuit_breaker, "BREAKER_MIN_CALLS", 4)
+    breaker = CircuitBreaker("test", redis_key="breaker:test")
+
+    async def run():
+        for _ in range(4):
+            await breaker.record(circuit_breaker.BREAKER_SLOW_CALL_DURATION + 1, False)
+
+    asyncio.run(run())
+
+    assert breaker.state == OPEN
+
+
+def test_limiter_sheds_over_the_limit_and_adapts():
+    """Test that calls over the limit fail fast and the limit follows call outcomes"""
+    limiter = AIMDLimiter(initial=2, minimum=1, maximum=10)
+
+    limiter.acquire()
+    limiter.acquire()
+    with pytest.raises(UpstreamUnavailableError):
+        limiter.acquire()
+    assert limiter.shed == 1
+
+    limiter.release(0.05, True)
+    assert limiter.limit < 2
+    limiter.release(0.05, False)
+    assert limiter.inflight == 0
+
+    for _ in range(20):
+        limiter.acquire()
+        limiter.release(0.05, False)
+    assert limiter.limit > 2
@@ -0,0 +1,62 @@
+import asyncio
+
+from src.services import city_aliases
+from src.services.city_aliases import normalize_city, _suffix_matches
+from src.services.local_cache import LRUCache
+
+
+def test_normalize_folds_case_accents_and_spacing():
+    """Test that spelling variants normalize to the same string"""
+    assert normalize_city("New York") == "new york"
+    assert normalize_city("  new   YORK ") == "new york"
+    assert normalize_city("São Paulo") == "sao paulo"
+    assert normalize_city("St. Louis") == normalize_city("St Louis")
+    assert normalize_city("New York ,NY,") == "new york, ny"
+
+
+def test_suffix_must_agree_with_resolved_address():
+    """Test that a state/country suffix only reuses a canonical name that contains it"""
+    assert _suffix_matches("new york, ny", "new york, ny, united states")
+    assert not _suffix_matches("paris, tx", "paris, ile-de-france, france")
+
+
+class FakeRedis:
+    def __init__(self, values):
+        self.values = values
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+
+def test_single_and_batch_lookups_resolve_suffixes_alike(monkeypatch):
+    """Test that /weather and /weather/batch map a 'City, Suffix' query to the same cache key"""
+    redis = FakeRedis({city_aliases._alias_key("new york"): "new york, ny, united states"})
+
+    async def get_redis():
+        return redis
+
+    monkeypatch.setattr(city_aliases, "get_redis", get_redis)
+    monkeypatch.setattr(city_aliases, "_local_aliases", LRUCache(max_entries=100, ttl=60))
+
+    single = asyncio.run(city_aliases.resolve("New York, NY"))
+    monkeypatch.setattr(city_aliases, "_local_aliases", LRUCache(max_entries=100, ttl=60))
+    batch = asyncio.run(city_aliases.resolve_many(["New York, NY", "Paris, TX"]))
+
+    assert single == batch["New York, NY"] == ("new york, ny, united states", True)
+    assert batch["Paris, TX"] == ("paris, tx", False)
+
+
+def test_aliases_are_written_with_a_ttl():
+    """Test that every alias gets its own key that expires"""
+    calls = []
+
+    class Pipe:
+        def set(self, key, value, ex=None):
+            calls.append((key, value, ex))
+
+    city_aliases.queue_writes(Pipe(), {"nueva york": "new york, ny, united states"})
+
+    assert calls == [("weather:alias:nueva york", "new york, ny, united states", city_aliases.ALIAS_TTL)]
@@ -0,0 +1,101 @@
+import time
+import sqlite3
+import asyncio
+
+import pytest
+
+from src.services import disk_cache as disk_cache_module, weather_cache
+from src.services.disk_cache import SQLiteCache
+from src.services.weather_cache import CacheEntry
+
+
+@pytest.fixture
+def make_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(disk_cache_module, "DISK_CACHE_PATH", str(tmp_path / "cache" / "weather.db"))
+    caches = []
+
+    def make():
+        cache = SQLiteCache()
+        caches.append(cache)
+        return cache
+
+    yield make
+    for cache in caches:
+        cache.close()
+
+
+def test_values_survive_a_restart(make_cache):
+    """Test that a new instance on the same file reads what the previous one wrote"""
+    async def write():
+        cache = make_cache()
+        await cache.set("weather:london", b"cloudy", ttl=60)
+        await cache.set_many({"weather:paris": b"sunny", "weather:rome": b"hot"}, ttl=60)
+        cache.close()
+
+    async def read():
+        cache = make_cache()
+        return await cache.get("weather:london"), await cache.mget(["weather:rome", "weather:oslo", "weather:paris"])
+
+    asyncio.run(write())
+    london, many = asyncio.run(read())
+
+    assert london == b"cloudy"
+    assert many == [b"hot", None, b"sunny"]
+
+
+def test_expired_entries_are_hidden_and_compacted(make_cache, monkeypatch):
+    """Test TTL expiry on read, and that compaction deletes expired and excess entries"""
+    monkeypatch.setattr(disk_cache_module, "DISK_CACHE_MAX_ENTRIES", 2)
+    cache = make_cache()
+
+    async def run():
+        await cache.set("weather:expired", b"old", ttl=-1)
+        await cache.set_many({f"weather:city{i}": b"data" for i in range(3)}, ttl=60)
+        expired = await cache.get("weather:expired")
+        deleted = await cache._write(cache.compact_once)
+        # Claimed by the compaction that just ran
+        skipped = await cache._write(cache.compact_once)
+        return expired, deleted, skipped
+
+    expired, deleted, skipped = asyncio.run(run())
+
+    assert expired is None
+    assert (deleted, skipped) == (2, 0)
+    count = asyncio.run(cache._read_conn()).execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+    assert count == 2
+
+
+def test_weather_cache_reads_through_the_disk_tier(make_cache, monkeypatch):
+    """Test that with CACHE_BACKEND=sqlite an entry outlives the L1 cache without Redis"""
+    monkeypatch.setattr(weather_cache, "USE_REDIS", False)
+    monkeypatch.setattr(weather_cache, "USE_DISK", True)
+    monkeypatch.setattr(weather_cache, "disk_cache", make_cache())
+    entry = CacheEntry(data={"city": "Disktown"}, fetched_at=time.time())
+
+    async def run():
+        await weather_cache.write_entry("weather:disktown", entry)
+        await weather_cache.write_entries({"weather:disk:2026-01-17": entry})
+        weather_cache.l1_cache.clear()
+        single = await weather_cache.read_entry("weather:disktown")
+        batch = await weather_cache.read_entries(["weather:disk:2026-01-17", "weather:nowhere"])
+        return single, batch
+
+    single, batch = asyncio.run(run())
+
+    assert single == entry
+    assert batch == {"weather:disk:2026-01-17": entry, "weather:nowhere": None}
+
+
+def test_reads_do_not_wait_for_another_workers_write_lock(make_cache):
+    """Test that a worker's first read succeeds while another worker holds the write lock"""
+    async def write():
+        await make_cache().set("weather:london", b"cloudy", ttl=60)
+
+    asyncio.run(write())
+    other_worker = sqlite3.connect(disk_cache_module.DISK_CACHE_PATH, isolation_level=None)
+    other_worker.execute("BEGIN IMMEDIATE")
+    try:
+        assert asyncio.run(make_cache().get("weather:london")) == b"cloudy"
+    finally:
+        other_worker.rollback()
+        other_worker.close()
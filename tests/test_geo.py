@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from src.exceptions import WeatherProviderError
+from src.services import geo, weather_geo, providers
+from src.services.geo import CellIndex
+from src.services.weather_cache import HIT, MISS
+
+
+class CountingProvider(providers.Provider):
+    name = "counting"
+
+    def __init__(self):
+        super().__init__("test-key", "http://provider.test/")
+        self.locations = []
+        self.down = False
+
+    async def current(self, city):
+        self.locations.append(city)
+        if self.down:
+            raise WeatherProviderError("Weather api error with status code: 500")
+        return {"version": "v1", "city": city, "date": "2026-01-17", "timezone": "Europe/London"}
+
+    async def days(self, city, start, end):
+        raise NotImplementedError
+
+
+@pytest.fixture
+def cells(monkeypatch):
+    store = {}
+
+    async def read_entry(cache_key):
+        return store.get(cache_key)
+
+    async def write_entry(cache_key, entry):
+        store[cache_key] = entry
+
+    provider = CountingProvider()
+    monkeypatch.setattr(providers, "PROVIDERS", [provider])
+    monkeypatch.setattr(weather_geo, "read_entry", read_entry)
+    monkeypatch.setattr(weather_geo, "write_entry", write_entry)
+    monkeypatch.setattr(weather_geo, "cell_index", CellIndex(max_cells=100))
+    return provider
+
+
+def test_geohash_round_trip():
+    """Test the reference geohash and that a cell's center encodes back to the cell"""
+    assert geo.encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    lat, lon = geo.decode("u4pru")
+    assert geo.encode(lat, lon, 5) == "u4pru"
+    assert abs(lat - 57.64911) < 0.05 and abs(lon - 10.40744) < 0.05
+
+
+def test_nearest_cell_within_radius():
+    """Test that the index returns the closest cell in range, across the antimeridian too"""
+    index = CellIndex(max_cells=10)
+    for lat, lon in [(51.50, -0.12), (51.60, -0.12), (48.85, 2.35), (0.0, 179.99)]:
+        index.add(geo.encode(lat, lon, 5))
+
+    cell, distance = index.nearest(51.52, -0.12, radius_km=25)
+    assert cell == geo.encode(51.50, -0.12, 5)
+    assert distance < 5
+    assert index.nearest(51.52, -0.12, radius_km=25, exclude=cell)[0] == geo.encode(51.60, -0.12, 5)
+    assert index.nearest(45.0, 0.0, radius_km=25) is None
+    assert index.nearest(0.0, -179.99, radius_km=25)[0] == geo.encode(0.0, 179.99, 5)
+
+
+def test_nearby_coordinates_share_one_cell(cells):
+    """Test that two users a few hundred metres apart cost one upstream call"""
+    lat, lon = geo.decode("gcpvj")
+
+    async def run():
+        first = await weather_geo.fetch_weather_at(lat + 0.001, lon - 0.001)
+        second = await weather_geo.fetch_weather_at(lat - 0.002, lon + 0.002)
+        return first, second
+
+    (_, first_status, first_cell, _), (_, second_status, second_cell, _) = asyncio.run(run())
+
+    assert (first_status, second_status) == (MISS, HIT)
+    assert first_cell == second_cell == "gcpvj"
+    assert cells.locations == [f"{lat:.4f},{lon:.4f}"]
+
+
+def test_neighbor_cell_is_served_while_the_provider_fails(cells):
+    """Test that a cached cell nearby answers a miss during an outage"""
+    lat, lon = geo.decode("gcpvj")
+
+    async def run():
+        await weather_geo.fetch_weather_at(lat, lon)
+        cells.down = True
+        nearby = await weather_geo.fetch_weather_at(lat + 0.1, lon)
+        with pytest.raises(WeatherProviderError):
+            # Too far from any cached cell
+            await weather_geo.fetch_weather_at(lat + 1.0, lon)
+        return nearby
+
+    entry, status, cell, distance = asyncio.run(run())
+
+    assert status == weather_geo.NEARBY
+    assert cell == "gcpvj"
+    assert 5 < distance < weather_geo.GEO_FALLBACK_RADIUS_KM
+    assert entry.data["city"] == f"{lat:.4f},{lon:.4f}"
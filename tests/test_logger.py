@@ -0,0 +1,39 @@
+import json
+import queue
+import logging
+
+from src.logger import JsonFormatter, OverflowQueueHandler, RequestContextFilter, request_id_var
+
+
+def _record(**extra):
+    record = logging.LogRecord("src.main", logging.INFO, __file__, 1, "Request: %s", ("GET /weather",), None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def test_json_formatter_includes_request_fields():
+    """Test that structured fields end up as top-level JSON keys"""
+    token = request_id_var.set("abc123")
+    try:
+        record = _record(city="London", cache_status="HIT", duration=0.0021)
+        RequestContextFilter().filter(record)
+        entry = json.loads(JsonFormatter().format(record))
+    finally:
+        request_id_var.reset(token)
+
+    assert entry["message"] == "Request: GET /weather"
+    assert entry["request_id"] == "abc123"
+    assert entry["city"] == "London"
+    assert entry["cache_status"] == "HIT"
+    assert "status" not in entry
+
+
+def test_queue_handler_drops_when_full():
+    """Test that the drop overflow mode never blocks the caller"""
+    handler = OverflowQueueHandler(queue.Queue(maxsize=1), block=False)
+    handler.handle(_record())
+    handler.handle(_record())
+
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 1
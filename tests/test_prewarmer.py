@@ -0,0 +1,54 @@
+import time
+import asyncio
+
+from src.services import prewarmer
+from src.services.weather_cache import CacheEntry, CACHE_TTL
+
+
+class _HotKeys:
+    """Stand-in for the Redis sorted set of request counts"""
+
+    def __init__(self, keys):
+        self.keys = keys
+
+    async def zrevrange(self, name, start, end):
+        return self.keys[start:end + 1]
+
+
+def test_warm_once_refreshes_due_keys_within_budget(monkeypatch):
+    """Test that only keys close to expiry are refreshed, hottest first, until the budget runs out"""
+    now = time.time()
+    entries = {
+        "weather:london": CacheEntry(data={}, fetched_at=now - CACHE_TTL + 1),
+        "weather:paris": CacheEntry(data={}, fetched_at=now),
+        "weather:rome": None,
+        "weather:oslo": CacheEntry(data={}, fetched_at=now - CACHE_TTL - 1),
+    }
+    warmed = []
+
+    async def read_entries(cache_keys):
+        return {key: entries[key] for key in cache_keys}
+
+    async def warm(cache_key):
+        warmed.append(cache_key)
+
+    monkeypatch.setattr(prewarmer, "read_entries", read_entries)
+    monkeypatch.setattr(prewarmer, "_budget", {"tokens": 2.0, "updated": time.monotonic()})
+    before = prewarmer.get_stats()
+
+    asyncio.run(prewarmer.warm_once(_HotKeys(list(entries)), warm))
+
+    assert warmed == ["weather:london", "weather:rome"]
+    assert prewarmer.get_stats()["budget_exhausted"] - before["budget_exhausted"] == 1
+
+
+def test_prevented_miss_is_counted_once_per_warmed_entry():
+    """Test that hits on a warmed entry past the lead time are credited once"""
+    entry = CacheEntry(data={}, fetched_at=time.time() - prewarmer.PREWARM_LEAD_TIME - 1, warmed=True)
+    before = prewarmer.get_stats()["misses_prevented"]
+
+    prewarmer.note_hit("weather:berlin", entry)
+    prewarmer.note_hit("weather:berlin", entry)
+    prewarmer.note_hit("weather:madrid", CacheEntry(data={}, fetched_at=entry.fetched_at))
+
+    assert prewarmer.get_stats()["misses_prevented"] - before == 1
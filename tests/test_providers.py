@@ -0,0 +1,188 @@
+import asyncio
+
+from datetime import date, timedelta
+
+import httpx
+import pytest
+
+from benchmarks.stub_provider import build_app
+from src.exceptions import WeatherProviderError, WetaherNotFoundError
+from src.services import hedging, providers
+
+
+class FakeProvider(providers.Provider):
+    """Answers after a fixed delay, or fails"""
+
+    def __init__(self, name, delay=0.0, error=None):
+        super().__init__("test-key", "http://provider.test/")
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.cancelled = 0
+
+    async def current(self, city):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error:
+            raise self.error
+        return {"city": city, "provider": self.name}
+
+    async def days(self, city, start, end):
+        raise NotImplementedError
+
+
+@pytest.fixture
+def fresh_hedging(monkeypatch):
+    monkeypatch.setattr(hedging, "_providers", {})
+    monkeypatch.setattr(hedging, "_stats", dict.fromkeys(hedging._stats, 0))
+    monkeypatch.setattr(hedging, "_budget", {"tokens": hedging.HEDGE_BUDGET_CAP})
+    monkeypatch.setattr(hedging, "HEDGE_INITIAL_DELAY", 0.02)
+
+
+def _use(monkeypatch, *configured):
+    monkeypatch.setattr(providers, "PROVIDERS", list(configured))
+
+
+def _stub_client(monkeypatch, **options):
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=build_app(**options)))
+
+    async def get_http_client():
+        return client
+
+    monkeypatch.setattr(providers, "get_http_client", get_http_client)
+
+
+def test_adapters_map_both_providers_to_the_same_shape(monkeypatch):
+    """Test that Visual Crossing and WeatherAPI answers become the same WeatherResponse fields"""
+    _stub_client(monkeypatch)
+
+    async def run():
+        visualcrossing = await providers.VisualCrossing("key", "http://stub/").current("london")
+        weatherapi = await providers.WeatherAPI("key", "http://stub/v1/").current("london")
+        return visualcrossing, weatherapi
+
+    visualcrossing, weatherapi = asyncio.run(run())
+
+    assert set(weatherapi) == set(visualcrossing)
+    for field in ("timezone", "temp_avg_c", "temp_max_c", "temp_min_c", "precip_mm"):
+        assert weatherapi[field] == visualcrossing[field]
+    # Times are normalised to HH:MM:SS, to the minute
+    assert weatherapi["sunrise"] == visualcrossing["sunrise"][:5] + ":00"
+    assert weatherapi["city"] == "London, United Kingdom"
+
+
+def test_projected_answer_maps_like_the_full_one(monkeypatch):
+    """Test that asking Visual Crossing for only the mapped elements changes nothing in the result"""
+    _stub_client(monkeypatch)
+    provider = providers.VisualCrossing("key", "http://stub/")
+
+    async def run():
+        projected = await provider.current("london"), await provider.days("london", date(2026, 1, 1), date(2026, 1, 3))
+        monkeypatch.setattr(providers, "WEATHER_PROJECTION_ENABLED", False)
+        full = await provider.current("london"), await provider.days("london", date(2026, 1, 1), date(2026, 1, 3))
+        return projected, full
+
+    projected, full = asyncio.run(run())
+
+    assert projected == full
+    assert projected[0]["sunrise"] is not None and len(projected[1]["days"]) == 3
+
+
+def test_weatherapi_unknown_city_is_not_found(monkeypatch):
+    """Test that WeatherAPI's 'no matching location' 400 is treated as a 404"""
+    _stub_client(monkeypatch, not_found_rate=1.0)
+
+    with pytest.raises(WetaherNotFoundError):
+        asyncio.run(providers.WeatherAPI("key", "http://stub/v1/").current("atlantis"))
+
+
+def _mock_client(monkeypatch, handler):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def get_http_client():
+        return client
+
+    monkeypatch.setattr(providers, "get_http_client", get_http_client)
+
+
+def test_invalid_body_is_a_provider_error(monkeypatch):
+    """Test that a 200 with a body that is not JSON fails like any other provider error"""
+    _mock_client(monkeypatch, lambda request: httpx.Response(200, text="<html>Bad gateway</html>"))
+
+    with pytest.raises(WeatherProviderError):
+        asyncio.run(providers.WeatherAPI("key", "http://stub/v1/").current("london"))
+
+
+def test_weatherapi_range_cancels_the_other_call_on_failure(monkeypatch):
+    """Test that a failed history call cancels the forecast call instead of waiting for it"""
+    cancelled = []
+
+    async def handler(request):
+        if request.url.path.endswith("history.json"):
+            return httpx.Response(500)
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(request.url.path)
+            raise
+        return httpx.Response(200, json={})
+
+    _mock_client(monkeypatch, handler)
+    today = date.today()
+
+    async def run():
+        provider = providers.WeatherAPI("key", "http://stub/v1/")
+        with pytest.raises(WeatherProviderError):
+            await asyncio.wait_for(provider.days("london", date(2020, 1, 1), today + timedelta(days=1)), 1)
+
+    asyncio.run(run())
+
+    assert cancelled == ["/v1/forecast.json"]
+
+
+def test_slow_primary_is_hedged_and_the_loser_cancelled(monkeypatch, fresh_hedging):
+    """Test that a second provider is asked once the primary is late, and the first answer wins"""
+    primary, secondary = FakeProvider("primary", delay=1.0), FakeProvider("secondary", delay=0.01)
+    _use(monkeypatch, primary, secondary)
+
+    result = asyncio.run(hedging.call(lambda provider: provider.current("Oslo")))
+
+    assert result["provider"] == "secondary"
+    assert primary.cancelled == 1
+    stats = hedging.get_stats()
+    assert stats["hedging"]["hedged"] == stats["hedging"]["hedge_wins"] == 1
+    assert stats["provider_secondary"]["win_rate"] == 1.0
+    assert stats["provider_primary"]["cancelled"] == 1
+
+
+def test_failed_primary_falls_back_without_waiting(monkeypatch, fresh_hedging):
+    """Test that a provider error moves on to the next provider, and a not found does not"""
+    _use(monkeypatch, FakeProvider("primary", error=WeatherProviderError("boom")), FakeProvider("secondary"))
+
+    result = asyncio.run(hedging.call(lambda provider: provider.current("Oslo")))
+
+    assert result["provider"] == "secondary"
+    assert hedging.get_stats()["hedging"]["failovers"] == 1
+
+    _use(monkeypatch, FakeProvider("primary", error=WetaherNotFoundError("Atlantis not found")), FakeProvider("secondary"))
+    with pytest.raises(WetaherNotFoundError):
+        asyncio.run(hedging.call(lambda provider: provider.current("Atlantis")))
+
+
+def test_hedges_stop_when_the_budget_is_spent(monkeypatch, fresh_hedging):
+    """Test that a provider slow for everyone is not hit with a hedge per call"""
+    monkeypatch.setattr(hedging, "_budget", {"tokens": 1.0})
+    monkeypatch.setattr(hedging, "HEDGE_BUDGET", 0.0)
+    _use(monkeypatch, FakeProvider("primary", delay=0.05))
+
+    async def run():
+        return [await hedging.call(lambda provider: provider.current("Oslo")) for _ in range(3)]
+
+    asyncio.run(run())
+
+    stats = hedging.get_stats()["hedging"]
+    assert stats["hedged"] == 1
+    assert stats["budget_exhausted"] == 2
@@ -0,0 +1,118 @@
+import os
+import asyncio
+
+import pytest
+
+from fastapi import HTTPException
+from starlette.requests import Request
+from starlette.responses import Response
+
+from src import rate_limiter, worker
+from src.rate_limiter import RateLimitRule
+
+
+def _request(path="/weather", client="10.0.0.1", headers=None):
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "client": (client, 1234),
+        "query_string": b"",
+    }
+    return Request(scope)
+
+
+def test_falls_back_to_local_limiter_without_redis():
+    """Test that limits still apply per worker when Redis is not available"""
+    request = _request(client="10.0.0.2")
+
+    async def run():
+        results = [await rate_limiter.check(request) for _ in range(6)]
+        return [r.allowed for r in results]
+
+    assert asyncio.run(run()) == [True] * 5 + [False]
+
+
+def test_fallback_is_logged_once_per_outage(monkeypatch, caplog):
+    """Test that switching to and from the local limiter is logged, not every request in between"""
+    monkeypatch.setattr(rate_limiter, "_in_fallback", False)
+    request = _request(client="10.0.0.10")
+
+    async def redis_check(key, rule, cost):
+        raise ConnectionError("Redis is down")
+
+    async def redis_back(key, rule, cost):
+        return rate_limiter.RateLimitResult(True, rule.limit, rule.window, rule.limit - cost, rule.window, 0)
+
+    async def run():
+        for _ in range(3):
+            await rate_limiter.check(request)
+
+    monkeypatch.setattr(rate_limiter, "_redis_check", redis_check)
+    with caplog.at_level("INFO", logger="src.rate_limiter"):
+        asyncio.run(run())
+        monkeypatch.setattr(rate_limiter, "_redis_check", redis_back)
+        asyncio.run(run())
+
+    assert [record.getMessage() for record in caplog.records] == [
+        "Rate limiting fell back to in-memory limiter: Redis is down",
+        "Rate limiting is back on Redis",
+    ]
+
+
+def test_local_fallback_splits_the_limit_across_workers(monkeypatch):
+    """Test that each of several workers allows its share of the limit while Redis is down"""
+    monkeypatch.setattr(rate_limiter, "WEB_WORKERS", 2)
+    request = _request(client="10.0.0.9")
+
+    async def run():
+        results = [await rate_limiter.check(request) for _ in range(4)]
+        return [r.allowed for r in results]
+
+    assert asyncio.run(run()) == [True] * 3 + [False]
+
+
+def test_local_fallback_with_one_worker_per_cpu(monkeypatch):
+    """Test that WEB_WORKERS=0 resolves to the CPU count, so the fallback still divides the limit"""
+    monkeypatch.setattr(os, "cpu_count", lambda: 2)
+    monkeypatch.setattr(rate_limiter, "WEB_WORKERS", worker.resolve_workers(0))
+    request = _request(client="10.0.0.11")
+
+    async def run():
+        results = [await rate_limiter.check(request) for _ in range(4)]
+        return [r.allowed for r in results]
+
+    assert asyncio.run(run()) == [True] * 3 + [False]
+
+
+def test_rejection_sets_retry_after_and_ratelimit_headers():
+    """Test that a 429 carries Retry-After and RateLimit-* headers"""
+    request = _request(client="10.0.0.3")
+
+    async def run():
+        response = Response()
+        for _ in range(5):
+            await rate_limiter.enforce(request, response)
+        assert response.headers["RateLimit-Remaining"] == "0"
+        await rate_limiter.enforce(request, response)
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(run())
+
+    assert exc.value.status_code == 429
+    assert int(exc.value.headers["Retry-After"]) >= 1
+    assert exc.value.headers["RateLimit-Limit"] == "5"
+
+
+def test_api_key_rules(monkeypatch):
+    """Test that a configured API key gets its own limit and identity"""
+    monkeypatch.setattr(rate_limiter, "_api_key_rules", {"secret": RateLimitRule(100, 60)})
+
+    rule, key = rate_limiter.resolve_rule(_request(headers={"X-API-Key": "secret"}))
+    anon_rule, anon_key = rate_limiter.resolve_rule(_request())
+
+    assert rule.limit == 100
+    assert "secret" not in key
+    assert anon_rule.limit == 5
+    assert anon_key.endswith("10.0.0.1")
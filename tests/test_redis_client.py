@@ -0,0 +1,102 @@
+import time
+import asyncio
+
+import pytest
+
+from redis.exceptions import ConnectionError
+
+from src import redis_client
+from src.redis_client import RedisUnavailableError
+
+
+def test_circuit_skips_redis_after_repeated_failures(monkeypatch):
+    """Test that a dead Redis is skipped for the cooldown, then probed by a single caller"""
+    monkeypatch.setattr(redis_client, "REDIS_URL", "redis://127.0.0.1:1")
+    monkeypatch.setattr(redis_client, "REDIS_CIRCUIT_FAILURES", 2)
+    monkeypatch.setattr(redis_client, "REDIS_RETRY_ATTEMPTS", 0)
+
+    async def run():
+        await redis_client.initialize_redis()
+        try:
+            for _ in range(2):
+                redis = await redis_client.get_redis()
+                with pytest.raises(ConnectionError):
+                    await redis.get("key")
+            assert redis_client.circuit.is_open
+            start = time.perf_counter()
+            with pytest.raises(RedisUnavailableError):
+                await redis_client.get_redis()
+            assert time.perf_counter() - start < 0.01
+
+            # Cooldown over: one probe gets the client, the others keep skipping
+            redis_client.circuit.open_until = 0
+            await redis_client.get_redis()
+            with pytest.raises(RedisUnavailableError):
+                await redis_client.get_binary_redis()
+            redis_client.circuit.record_success()
+            assert not redis_client.circuit.is_open
+            await redis_client.get_binary_redis()
+        finally:
+            await redis_client.close_redis()
+            redis_client.circuit.reset()
+
+    asyncio.run(run())
+
+
+def test_sentinel_url():
+    """Test that a Sentinel URL lists every sentinel and targets the service's master"""
+    client = redis_client.create_client("redis+sentinel://:secret@sentinel-a:26379,sentinel-b/mymaster/2", decode_responses=True)
+    pool = client.connection_pool
+    assert pool.service_name == "mymaster"
+    assert pool.connection_kwargs["db"] == 2
+    assert pool.connection_kwargs["password"] == "secret"
+    hosts = [sentinel.connection_pool.connection_kwargs["host"] for sentinel in pool.sentinel_manager.sentinels]
+    assert hosts == ["sentinel-a", "sentinel-b"]
+
+
+class _Pipeline:
+    def __init__(self, store: dict):
+        self.store = store
+        self.queued = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __len__(self):
+        return len(self.queued)
+
+    def set(self, key, value):
+        self.queued.append((key, value))
+
+    async def execute(self):
+        self.store.update(self.queued)
+        self.queued.clear()
+
+
+class _Redis:
+    def __init__(self):
+        self.store = {}
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        assert not transaction
+        self.round_trips += 1
+        return _Pipeline(self.store)
+
+
+def test_pipeline_sends_queued_commands(monkeypatch):
+    """Test that the pipeline helper executes everything queued in one round trip when the block exits"""
+    redis = _Redis()
+    monkeypatch.setattr(redis_client, "redis_client", redis)
+
+    async def run():
+        async with redis_client.pipeline() as pipe:
+            pipe.set("a", "1")
+            pipe.set("b", "2")
+
+    asyncio.run(run())
+    assert redis.store == {"a": "1", "b": "2"}
+    assert redis.round_trips == 1
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from src.services import singleflight
+
+
+def test_concurrent_calls_share_one_fetch():
+    """Test that concurrent callers for the same key trigger a single call"""
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"city": "London"}
+
+    async def run():
+        before = singleflight.get_stats()["coalesced"]
+        results = await asyncio.gather(*[singleflight.do("weather:london", fetch) for _ in range(10)])
+        return results, singleflight.get_stats()["coalesced"] - before
+
+    results, coalesced = asyncio.run(run())
+
+    assert calls == 1
+    assert coalesced == 9
+    assert all(r == {"city": "London"} for r in results)
+    assert singleflight.get_stats()["inflight"] == 0
+
+
+def test_errors_are_shared_with_followers():
+    """Test that a failing fetch raises for every waiting caller"""
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def run():
+        return await asyncio.gather(*[singleflight.do("weather:paris", fetch) for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_fetch_is_cancelled_when_all_callers_leave():
+    """Test that the shared call stops once nobody is waiting for it"""
+    cancelled = False
+
+    async def fetch():
+        nonlocal cancelled
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+
+    async def run():
+        callers = [asyncio.create_task(singleflight.do("weather:rome", fetch)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        callers[0].cancel()
+        await asyncio.sleep(0.01)
+        assert not cancelled
+        callers[1].cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+
+    assert cancelled
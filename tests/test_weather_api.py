@@ -1,8 +1,13 @@
+import json
+import time
 import pytest
 
 from fastapi.testclient import TestClient
 
 from src.main import app
+from src import http_cache, compression
+from src.services import weather_cache, providers
+from src.services.weather_cache import CacheEntry
 
 client = TestClient(app)
 
@@ -46,6 +51,44 @@ def test_weather_no_query():
     assert response.status_code == 422
     print("Test passed")
 
+def test_weather_coordinates_need_lat_and_lon_without_city():
+    """Test that a coordinate lookup needs both lat and lon, and no city"""
+    # Own client address so the in-memory rate limit of the other tests does not apply
+    headers = {"X-Forwarded-For": "203.0.113.22"}
+    assert client.get("/weather?lat=51.5", headers=headers).status_code == 422
+    assert client.get("/weather?lat=91&lon=0", headers=headers).status_code == 422
+
+    response = client.get("/weather?city=London&lat=51.5&lon=-0.12", headers=headers)
+
+    assert response.status_code == 400
+    assert "either city or lat and lon" in response.json()["detail"]
+
+def test_weather_batch_reports_status_per_city():
+    """Test that invalid cities in a batch fail individually"""
+    response = client.post("/weather/batch", json={"cities": ["1234", "   "]})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == [400, 400]
+    assert results[0]["city"] == "1234"
+    print("Test passed")
+
+
+def test_weather_batch_size_limit():
+    """Test that oversized batches are rejected"""
+    response = client.post("/weather/batch", json={"cities": ["London"] * 1000})
+
+    assert response.status_code == 400
+    print("Test passed")
+
+
+def test_weather_batch_empty():
+    """Test that an empty batch returns validation error"""
+    response = client.post("/weather/batch", json={"cities": []})
+
+    assert response.status_code == 422
+    print("Test passed")
+
 # def test_weather_rate_limiting():
 #     """Test that rate limiting works when Redis is up"""
 
@@ -82,5 +125,164 @@ def test_health_check():
     
     # Service name should be correct
     assert data["service"] == "weather-api"
+
+    # The answering worker identifies itself
+    assert data["worker"]["pid"] > 0
+    assert data["worker"]["requests"] >= 1
     
-    print("✅ Health check test passed")
\ No newline at end of file
+    print("✅ Health check test passed")
+
+def test_ready_is_503_until_connections_are_warm():
+    """Without the lifespan nothing is warmed up, so the worker must not get traffic yet"""
+    response = client.get("/ready")
+
+    assert response.status_code == 503
+    data = response.json()
+    assert data["status"] == "starting"
+    assert set(data["checks"]) == {"redis", "upstream"}
+    assert data["startup_ms"]["imports"] > 0
+
+def test_weather_stream_ndjson():
+    """Test that the stream emits one NDJSON line per city"""
+    response = client.post("/weather/stream?format=ndjson", json={"cities": ["1234", "5678"]})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["index"] for line in lines] == [0, 1]
+    assert all(line["status"] == 400 for line in lines)
+    print("Test passed")
+
+
+def test_weather_stream_sse():
+    """Test that the stream uses Server-Sent Events when asked for"""
+    response = client.post("/weather/stream", json={"cities": ["1234"]}, headers={"Accept": "text/event-stream"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.startswith("event: weather\ndata: ")
+    print("Test passed")
+
+
+def test_metrics_endpoint():
+    """Test that Prometheus metrics are exposed with route labels"""
+    client.get("/health")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert "weather_api_request_duration_seconds" in response.text
+    assert 'route="/health"' in response.text
+    assert "weather_api_cache_lookups_total" in response.text
+    print("Test passed")
+
+
+def test_weather_cache_hit_has_etag_and_honours_if_none_match(monkeypatch):
+    """Test that a cached city is served with an ETag and revalidates to a 304"""
+    monkeypatch.setattr(providers, "PROVIDERS", [providers.VisualCrossing("test-key", "http://provider.test/")])
+    data = {"version": "v1", "city": "Etagville, United Kingdom", "date": "2026-01-17", "timezone": "Europe/London", "temp_avg_c": 7.9}
+    weather_cache.l1_cache.set("weather:etagville", CacheEntry(data=data, fetched_at=time.time()))
+    # Own client address so the in-memory rate limit of the other tests does not apply
+    headers = {"X-Forwarded-For": "203.0.113.15"}
+
+    response = client.get("/weather?city=Etagville", headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["X-Cache"] == "HIT"
+    assert response.headers["content-type"] == "application/json"
+    assert response.json()["city"] == data["city"]
+    etag = response.headers["ETag"]
+
+    response = client.get("/weather?city=Etagville", headers={**headers, "If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+    print("Test passed")
+
+
+def test_history_rejects_inverted_range():
+    """Test that a history range ending before it starts is rejected"""
+    response = client.get("/weather/history?city=London&start=2026-01-10&end=2026-01-01")
+
+    assert response.status_code == 400
+    print("Test passed")
+
+
+def test_weather_hit_is_cacheable_by_a_cdn(monkeypatch):
+    """Test freshness headers and surrogate keys on a hit, and If-Modified-Since revalidation"""
+    monkeypatch.setattr(providers, "PROVIDERS", [providers.VisualCrossing("test-key", "http://provider.test/")])
+    data = {"version": "v1", "city": "Cdnville, United Kingdom", "date": "2026-01-17", "timezone": "Europe/London"}
+    weather_cache.l1_cache.set("weather:cdnville, united kingdom", CacheEntry(data=data, fetched_at=time.time() - 30))
+    weather_cache.l1_cache.set("weather:cdnville", CacheEntry(data=data, fetched_at=time.time() - 30))
+    headers = {"X-Forwarded-For": "203.0.113.16"}
+
+    response = client.get("/weather?city=Cdnville", headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"].startswith(f"public, max-age={weather_cache.CACHE_TTL}")
+    assert 30 <= int(response.headers["Age"]) <= 31
+    assert response.headers["Surrogate-Key"] == "weather city-cdnville-united-kingdom"
+
+    response = client.get("/weather?city=Cdnville", headers={**headers, "If-Modified-Since": response.headers["Last-Modified"]})
+
+    assert response.status_code == 304
+    assert "Expires" in response.headers
+
+
+def test_errors_and_health_are_not_stored():
+    """Test that error responses and per-worker endpoints carry Cache-Control: no-store"""
+    assert client.get("/weather?city=123", headers={"X-Forwarded-For": "203.0.113.17"}).headers["Cache-Control"] == "no-store"
+    assert client.get("/health").headers["Cache-Control"] == "no-store"
+
+
+def test_large_responses_are_compressed():
+    """Test gzip negotiation above the size threshold, and no compression for identity"""
+    response = client.get("/stats", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert "subsystems" in response.json()
+
+    response = client.get("/stats", headers={"Accept-Encoding": "identity"})
+
+    assert "Content-Encoding" not in response.headers
+    assert compression.choose_encoding("br;q=0, gzip;q=0.5, *;q=0.1") == "gzip"
+    assert compression.choose_encoding("gzip;q=0, deflate") is None
+
+
+def test_purge_needs_the_token_and_drops_the_city(monkeypatch, caplog):
+    """Test that POST /weather/purge is refused without PURGE_TOKEN, empties the cache with it, and is rate limited and logged"""
+    monkeypatch.setattr(http_cache, "PURGE_TOKEN", "secret")
+    data = {"version": "v1", "city": "Purgeville", "date": "2026-01-17", "timezone": "Europe/London"}
+    weather_cache.l1_cache.set("weather:purgeville", CacheEntry(data=data, fetched_at=time.time()))
+    headers = {"X-Forwarded-For": "203.0.113.18"}
+
+    with caplog.at_level("INFO", logger="src.main"):
+        assert client.post("/weather/purge?city=Purgeville", headers={**headers, "X-Purge-Token": "wrong"}).status_code == 403
+        response = client.post("/weather/purge?city=Purgeville", headers={**headers, "X-Purge-Token": "secret"})
+
+    assert response.status_code == 200
+    assert response.json() == {"surrogate_key": "city-purgeville", "cdn": "not configured"}
+    assert weather_cache.l1_cache.get("weather:purgeville") is None
+    assert "RateLimit-Remaining" in response.headers
+    messages = [record.getMessage() for record in caplog.records]
+    assert "Purge refused for 203.0.113.18: missing or wrong X-Purge-Token" in messages
+    assert "Purged city-purgeville for 203.0.113.18 (CDN: not configured)" in messages
+
+
+def test_304_carries_the_etag_of_the_compressed_200(monkeypatch):
+    """Test that revalidating a compressed response answers with the validator the 200 carried"""
+    monkeypatch.setattr(providers, "PROVIDERS", [providers.VisualCrossing("test-key", "http://provider.test/")])
+    monkeypatch.setattr(compression, "COMPRESSION_MIN_BYTES", 1)
+    data = {"version": "v1", "city": "Zipville", "date": "2026-01-17", "timezone": "Europe/London"}
+    weather_cache.l1_cache.set("weather:zipville", CacheEntry(data=data, fetched_at=time.time()))
+    headers = {"X-Forwarded-For": "203.0.113.19", "Accept-Encoding": "gzip"}
+
+    response = client.get("/weather?city=Zipville", headers=headers)
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    etag = response.headers["ETag"]
+    response = client.get("/weather?city=Zipville", headers={**headers, "If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
@@ -0,0 +1,296 @@
+import time
+import asyncio
+import contextlib
+
+import pytest
+
+from src.exceptions import WeatherProviderError, WetaherNotFoundError
+from src.services import weather_client, weather_cache, cache_fill, negative_cache, cache_codec, providers
+from src.services.bloom_filter import BloomFilter
+from src.services.local_cache import LRUCache
+from src.services.weather_cache import CacheEntry, CACHE_TTL, HIT, STALE, MISS
+
+LONDON = {"city": "London", "temp_avg_c": 7.9}
+
+
+@pytest.fixture
+def fake_cache(monkeypatch):
+    """In-memory stand-in for the Redis cache used by fetch_weather"""
+    store = {}
+
+    async def read_entry(cache_key):
+        return store.get(cache_key)
+
+    async def write_entry(cache_key, entry):
+        store[cache_key] = entry
+
+    monkeypatch.setattr(providers, "PROVIDERS", [providers.VisualCrossing("test-key", "http://provider.test/")])
+    monkeypatch.setattr(weather_client, "read_entry", read_entry)
+    monkeypatch.setattr(weather_client, "write_entry", write_entry)
+    return store
+
+
+def _provider(monkeypatch, result=None, error=None):
+    calls = []
+
+    async def fetch(city):
+        calls.append(city)
+        if error:
+            raise error
+        return result
+
+    monkeypatch.setattr(weather_client, "_fetch_from_provider", fetch)
+    return calls
+
+
+async def _fetch_and_settle(city):
+    result = await weather_client.fetch_weather_entry(city)
+    # Let background refreshes finish
+    await asyncio.gather(*cache_fill._background_tasks)
+    return result
+
+
+def test_miss_fetches_and_caches(fake_cache, monkeypatch):
+    """Test that a miss calls the provider and stores the entry"""
+    calls = _provider(monkeypatch, result=LONDON)
+
+    entry, status = asyncio.run(_fetch_and_settle("London"))
+
+    assert status == MISS
+    assert entry.data == LONDON
+    assert calls == ["London"]
+    assert "weather:london" in fake_cache
+
+
+def test_fresh_entry_is_served_without_upstream_call(fake_cache, monkeypatch):
+    """Test that an entry inside the soft TTL is a plain hit"""
+    calls = _provider(monkeypatch, result=LONDON)
+    fake_cache["weather:london"] = CacheEntry(data=LONDON, fetched_at=time.time())
+
+    entry, status = asyncio.run(_fetch_and_settle("London"))
+
+    assert status == HIT
+    assert calls == []
+
+
+def test_stale_entry_is_served_and_refreshed(fake_cache, monkeypatch):
+    """Test that an entry past the soft TTL is served and refreshed in the background"""
+    refreshed = {**LONDON, "temp_avg_c": 9.0}
+    calls = _provider(monkeypatch, result=refreshed)
+    fake_cache["weather:london"] = CacheEntry(data=LONDON, fetched_at=time.time() - CACHE_TTL - 1)
+
+    entry, status = asyncio.run(_fetch_and_settle("London"))
+
+    assert status == STALE
+    assert entry.data == LONDON
+    assert calls == ["London"]
+    assert fake_cache["weather:london"].data == refreshed
+
+
+def test_stale_entry_survives_provider_errors(fake_cache, monkeypatch):
+    """Test that a failing refresh keeps the stale entry instead of erroring"""
+    _provider(monkeypatch, error=WeatherProviderError("Weather api error with status code: 500"))
+    stale = CacheEntry(data=LONDON, fetched_at=time.time() - CACHE_TTL - 1)
+    fake_cache["weather:london"] = stale
+
+    entry, status = asyncio.run(_fetch_and_settle("London"))
+
+    assert status == STALE
+    assert entry.data == LONDON
+    assert fake_cache["weather:london"] is stale
+
+
+def test_l1_evicts_least_recently_used():
+    """Test that the L1 cache stays within its size bound"""
+    cache = LRUCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_l1_ttl_is_capped():
+    """Test that a per-entry TTL cannot exceed the cache TTL"""
+    cache = LRUCache(max_entries=10, ttl=0.01)
+    cache.set("a", 1, ttl=3600)
+    time.sleep(0.02)
+
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+@pytest.mark.parametrize("codec", [name for name, spec in cache_codec.CODECS.items() if spec[3]])
+@pytest.mark.parametrize("compression", [name for name, spec in cache_codec.COMPRESSIONS.items() if spec[3]])
+def test_codec_round_trip(codec, compression, monkeypatch):
+    """Test that every installed codec and compression decodes what it encoded"""
+    monkeypatch.setattr(cache_codec, "CACHE_COMPRESSION_MIN_BYTES", 0)
+    value = {"data": {**LONDON, "summary": "Cloudy " * 50}, "fetched_at": 1700000000.5}
+
+    raw = cache_codec.encode(value, codec, compression)
+
+    assert raw[0] == cache_codec.FORMAT_VERSION
+    assert cache_codec.decode(raw) == value
+
+
+def test_legacy_json_entries_still_decode():
+    """Test that entries written as JSON text before the binary codec are read back"""
+    legacy = '{"data": {"city": "London", "temp_avg_c": 7.9}, "fetched_at": 1700000000.5}'
+
+    entry = weather_cache.decode_entry(legacy.encode())
+
+    assert entry.data == LONDON
+    assert entry.fetched_at == 1700000000.5
+
+
+def test_l1_serves_hits_when_redis_is_down():
+    """Test that entries written while Redis is unavailable are still read back"""
+    entry = CacheEntry(data=LONDON, fetched_at=time.time())
+
+    async def run():
+        await weather_cache.write_entry("weather:l1-only", entry)
+        return await weather_cache.read_entry("weather:l1-only")
+
+    assert asyncio.run(run()) is entry
+
+
+def test_not_found_city_is_answered_from_tombstone(fake_cache, monkeypatch):
+    """Test that a repeat lookup of a city the provider did not find skips the upstream call"""
+    calls = _provider(monkeypatch, error=WetaherNotFoundError("Xyzzyville not found"))
+
+    async def run():
+        for city in ["Xyzzyville", "xyzzyville "]:
+            with pytest.raises(WetaherNotFoundError):
+                await weather_client.fetch_weather_entry(city)
+
+    asyncio.run(run())
+
+    assert calls == ["Xyzzyville"]
+    assert fake_cache == {}
+
+
+def test_bloom_filter_has_no_false_negatives_and_stays_bounded():
+    """Test that added items are always found and the filter rotates instead of growing"""
+    bloom = BloomFilter(capacity=100, error_rate=0.01)
+    size = bloom.size
+
+    for i in range(100):
+        bloom.add(f"junk-{i}")
+    assert all(f"junk-{i}" in bloom for i in range(100))
+    false_positives = sum(f"other-{i}" in bloom for i in range(1000))
+    assert false_positives < 50
+
+    for i in range(100, 150):
+        bloom.add(f"junk-{i}")
+    assert bloom.rotations == 1
+    assert bloom.size == size
+    # The previous generation is still consulted until the next rotation
+    assert all(f"junk-{i}" in bloom for i in range(150))
+
+
+def test_batch_fetches_only_misses(monkeypatch):
+    """Test that a batch reads the cache once and fills only the misses, honoring remote tombstones"""
+    writes = []
+    fetched = []
+
+    async def read_entries(cache_keys):
+        return {key: CacheEntry(data=LONDON, fetched_at=time.time()) if key == "weather:london" else None for key in cache_keys}
+
+    async def write_entries(entries, ttl=weather_cache.CACHE_HARD_TTL, aliases=None):
+        writes.append((dict(entries), aliases))
+
+    async def fetch(city):
+        fetched.append(city)
+        if city == "Atlantis":
+            raise WetaherNotFoundError(f"{city} not found")
+        return {"city": city}
+
+    async def lookup_remote(query):
+        # Another replica already learned the provider does not know Berlin
+        return query == "berlin"
+
+    monkeypatch.setattr(providers, "PROVIDERS", [providers.VisualCrossing("test-key", "http://provider.test/")])
+    monkeypatch.setattr(weather_client, "read_entries", read_entries)
+    monkeypatch.setattr(weather_client, "write_entries", write_entries)
+    monkeypatch.setattr(weather_client, "_fetch_from_provider", fetch)
+    monkeypatch.setattr(negative_cache, "lookup_remote", lookup_remote)
+
+    results = asyncio.run(weather_client.fetch_weather_batch(["London", "Paris", "Atlantis", "paris", "Berlin"]))
+
+    assert [r["status"] for r in results] == [200, 200, 404, 200, 404]
+    assert [r.get("cache") for r in results] == [HIT, MISS, None, MISS, None]
+    # Every miss written in one pipelined call, along with its alias
+    assert [(list(entries), aliases) for entries, aliases in writes] == [(["weather:paris"], {"paris": "paris"})]
+    assert sorted(fetched) == ["Atlantis", "Paris"]
+    assert asyncio.run(negative_cache.is_not_found("atlantis"))
+
+
+def test_stream_yields_every_city_with_bounded_concurrency(monkeypatch):
+    """Test that the stream returns all cities and never exceeds its worker count"""
+    in_flight = 0
+    peak = 0
+
+    async def fetch_weather_entry(city):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.001)
+        in_flight -= 1
+        return CacheEntry(data={"city": city}, fetched_at=time.time()), MISS
+
+    monkeypatch.setattr(providers, "PROVIDERS", [providers.VisualCrossing("test-key", "http://provider.test/")])
+    monkeypatch.setattr(weather_client, "fetch_weather_entry", fetch_weather_entry)
+    cities = [f"City{i}" for i in range(50)]
+
+    async def run():
+        return [item async for item in weather_client.stream_weather(cities)]
+
+    items = asyncio.run(run())
+
+    assert sorted(item["index"] for item in items) == list(range(50))
+    assert peak <= weather_client.STREAM_CONCURRENCY
+
+
+def test_spelling_variants_share_one_entry(fake_cache, monkeypatch):
+    """Test that a query is aliased to the provider's resolved address after the first fetch"""
+    calls = _provider(monkeypatch, result={"city": "Nueva York, NY, United States"})
+
+    async def run():
+        first = await weather_client.fetch_weather_entry("Nueva York")
+        second = await weather_client.fetch_weather_entry("nueva   york")
+        return first, second
+
+    (_, first_status), (_, second_status) = asyncio.run(run())
+
+    assert (first_status, second_status) == (MISS, HIT)
+    assert calls == ["Nueva York"]
+    assert "weather:nueva york, ny, united states" in fake_cache
+
+
+def test_delete_publishes_the_invalidation_even_when_writes_do_not(monkeypatch):
+    """Test that a purge drops the entry from other workers' L1 without L1_INVALIDATION_ENABLED"""
+    commands = []
+
+    class Pipe:
+        def delete(self, key):
+            commands.append(("delete", key))
+
+        def publish(self, channel, message):
+            commands.append(("publish", message.partition("|")[2]))
+
+    @contextlib.asynccontextmanager
+    async def pipeline(binary=False):
+        yield Pipe()
+
+    monkeypatch.setattr(weather_cache, "USE_REDIS", True)
+    monkeypatch.setattr(weather_cache, "USE_DISK", False)
+    monkeypatch.setattr(weather_cache, "L1_INVALIDATION_ENABLED", False)
+    monkeypatch.setattr(weather_cache, "pipeline", pipeline)
+
+    asyncio.run(weather_cache.delete_entry("weather:purgeville"))
+
+    assert commands == [("delete", "weather:purgeville"), ("publish", "weather:purgeville")]
@@ -0,0 +1,77 @@
+import asyncio
+
+from datetime import date, timedelta
+
+from src.services import weather_range, providers
+from src.services.weather_cache import HIT
+from src.services.weather_range import missing_runs, day_ttl, PARTIAL
+
+START = date(2026, 1, 10)
+
+
+def _days(n):
+    return [START + timedelta(days=i) for i in range(n)]
+
+
+def test_missing_days_are_merged_into_contiguous_runs():
+    """Test that each gap between cached days becomes one provider call"""
+    days = _days(7)
+
+    runs = missing_runs(days, {days[2], days[5]})
+
+    assert runs == [(days[0], days[1]), (days[3], days[4]), (days[6], days[6])]
+    assert missing_runs(days, set(days)) == []
+
+
+def test_past_days_are_cached_longer():
+    """Test that only days that are surely over get the history TTL"""
+    today = date(2026, 1, 17)
+
+    assert day_ttl(today - timedelta(days=2), today) == weather_range.WEATHER_HISTORY_TTL
+    assert day_ttl(today - timedelta(days=1), today) == weather_range.WEATHER_FORECAST_TTL
+    assert day_ttl(today + timedelta(days=3), today) == weather_range.WEATHER_FORECAST_TTL
+
+
+def test_range_fetches_only_missing_days(monkeypatch):
+    """Test that a range reuses cached days and fetches the gaps once"""
+    store = {}
+    periods = []
+
+    async def read_entries(cache_keys):
+        return {key: store.get(key) for key in cache_keys}
+
+    async def write_entries(entries, ttl):
+        store.update(entries)
+
+    class StubProvider(providers.Provider):
+        name = "stub"
+
+        async def current(self, city):
+            raise NotImplementedError
+
+        async def days(self, city, first, last):
+            periods.append(f"{first}/{last}")
+            days = [first + timedelta(days=i) for i in range((last - first).days + 1)]
+            return {"city": "Oslo", "timezone": "Europe/Oslo", "days": [{"date": d.isoformat(), "temp_avg_c": 1.0} for d in days]}
+
+    monkeypatch.setattr(providers, "PROVIDERS", [StubProvider("test-key", "http://provider.test/")])
+    monkeypatch.setattr(weather_range, "read_entries", read_entries)
+    monkeypatch.setattr(weather_range, "write_entries", write_entries)
+    days = _days(7)
+
+    async def run():
+        await weather_range.fetch_range("Oslo", days[2], days[2])
+        await weather_range.fetch_range("Oslo", days[5], days[5])
+        periods.clear()
+        partial = await weather_range.fetch_range("Oslo", days[0], days[6])
+        calls = list(periods)
+        cached = await weather_range.fetch_range("Oslo", days[0], days[6])
+        return partial, calls, cached
+
+    (result, status), calls, (_, cached_status) = asyncio.run(run())
+
+    assert status == PARTIAL
+    assert calls == [f"{days[0]}/{days[1]}", f"{days[3]}/{days[4]}", f"{days[6]}/{days[6]}"]
+    assert [day["date"] for day in result["days"]] == [d.isoformat() for d in days]
+    assert result["city"] == "Oslo"
+    assert cached_status == HIT